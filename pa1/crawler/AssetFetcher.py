@@ -0,0 +1,272 @@
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime
+from mimetypes import guess_extension
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+# A download request. kind is "image" or "binary"; data_type_code is only used for binaries.
+Asset = namedtuple("Asset", ["page_id", "url", "kind", "data_type_code"])
+
+# Leading bytes of the formats we store, checked in order.
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+    (b"%PDF-", "application/pdf"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),  # DOC, PPT
+    (b"PK\x03\x04", "application/zip"),  # DOCX, PPTX
+]
+
+
+def sniff_content_type(head):
+    """
+    Detect the content type from the first bytes of a body.
+
+    Args:
+        head (bytes): Start of the body, at least 16 bytes when available.
+
+    Returns:
+        str: Detected MIME type, or None if the format is not recognized.
+    """
+    for magic, content_type in SIGNATURES:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    text = head.lstrip()[:256].lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in head.lower()):
+        return "image/svg+xml"
+    return None
+
+
+def asset_filename(url, content_type):
+    """Last path segment of the URL, or a generic name with an extension matching the content type."""
+    name = url.split("/")[-1]
+    if "." in name:
+        return name[:255]
+    return f"image{guess_extension(content_type or '') or '.jpg'}"
+
+
+class DatabaseSink:
+    """
+    Stores downloaded assets in crawldb.image and crawldb.page_data through the BatchWriter.
+
+    Bodies larger than spool_bytes are spooled to a temporary file while they
+    download. A body is read into memory only when it is handed to the
+    writer, and the writer bounds the bytes it holds (max_pending_bytes).
+    """
+
+    def __init__(self, writer, spool_bytes=256 * 1024):
+        self.writer = writer
+        self.spool_bytes = spool_bytes
+
+    def open(self, asset, content_type):
+        return tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+
+    def commit(self, asset, content_type, body):
+        body.seek(0)
+        data = body.read()
+        body.close()
+        if asset.kind == "image":
+            self.writer.insert_image(asset.page_id, asset_filename(asset.url, content_type), content_type,
+                                     data, datetime.now())
+        else:
+            self.writer.insert_page_data(asset.page_id, asset.data_type_code, data)
+
+    def abort(self, asset, body):
+        body.close()
+
+
+class DiskSink:
+    """
+    Streams downloaded assets into a directory and stores only their path in
+    the database, so no body is ever held in memory.
+    """
+
+    def __init__(self, writer, directory):
+        self.writer = writer
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, asset, content_type):
+        name = hashlib.sha1(asset.url.encode()).hexdigest()
+        extension = os.path.splitext(asset_filename(asset.url, content_type))[1]
+        return os.path.join(self.directory, name + extension)
+
+    def open(self, asset, content_type):
+        # A unique temporary name, so concurrent downloads of the same URL do not share a file
+        name = hashlib.sha1(asset.url.encode()).hexdigest()
+        return tempfile.NamedTemporaryFile(dir=self.directory, prefix=name + ".", suffix=".part", delete=False)
+
+    def commit(self, asset, content_type, body):
+        body.close()
+        path = self._path(asset, content_type)
+        os.replace(body.name, path)
+        if asset.kind == "image":
+            self.writer.insert_image(asset.page_id, path, content_type, None, datetime.now())
+        else:
+            self.writer.insert_page_data(asset.page_id, asset.data_type_code, path.encode())
+
+    def abort(self, asset, body):
+        body.close()
+        try:
+            os.remove(body.name)
+        except OSError:
+            pass
+
+
+class AssetFetcher:
+    """
+    Background downloader for images and binary files found on crawled pages.
+
+    Crawler threads only queue URLs; a fixed set of worker threads downloads
+    them with keep-alive sessions, at most per_host_connections at a time per
+    host. Bodies are streamed in chunks into a sink and abandoned as soon as
+    they exceed max_bytes, and the real type is sniffed from the first bytes
+    instead of trusting the Content-Type header.
+    """
+
+    def __init__(self, sink, user_agent=None, workers=8, per_host_connections=2, max_bytes=5 * 1024 * 1024,
+                 timeout=5, max_queue=10000, chunk_size=64 * 1024):
+        """
+        Args:
+            sink (DatabaseSink|DiskSink): Where downloaded bodies are written.
+            user_agent (str): User-Agent header sent with every request.
+            workers (int): Number of concurrent downloads.
+            per_host_connections (int): Concurrent downloads allowed per host.
+            max_bytes (int): Largest body that is stored; bigger ones are skipped.
+            timeout (float): Connect and read timeout in seconds.
+            max_queue (int): Queued assets before new ones are dropped.
+            chunk_size (int): Bytes read from the socket at a time.
+        """
+        self.sink = sink
+        self.headers = {"User-Agent": user_agent} if user_agent else {}
+        self.workers = workers
+        self.per_host_connections = per_host_connections
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.host_slots = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {"stored": 0, "skipped": 0, "failed": 0, "dropped": 0}
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit_image(self, page_id, url):
+        """Queue an image download without blocking the caller."""
+        self._submit(Asset(page_id, url, "image", None))
+
+    def submit_binary(self, page_id, url, data_type_code):
+        """Queue a binary file (PDF, DOC, ...) download without blocking the caller."""
+        self._submit(Asset(page_id, url, "binary", data_type_code))
+
+    def _submit(self, asset):
+        try:
+            self.queue.put_nowait(asset)
+        except queue.Full:
+            self._count("dropped")
+
+    def close(self):
+        """Finish all queued downloads and stop the workers."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        print(f"Assets: {self.stats['stored']} stored, {self.stats['skipped']} skipped, "
+              f"{self.stats['failed']} failed, {self.stats['dropped']} dropped")
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _session(self):
+        # requests.Session is not thread-safe, so every worker keeps its own keep-alive session.
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.per_host_connections)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(self.headers)
+            self.local.session = session
+        return session
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.per_host_connections)
+            return self.host_slots[host]
+
+    def _run(self):
+        while True:
+            asset = self.queue.get()
+            if asset is None:
+                if getattr(self.local, "session", None) is not None:
+                    self.local.session.close()
+                return
+            try:
+                with self._host_slot(asset.url):
+                    self._count("stored" if self.fetch(asset) else "skipped")
+            except Exception as e:
+                print(f"Failed to fetch asset {asset.url}: {e}")
+                self._count("failed")
+
+    def fetch(self, asset):
+        """
+        Download one asset into the sink.
+
+        Returns:
+            bool: True if the asset was stored, False if it was skipped.
+        """
+        with self._session().get(asset.url, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                return False
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                return False
+
+            chunks = response.iter_content(chunk_size=self.chunk_size)
+            head = b""
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= 16:
+                    break
+
+            header_type = response.headers.get("Content-Type", "").split(";")[0].strip() or None
+            content_type = sniff_content_type(head) or header_type
+            if asset.kind == "image" and not (content_type or "").startswith("image/"):
+                # Error pages and redirects to HTML are served with status 200 too.
+                return False
+            if len(head) > self.max_bytes:
+                return False
+
+            body = self.sink.open(asset, content_type)
+            size = len(head)
+            try:
+                body.write(head)
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        self.sink.abort(asset, body)
+                        return False
+                    body.write(chunk)
+            except BaseException:
+                self.sink.abort(asset, body)
+                raise
+            self.sink.commit(asset, content_type, body)
+            return True
@@ -0,0 +1,230 @@
+import queue
+import time
+from concurrent.futures import Future
+from threading import Thread, Condition
+from psycopg2.extras import execute_values
+
+
+class BatchWriter:
+    """
+    Write-behind writer for crawl results.
+
+    Crawler threads enqueue pages, images, page_data rows and links; a single
+    background thread flushes them with execute_values in one transaction per
+    batch. insert_page returns a Future that resolves to the new page ID, and
+    that Future can be passed as page_id to the other insert methods before it
+    is resolved.
+
+    Binary payloads (image and page_data bytes) are also bounded by size:
+    producers block while max_pending_bytes are queued and not yet written.
+    """
+
+    def __init__(self, db, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 max_pending_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            db (PostgresDB): Connected database wrapper; each batch borrows a pooled connection.
+            batch_size (int): Maximum number of rows written per transaction.
+            flush_interval (float): Seconds after which a partial batch is written.
+            max_queue (int): Pending rows before producers block.
+            max_pending_bytes (int): Queued binary payload bytes before producers block.
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self.bytes_written = Condition()
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def insert_page(self, site_id, page_type_code, url, html_content, http_status_code, accessed_time):
+        """Queue a page; the returned Future resolves to its ID, or None if it was already stored."""
+        future = Future()
+        self.queue.put(("page", (site_id, page_type_code, url, html_content, http_status_code, accessed_time), future))
+        return future
+
+    def insert_image(self, page_id, filename, content_type, image_data, accessed_time):
+        self._reserve(image_data)
+        self.queue.put(("image", (page_id, filename, content_type, image_data, accessed_time), None))
+
+    def insert_page_data(self, page_id, data_type_code, data):
+        self._reserve(data)
+        self.queue.put(("page_data", (page_id, data_type_code, data), None))
+
+    def insert_link(self, from_page, to_url):
+        """Queue a link from a page to a URL; a FRONTIER page row is created for an unknown target."""
+        self.queue.put(("link", (from_page, to_url), None))
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        marker = Future()
+        self.queue.put(("flush", None, marker))
+        marker.result()
+
+    def close(self):
+        """Write pending rows and stop the background thread."""
+        self.queue.put(("stop", None, None))
+        self.thread.join()
+
+    @staticmethod
+    def _payload_size(data):
+        return len(data) if isinstance(data, (bytes, bytearray, memoryview)) else 0
+
+    def _reserve(self, data):
+        """Wait until a binary payload fits into max_pending_bytes; a single oversized payload is let through alone."""
+        size = self._payload_size(data)
+        if not size:
+            return
+        with self.bytes_written:
+            while self.pending_bytes and self.pending_bytes + size > self.max_pending_bytes:
+                self.bytes_written.wait()
+            self.pending_bytes += size
+
+    def _release(self, batch):
+        size = 0
+        for kind, row, _ in batch:
+            if kind == "image":
+                size += self._payload_size(row[3])
+            elif kind == "page_data":
+                size += self._payload_size(row[2])
+        if size:
+            with self.bytes_written:
+                self.pending_bytes -= size
+                self.bytes_written.notify_all()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is not None and item[0] not in ("flush", "stop"):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+
+            if batch:
+                try:
+                    self._write(batch)
+                finally:
+                    self._release(batch)
+                batch = []
+            deadline = time.monotonic() + self.flush_interval
+
+            if item is not None and item[0] == "flush":
+                item[2].set_result(True)
+            elif item is not None and item[0] == "stop":
+                return
+
+    @staticmethod
+    def _page_id(page_id):
+        if isinstance(page_id, Future):
+            return page_id.result() if page_id.done() else None
+        return page_id
+
+    def _write(self, batch):
+        try:
+            with self.db.connection() as conn:
+                self._write_batch(conn, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                kind, row, future = batch[0]
+                print(f"Error writing {kind}: {e}")
+                if future:
+                    future.set_result(None)
+                return
+            # Retry row by row so a single bad row does not drop the whole batch.
+            print(f"Error writing batch of {len(batch)} rows, retrying one by one: {e}")
+            for item in batch:
+                self._write([item])
+
+    def _write_batch(self, conn, batch):
+        cursor = conn.cursor()
+        try:
+            pages = {}
+            for kind, row, future in batch:
+                if kind == "page":
+                    pages.setdefault(row[2], []).append((row, future))
+
+            page_ids = {}
+            if pages:
+                rows = execute_values(cursor, """
+                    INSERT INTO crawldb.page (site_id, page_type_code, url, html_content, http_status_code, accessed_time)
+                    VALUES %s
+                    ON CONFLICT (url) DO UPDATE
+                    SET site_id = EXCLUDED.site_id,
+                        page_type_code = EXCLUDED.page_type_code,
+                        html_content = EXCLUDED.html_content,
+                        http_status_code = EXCLUDED.http_status_code,
+                        accessed_time = EXCLUDED.accessed_time
+                    WHERE crawldb.page.page_type_code = 'FRONTIER'
+                    RETURNING url, id;
+                """, [entries[0][0] for entries in pages.values()], fetch=True)
+                page_ids = dict(rows)
+
+            # Pages are only visible to the dependent rows once their IDs are known.
+            resolved = {}
+            for url, entries in pages.items():
+                for position, (row, future) in enumerate(entries):
+                    resolved[id(future)] = page_ids.get(url) if position == 0 else None
+
+            def page_id_of(page_id):
+                if isinstance(page_id, Future) and id(page_id) in resolved:
+                    return resolved[id(page_id)]
+                return self._page_id(page_id)
+
+            images, page_data, links = [], [], []
+            for kind, row, future in batch:
+                if kind == "page":
+                    continue
+                page_id = page_id_of(row[0])
+                if page_id is None:
+                    continue
+                if kind == "image":
+                    images.append((page_id,) + row[1:])
+                elif kind == "page_data":
+                    page_data.append((page_id,) + row[1:])
+                elif kind == "link":
+                    links.append((page_id,) + row[1:])
+
+            if images:
+                execute_values(cursor, """
+                    INSERT INTO crawldb.image (page_id, filename, content_type, "data", accessed_time)
+                    VALUES %s;
+                """, images)
+            if page_data:
+                execute_values(cursor, """
+                    INSERT INTO crawldb.page_data (page_id, data_type_code, data)
+                    VALUES %s;
+                """, page_data)
+            if links:
+                # Targets that were not crawled yet get a FRONTIER row, so no link is dropped.
+                execute_values(cursor, """
+                    INSERT INTO crawldb.page (site_id, url, page_type_code)
+                    SELECT DISTINCT ON (v.url) f.site_id, v.url, 'FRONTIER'
+                    FROM (VALUES %s) AS v(from_page, url)
+                    JOIN crawldb.page f ON f.id = v.from_page
+                    ORDER BY v.url
+                    ON CONFLICT (url) DO NOTHING;
+                """, links)
+                execute_values(cursor, """
+                    INSERT INTO crawldb.link (from_page, to_page)
+                    SELECT v.from_page, p.id
+                    FROM (VALUES %s) AS v(from_page, url)
+                    JOIN crawldb.page p ON p.url = v.url
+                    ON CONFLICT DO NOTHING;
+                """, links)
+
+            conn.commit()
+        finally:
+            cursor.close()
+
+        for kind, row, future in batch:
+            if kind == "page":
+                future.set_result(resolved[id(future)])
+        print(f"Wrote batch: {len(pages)} pages, {len(images)} images, {len(page_data)} page_data, {len(links)} links")
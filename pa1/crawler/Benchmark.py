@@ -0,0 +1,123 @@
+from Connection import PostgresDB
+from Dedup import MinHash, token_hash
+from LinkScorer import LinkScorer, link_context
+from bs4 import BeautifulSoup
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+import argparse
+import os
+import random
+import time
+import dotenv
+dotenv.load_dotenv()
+db_name = os.getenv("DB_NAME")
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_port = os.getenv("DB_PORT")
+
+MASK64 = (1 << 64) - 1
+
+
+KEYWORDS = ["erasmus", "mednarodna", "izmenjava", "program", "mobilnost", "mednarodna izmenjava",
+            "mednarodna mobilnost", "prijave na erasmus", "prijave na izmenjavo", "prijave na mobilnost",
+            "prijave na erasmus+", "prijave na izmenjavo+", "prijave na mobilnost+", "prijave na erasmus program",
+            "prijave na izmenjavo program", "prijave na mobilnost program"]
+
+
+def load_pages(db, limit):
+    """Load the HTML of stored pages."""
+    rows = db.fetch_data(f"""
+        SELECT html_content FROM crawldb.page
+        WHERE page_type_code = 'HTML' AND html_content IS NOT NULL
+        ORDER BY id LIMIT {int(limit)};
+    """)
+    return [row[0] for row in rows]
+
+
+def python_signature(tokens, a, b, num_hashes):
+    """Reference implementation: one interpreted multiply-shift per (hash function, token) pair."""
+    hashes = [token_hash(token) for token in set(tokens)]
+    if not hashes:
+        return [0] * num_hashes
+    return [min(((ai * x + bi) & MASK64) >> 32 for x in hashes) for ai, bi in zip(a, b)]
+
+
+def benchmark_minhash(pages, num_hashes=200, seed=1):
+    """Compare the per-pair Python MinHash with the vectorized single and batch signatures."""
+    # Tokenized the same way Estrella.detect_duplicate does.
+    pages = [set(html.split()) for html in pages]
+    minhash = MinHash(num_hashes, seed)
+    rng = random.Random(seed)
+    a = [rng.getrandbits(64) | 1 for _ in range(num_hashes)]
+    b = [rng.getrandbits(64) for _ in range(num_hashes)]
+
+    start = time.perf_counter()
+    reference = [python_signature(tokens, a, b, num_hashes) for tokens in pages]
+    python_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [minhash.get_signature(tokens) for tokens in pages]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = minhash.get_signatures(pages)
+    batch_time = time.perf_counter() - start
+
+    identical = single == reference and batch.tolist() == reference
+    tokens = sum(len(tokens) for tokens in pages)
+    print(f"{len(pages)} pages, {tokens} distinct tokens, {num_hashes} hash functions")
+    print(f"Python per pair:     {python_time:8.3f} s")
+    print(f"NumPy get_signature: {single_time:8.3f} s ({python_time / single_time:6.1f}x)")
+    print(f"NumPy get_signatures:{batch_time:8.3f} s ({python_time / batch_time:6.1f}x)")
+    print(f"Signatures identical: {identical}")
+
+
+def vectorizer_priority(context, keywords):
+    """Reference implementation: one CountVectorizer fit per keyword."""
+    highest_similarity = 0.0
+    for keyword in keywords:
+        word_vectors = CountVectorizer(stop_words='english').fit_transform([keyword, context])
+        highest_similarity = max(highest_similarity, cosine_similarity(word_vectors[0], word_vectors[1])[0][0])
+    return 1 - highest_similarity
+
+
+def benchmark_link_scoring(pages, keywords=KEYWORDS):
+    """Compare per-keyword CountVectorizer priorities with the compiled LinkScorer."""
+    contexts = [[link_context(tag) for tag in BeautifulSoup(html, 'html.parser').find_all('a', href=True)]
+                for html in pages]
+    links = sum(len(page_contexts) for page_contexts in contexts)
+
+    start = time.perf_counter()
+    reference = [[vectorizer_priority(context, keywords) for context in page_contexts] for page_contexts in contexts]
+    vectorizer_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scorer = LinkScorer(keywords)
+    scores = [scorer.score_contexts(page_contexts) for page_contexts in contexts]
+    scorer_time = time.perf_counter() - start
+
+    difference = max((abs(a - b) for ref, new in zip(reference, scores) for a, b in zip(ref, new)), default=0.0)
+    print(f"{len(pages)} pages, {links} links, {len(keywords)} keywords")
+    print(f"CountVectorizer per link: {vectorizer_time:8.3f} s ({1000 * vectorizer_time / len(pages):8.2f} ms/page)")
+    print(f"LinkScorer per page:      {scorer_time:8.3f} s ({1000 * scorer_time / len(pages):8.2f} ms/page)")
+    print(f"Largest priority difference: {difference:.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark crawler hot paths on crawled pages")
+    parser.add_argument("--pages", type=int, default=200, help="Number of stored pages to use")
+    parser.add_argument("--hashes", type=int, default=200, help="MinHash signature length")
+    parser.add_argument("--link-pages", type=int, default=20, help="Pages used for the link scoring benchmark")
+    args = parser.parse_args()
+
+    db = PostgresDB(db_name, db_user, db_password, db_host, db_port)
+    db.connect()
+    pages = load_pages(db, args.pages)
+    db.close()
+
+    if not pages:
+        print("No crawled HTML pages found in crawldb.page")
+    else:
+        benchmark_minhash(pages, args.hashes)
+        benchmark_link_scoring(pages[:args.link_pages])
@@ -0,0 +1,161 @@
+import threading
+from contextlib import contextmanager
+import psutil
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+def new_chrome_driver():
+    """Start a headless Chrome instance."""
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--remote-debugging-port=0")
+    return webdriver.Chrome(options=options)
+
+
+class PooledDriver:
+    """A WebDriver together with the bookkeeping needed to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_rendered = 0
+        self.initial_memory = driver_memory(driver)
+
+
+def driver_memory(driver):
+    """Resident memory in bytes of the browser process tree behind a driver."""
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes)
+    except Exception:
+        return 0
+
+
+class BrowserPool:
+    """
+    Bounded pool of headless Chrome drivers shared by all crawler threads.
+
+    Drivers are started lazily, checked out for a single render and returned
+    afterwards. A driver is replaced after max_pages_per_driver renders, when
+    its memory grew by more than max_memory_growth_mb, or when it crashed.
+    """
+
+    def __init__(self, size=4, max_pages_per_driver=100, max_memory_growth_mb=500, load_timeout=15,
+                 driver_factory=new_chrome_driver):
+        """
+        Args:
+            size (int): Maximum number of browsers alive at the same time.
+            max_pages_per_driver (int): Renders after which a driver is restarted.
+            max_memory_growth_mb (int): Memory growth that triggers a restart.
+            load_timeout (int): Seconds to wait for the page load and for the DOM to become ready.
+            driver_factory (callable): Creates a new WebDriver.
+        """
+        self.size = size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.max_memory_growth = max_memory_growth_mb * 1024 * 1024
+        self.load_timeout = load_timeout
+        self.driver_factory = driver_factory
+        self.idle = []
+        self.created = 0
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def _acquire(self, timeout=None):
+        with self.condition:
+            while not self.idle and self.created >= self.size:
+                if not self.condition.wait(timeout):
+                    raise TimeoutError("No browser became available in time")
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+
+        try:
+            driver = self.driver_factory()
+            # Without a page load timeout a hung driver.get() holds the pool slot indefinitely.
+            driver.set_page_load_timeout(self.load_timeout)
+            return PooledDriver(driver)
+        except Exception:
+            with self.condition:
+                self.created -= 1
+                self.condition.notify()
+            raise
+
+    def _discard(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        with self.condition:
+            self.created -= 1
+            self.condition.notify()
+
+    def _should_recycle(self, pooled):
+        if pooled.pages_rendered >= self.max_pages_per_driver:
+            return True
+        if self.max_memory_growth and pooled.initial_memory:
+            return driver_memory(pooled.driver) - pooled.initial_memory > self.max_memory_growth
+        return False
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        Borrow a driver for the duration of a with-block.
+
+        Args:
+            timeout (float): Seconds to wait for a free driver, None waits forever.
+        """
+        pooled = self._acquire(timeout)
+        try:
+            yield pooled.driver
+        except TimeoutException:
+            self._release(pooled)
+            raise
+        except WebDriverException:
+            # A crashed browser is replaced instead of taking a thread down with it.
+            self._discard(pooled)
+            raise
+        except BaseException:
+            self._release(pooled)
+            raise
+        else:
+            self._release(pooled)
+
+    def _release(self, pooled):
+        pooled.pages_rendered += 1
+        if self.closed or self._should_recycle(pooled):
+            self._discard(pooled)
+        else:
+            with self.condition:
+                self.idle.append(pooled)
+                self.condition.notify()
+
+    def render(self, url):
+        """
+        Load a page and wait until its DOM is ready.
+
+        Args:
+            url (str): URL to render.
+
+        Returns:
+            tuple: (page source, document content type)
+        """
+        with self.checkout() as driver:
+            driver.get(url)
+            WebDriverWait(driver, self.load_timeout).until(
+                lambda d: d.execute_script("return document.readyState") == "complete"
+            )
+            return driver.page_source, driver.execute_script("return document.contentType")
+
+    def close(self):
+        """Quit all idle drivers; drivers still checked out are quit when returned."""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for pooled in idle:
+            self._discard(pooled)
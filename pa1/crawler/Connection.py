@@ -1,5 +1,11 @@
 from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+import time
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
 import dotenv
 import os
 
@@ -10,294 +16,483 @@ db_password = os.getenv("DB_PASSWORD")
 db_host = os.getenv("DB_HOST")
 db_port = os.getenv("DB_PORT")
 
+
+class PoolMetrics:
+    """Thread-safe counters for connection pool wait times and query latencies."""
+
+    def __init__(self, window=1000):
+        self.lock = Lock()
+        self.wait_times = deque(maxlen=window)
+        self.query_times = deque(maxlen=window)
+        self.checkouts = 0
+        self.queries = 0
+        self.reconnects = 0
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_times.append(seconds)
+
+    def record_query(self, seconds):
+        with self.lock:
+            self.queries += 1
+            self.query_times.append(seconds)
+
+    def record_reconnect(self):
+        with self.lock:
+            self.reconnects += 1
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {"avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg_ms": 1000 * sum(ordered) / len(ordered),
+            "p50_ms": 1000 * ordered[len(ordered) // 2],
+            "p95_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max_ms": 1000 * ordered[-1],
+        }
+
+    def snapshot(self):
+        """Return counters plus latency statistics over the most recent samples."""
+        with self.lock:
+            wait_times = list(self.wait_times)
+            query_times = list(self.query_times)
+            snapshot = {"checkouts": self.checkouts, "queries": self.queries, "reconnects": self.reconnects}
+        snapshot["pool_wait"] = self._summary(wait_times)
+        snapshot["query_latency"] = self._summary(query_times)
+        return snapshot
+
+
+class MeteredCursor(psycopg2.extensions.cursor):
+    """Cursor that reports the latency of every statement to the pool metrics."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics = getattr(self.connection, "metrics", None)
+            if metrics:
+                metrics.record_query(time.perf_counter() - start)
+
+
+class MeteredConnection(psycopg2.extensions.connection):
+    metrics = None
+    # monotonic time the connection was last returned to the pool, None while never used
+    last_used = None
+
+
 class PostgresDB:
-    def __init__(self, db_name, user, password, host='localhost', port='5432', schema='crawldb'):
+    def __init__(self, db_name, user, password, host='localhost', port='5432', schema='crawldb',
+                 min_connections=1, max_connections=10, health_check_interval=30, metrics_interval=300):
 
         self.db_name = db_name
         self.user = user
         self.password = password
         self.host = host
         self.port = port
-        self.conn = None
-        self.cursor = None
         self.schema = schema
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.pool = None
+        self.slots = BoundedSemaphore(max_connections)
+        self.metrics = PoolMetrics()
+        # Pool metrics are printed every metrics_interval seconds (0 disables the periodic log)
+        self.metrics_interval = metrics_interval
+        self.metrics_printed = time.monotonic()
+        self.metrics_lock = Lock()
 
     def connect(self):
-        """Establishes a connection to the database."""
+        """Creates the connection pool."""
         try:
-            self.conn = psycopg2.connect(
+            self.pool = ThreadedConnectionPool(
+                self.min_connections,
+                self.max_connections,
                 dbname=self.db_name,
                 user=self.user,
                 password=self.password,
                 host=self.host,
-                port=self.port
+                port=self.port,
+                connection_factory=MeteredConnection,
+                cursor_factory=MeteredCursor
             )
-            self.cursor = self.conn.cursor()
-            print("Connected to:", self.db_name ,  self.get_version(), "at", self.host, "on port", self.port)
+            print("Connected to:", self.db_name ,  self.get_version(), "at", self.host, "on port", self.port,
+                  f"(pool size {self.min_connections}-{self.max_connections})")
         except Exception as e:
             print("Connection error:", e)
 
-    def _init_schema(self, schema_name):
-        """Ensure crawldb schema and required columns exist"""
-        if schema_name:
-            self.schema = schema_name
+    def _is_healthy(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self, attempts=3):
+        conn = self.pool.getconn()
+        check = conn.last_used is not None and time.monotonic() - conn.last_used > self.health_check_interval
+        while conn.closed or (check and not self._is_healthy(conn)):
+            print("Replacing broken database connection")
+            self.pool.putconn(conn, close=True)
+            self.metrics.record_reconnect()
+            attempts -= 1
+            if attempts <= 0:
+                raise psycopg2.OperationalError("No healthy database connection available")
+            # The replacement may be another stale idle connection, so it is checked as well
+            conn = self.pool.getconn()
+            check = True
+        conn.metrics = self.metrics
+        return conn
 
-        cursor = self.conn.cursor()
+    def _checkin(self, conn):
+        if conn.closed:
+            self.pool.putconn(conn, close=True)
+            self.metrics.record_reconnect()
+            return
         try:
-            cursor.execute("SELECT 1 FROM information_schema.schemata WHERE schema_name = '%s'", (self.schema,))
-            if not cursor.fetchone():
-                print("Creating crawldb schema...")
-                try:
-                    with open('init-scripts/crawldb.sql', 'r') as f:
-                        schema_sql = f.read()
-                        cursor.execute(schema_sql)
-                    print(f"Schema {self.schema} created successfully")
-
-                except Exception as e:
-                    print(f"Error creating schema: {e}")
-        
-        except Exception as e:
-            print(f"Error initializing schema: {e}")
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self.pool.putconn(conn, close=True)
+            return
+        conn.last_used = time.monotonic()
+        self.pool.putconn(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection for the duration of a with-block.
+
+        Callers commit their own work; anything left uncommitted is rolled back
+        when the connection goes back to the pool. Waits while all
+        max_connections are in use.
+        """
+        start = time.perf_counter()
+        self.slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            self.metrics.record_wait(time.perf_counter() - start)
+            yield conn
         finally:
-            cursor.close()
+            if conn is not None:
+                self._checkin(conn)
+            self.slots.release()
+            self._maybe_print_metrics()
+
+    def _maybe_print_metrics(self):
+        if not self.metrics_interval:
+            return
+        with self.metrics_lock:
+            if time.monotonic() - self.metrics_printed < self.metrics_interval:
+                return
+            self.metrics_printed = time.monotonic()
+        self.print_metrics()
 
     def get_version(self):
         """Retrieves and returns the database version."""
         try:
-            if self.cursor:
-                self.cursor.execute("SELECT version();")
-                return self.cursor.fetchone()[0]
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT version();")
+                    return cursor.fetchone()[0]
         except Exception as e:
             print("Error fetching version:", e)
         return None
 
     def fetch_data(self, query, params=None):
         """Executes a SQL query and returns the result."""
-        ""
         try:
-            if self.cursor:
-                self.cursor.execute(query, params)
-                return self.cursor.fetchall()
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                    return cursor.fetchall()
         except Exception as e:
             print("Query execution error:", e)
         return None
-    
+
     def insert_image(self, page_id, filename, content_type, image_data, accessed_time):
-        try:
-            query = """
-            INSERT INTO crawldb.image (page_id, filename, content_type, "data", accessed_time)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id;
-            """
-
-            self.cursor.execute(query, (page_id, filename, content_type, image_data, accessed_time))
-            image_id = self.cursor.fetchone()[0]
-            self.conn.commit()
-
-            print(f"Inserted image with ID {image_id} for page {page_id}.")
-            return image_id
-        except Exception as e:
-            self.conn.rollback()
-            print("Error inserting image:", e)
+        with self.connection() as conn:
+            try:
+                query = """
+                INSERT INTO crawldb.image (page_id, filename, content_type, "data", accessed_time)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id;
+                """
+
+                with conn.cursor() as cursor:
+                    cursor.execute(query, (page_id, filename, content_type, image_data, accessed_time))
+                    image_id = cursor.fetchone()[0]
+                conn.commit()
+
+                print(f"Inserted image with ID {image_id} for page {page_id}.")
+                return image_id
+            except Exception as e:
+                conn.rollback()
+                print("Error inserting image:", e)
 
     def insert_data_type(self, code):
-        try:
-            self.cursor.execute("INSERT INTO crawldb.data_type (code) VALUES (%s) ON CONFLICT DO NOTHING;", (code,))
-            self.conn.commit()
-            print("Inserted into data_type:", code)
-        except Exception as e:
-            print("Error inserting data_type:", e)
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("INSERT INTO crawldb.data_type (code) VALUES (%s) ON CONFLICT DO NOTHING;", (code,))
+                conn.commit()
+                print("Inserted into data_type:", code)
+            except Exception as e:
+                print("Error inserting data_type:", e)
 
     def insert_page_type(self, code):
-        try:
-            self.cursor.execute("INSERT INTO crawldb.page_type (code) VALUES (%s) ON CONFLICT DO NOTHING;", (code,))
-            self.conn.commit()
-            print("Inserted into page_type:", code)
-        except Exception as e:
-            print("Error inserting page_type:", e)
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("INSERT INTO crawldb.page_type (code) VALUES (%s) ON CONFLICT DO NOTHING;", (code,))
+                conn.commit()
+                print("Inserted into page_type:", code)
+            except Exception as e:
+                print("Error inserting page_type:", e)
 
     def insert_site(self, domain, robots_content, sitemap_content):
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO crawldb.site (domain, robots_content, sitemap_content) VALUES (%s, %s, %s) RETURNING id;",
+                        (domain, robots_content, sitemap_content)
+                    )
+                    site_id = cursor.fetchone()[0]
+                conn.commit()
+                print("Inserted into site, ID:", site_id)
+                return site_id
+            except Exception as e:
+                print("Error inserting site:", e)
+
+    def get_site_id(self, domain):
+        """Returns the ID of a site, or None if it is not stored yet."""
         try:
-            self.cursor.execute(
-                "INSERT INTO crawldb.site (domain, robots_content, sitemap_content) VALUES (%s, %s, %s) RETURNING id;",
-                (domain, robots_content, sitemap_content)
-            )
-            site_id = self.cursor.fetchone()[0]
-            self.conn.commit()
-            print("Inserted into site, ID:", site_id)
-            return site_id
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT id FROM crawldb.site WHERE domain = %s", (domain,))
+                    result = cursor.fetchone()
+                    return result[0] if result else None
         except Exception as e:
-            print("Error inserting site:", e)
+            print("Error fetching site:", e)
+            return None
 
     def insert_page_data(self, page_id, data_type_code, data):
         """Inserts data into the crawldb.page_data table."""
-        try:
-            self.cursor.execute(
-                "INSERT INTO crawldb.page_data (page_id, data_type_code, data) VALUES (%s, %s, %s);",
-                (page_id, data_type_code, data)
-            )
-            self.conn.commit()
-            print(f"Inserted into page_data: page_id={page_id}, data_type_code={data_type_code}")
-        except Exception as e:
-            print("Error inserting page_data:", e)
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO crawldb.page_data (page_id, data_type_code, data) VALUES (%s, %s, %s);",
+                        (page_id, data_type_code, data)
+                    )
+                conn.commit()
+                print(f"Inserted into page_data: page_id={page_id}, data_type_code={data_type_code}")
+            except Exception as e:
+                print("Error inserting page_data:", e)
 
     def insert_page(self, site_id, page_type_code, url, html_content, http_status_code, accessed_time):
         """Inserts a page into the crawldb.page table."""
-        try:
-            self.cursor.execute(
-                """
-                INSERT INTO crawldb.page (site_id, page_type_code, url, html_content, http_status_code, accessed_time)
-                VALUES (%s, %s, %s, %s, %s, %s) RETURNING id;
-                """,
-                (site_id, page_type_code, url, html_content, http_status_code, accessed_time)
-            )
-            page_id = self.cursor.fetchone()[0]
-            self.conn.commit()
-            print(f"Inserted into page: ID={page_id}, URL={url}")
-            return page_id
-        except Exception as e:
-            print("Error inserting page:", e)
-            self.conn.rollback()
-            return None  # Return None in case of failure
-        
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        INSERT INTO crawldb.page (site_id, page_type_code, url, html_content, http_status_code, accessed_time)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (url) DO UPDATE
+                        SET site_id = EXCLUDED.site_id,
+                            page_type_code = EXCLUDED.page_type_code,
+                            html_content = EXCLUDED.html_content,
+                            http_status_code = EXCLUDED.http_status_code,
+                            accessed_time = EXCLUDED.accessed_time
+                        WHERE crawldb.page.page_type_code = 'FRONTIER'
+                        RETURNING id;
+                        """,
+                        (site_id, page_type_code, url, html_content, http_status_code, accessed_time)
+                    )
+                    row = cursor.fetchone()
+                conn.commit()
+                if row is None:
+                    print(f"Page already stored: URL={url}")
+                    return None
+                page_id = row[0]
+                print(f"Inserted into page: ID={page_id}, URL={url}")
+                return page_id
+            except Exception as e:
+                print("Error inserting page:", e)
+                conn.rollback()
+                return None  # Return None in case of failure
+
     def get_all_urls(self):
-        """Fetches all URLs from the crawldb.page table and returns them as a set."""
+        """Fetches all crawled (non-frontier) URLs from the crawldb.page table and returns them as a set."""
         try:
-            self.cursor.execute("SELECT url FROM crawldb.page;")
-            urls = {row[0] for row in self.cursor.fetchall()}  # Fetch all and convert to a set
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT url FROM crawldb.page WHERE page_type_code IS DISTINCT FROM 'FRONTIER';")
+                    urls = {row[0] for row in cursor.fetchall()}  # Fetch all and convert to a set
             return urls
         except Exception as e:
             print("Error fetching URLs:", e)
             return set()  # Return an empty set in case of failure
-        
+
     def _init_schema(self):
         """Ensure crawldb schema and required columns exist"""
-        cursor = self.conn.cursor()
-        try:
-            # Check if crawldb schema exists
-            cursor.execute("SELECT 1 FROM information_schema.schemata WHERE schema_name = 'crawldb'")
-            if not cursor.fetchone():
-                # Create schema from SQL file
-                print("Creating crawldb schema...")
-                try:
-                    with open('init-scripts/crawldb.sql', 'r') as f:
-                        schema_sql = f.read()
-                        cursor.execute(schema_sql)
-                    print("Schema created successfully")
-                except Exception as e:
-                    print(f"Error creating schema: {e}")
-            
-        except Exception as e:
-            print(f"Error initializing schema: {e}")
-        finally:
-            cursor.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Check if crawldb schema exists
+                cursor.execute("SELECT 1 FROM information_schema.schemata WHERE schema_name = 'crawldb'")
+                if not cursor.fetchone():
+                    # Create schema from SQL file
+                    print("Creating crawldb schema...")
+                    try:
+                        with open('init-scripts/crawldb.sql', 'r') as f:
+                            schema_sql = f.read()
+                            cursor.execute(schema_sql)
+                        conn.commit()
+                        print("Schema created successfully")
+                    except Exception as e:
+                        print(f"Error creating schema: {e}")
+
+            except Exception as e:
+                print(f"Error initializing schema: {e}")
+            finally:
+                cursor.close()
+
+    def get_metrics(self):
+        """
+        Current pool statistics.
+
+        Returns:
+            dict: Checkout, query and reconnect counts plus pool_wait and query_latency summaries in ms.
+        """
+        return self.metrics.snapshot()
+
+    def print_metrics(self):
+        """Prints pool wait times and query latencies, useful for sizing the pool against the worker count."""
+        snapshot = self.get_metrics()
+        wait, query = snapshot["pool_wait"], snapshot["query_latency"]
+        print(f"Pool: {snapshot['checkouts']} checkouts, {snapshot['reconnects']} reconnects, "
+              f"wait avg {wait['avg_ms']:.1f} ms / p95 {wait['p95_ms']:.1f} ms / max {wait['max_ms']:.1f} ms")
+        print(f"Queries: {snapshot['queries']} executed, "
+              f"latency avg {query['avg_ms']:.1f} ms / p95 {query['p95_ms']:.1f} ms / max {query['max_ms']:.1f} ms")
 
     def close(self):
-        """Closes the database connection."""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        """Closes all pooled database connections."""
+        if self.pool:
+            self.print_metrics()
+            self.pool.closeall()
         print("Database connection closed.")
 
-    #SHIT FROM CRAWLER THAT MIGHT BE USEFULL 
+    #SHIT FROM CRAWLER THAT MIGHT BE USEFULL
     def mark_as_duplicate(self, duplicate_url, original_url):
         """Mark a page as a duplicate of another page"""
-        cursor = self.conn.cursor()
-        try:
-            # Get the ID of the original page
-            cursor.execute("SELECT id FROM crawldb.page WHERE url = %s", (original_url,))
-            original_id = cursor.fetchone()
-            if not original_id:
-                print(f"Original URL not found: {original_url}")
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Get the ID of the original page
+                cursor.execute("SELECT id FROM crawldb.page WHERE url = %s", (original_url,))
+                original_id = cursor.fetchone()
+                if not original_id:
+                    print(f"Original URL not found: {original_url}")
+                    return False
+                original_id = original_id[0]
+
+                # Update the duplicate page - set page_type_code AND duplicate_id
+                cursor.execute(
+                    """
+                    UPDATE crawldb.page
+                    SET page_type_code = 'DUPLICATE',
+                        html_content = NULL,
+                        duplicate_id = %s
+                    WHERE url = %s
+                    """,
+                    (original_id, duplicate_url)
+                )
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Error marking page as duplicate: {e}")
                 return False
-            original_id = original_id[0]
-            
-            # Update the duplicate page - set page_type_code AND duplicate_id
-            cursor.execute(
-                """
-                UPDATE crawldb.page 
-                SET page_type_code = 'DUPLICATE', 
-                    html_content = NULL,
-                    duplicate_id = %s
-                WHERE url = %s
-                """,
-                (original_id, duplicate_url)
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error marking page as duplicate: {e}")
-            return False
-        finally:
-            cursor.close()
+            finally:
+                cursor.close()
 
     def check_content_hash_exists(self, content_hash):
         """Check if content hash exists in database, return first page with this hash (oldest)"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT id, url 
-                FROM crawldb.page 
-                WHERE content_hash = %s AND page_type_code = 'HTML'
-                ORDER BY accessed_time ASC
-                LIMIT 1
-            """, (content_hash,))
-            
-            result = cursor.fetchone()
-            if result:
-                return result[0], result[1]  # id, url
-            return None, None
-        except Exception as e:
-            print(f"Error checking content hash: {e}")
-            return None, None
-        finally:
-            cursor.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id, url
+                    FROM crawldb.page
+                    WHERE content_hash = %s AND page_type_code = 'HTML'
+                    ORDER BY accessed_time ASC
+                    LIMIT 1
+                """, (content_hash,))
+
+                result = cursor.fetchone()
+                if result:
+                    return result[0], result[1]  # id, url
+                return None, None
+            except Exception as e:
+                print(f"Error checking content hash: {e}")
+                return None, None
+            finally:
+                cursor.close()
 
     def get_duplicate_page_by_minhash(self, existing_minhash):
         """Get the ID of a duplicate page based on minhash"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT id, url 
-                FROM crawldb.page 
-                WHERE content_minhash = %s AND page_type_code = 'HTML'
-                ORDER BY accessed_time ASC
-                LIMIT 1
-            """, (existing_minhash,))
-            
-            result = cursor.fetchone()
-            if result:
-                return result[0], result[1]  # id, url
-            return None, None
-        except Exception as e:
-            print(f"Error checking minhash: {e}")
-            return None, None
-        finally:
-            cursor.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id, url
+                    FROM crawldb.page
+                    WHERE content_minhash = %s AND page_type_code = 'HTML'
+                    ORDER BY accessed_time ASC
+                    LIMIT 1
+                """, (existing_minhash,))
+
+                result = cursor.fetchone()
+                if result:
+                    return result[0], result[1]  # id, url
+                return None, None
+            except Exception as e:
+                print(f"Error checking minhash: {e}")
+                return None, None
+            finally:
+                cursor.close()
 
     def remove_sitemap_urls_from_frontier(self):
         """Remove sitemap files from frontier to prevent loops"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute("""
-                DELETE FROM crawldb.page 
-                WHERE page_type_code = 'FRONTIER'
-                AND (
-                    url LIKE '%sitemap%.xml%' OR
-                    url LIKE '%/assets/sitemap/%'
-                )
-            """)
-            deleted = cursor.rowcount
-            self.conn.commit()
-            print(f"Removed {deleted} sitemap URLs from frontier to prevent loops")
-            return deleted
-        except Exception as e:
-            print(f"Error removing sitemap URLs: {e}")
-            self.conn.rollback()
-            return 0
-        finally:
-            cursor.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    DELETE FROM crawldb.page
+                    WHERE page_type_code = 'FRONTIER'
+                    AND (
+                        url LIKE '%sitemap%.xml%' OR
+                        url LIKE '%/assets/sitemap/%'
+                    )
+                """)
+                deleted = cursor.rowcount
+                conn.commit()
+                print(f"Removed {deleted} sitemap URLs from frontier to prevent loops")
+                return deleted
+            except Exception as e:
+                print(f"Error removing sitemap URLs: {e}")
+                conn.rollback()
+                return 0
+            finally:
+                cursor.close()
 
 if __name__ == "__main__":
     db = PostgresDB(db_name, db_user, db_password, db_host, db_port)
@@ -0,0 +1,220 @@
+import hashlib
+import random
+import numpy as np
+
+# Number of (hash function, token) products computed at once; bounds memory to ~8 MB per block.
+BLOCK_SIZE = 1 << 20
+
+
+def token_hash(token):
+    """Stable 32-bit hash of a token (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8", "replace"), digest_size=4).digest(), "little")
+
+
+def hash_tokens(tokens):
+    """Hash a token set once into a uint64 array."""
+    return np.fromiter((token_hash(token) for token in set(tokens)), dtype=np.uint64)
+
+
+class MinHash:
+    """
+    MinHash with a fixed, seeded family of multiply-shift hash functions:
+    h(x) = ((a * x + b) mod 2**64) >> 32. Every instance created with the same
+    seed produces the same permutations, so signatures are comparable across
+    pages, processes and restarts.
+    """
+
+    def __init__(self, num_hashes=200, seed=1):
+        self.num_hashes = num_hashes
+        self.seed = seed
+        rng = random.Random(seed)
+        # Multiply-shift needs odd multipliers. uint64 arithmetic wraps mod 2**64.
+        self.a = np.array([rng.getrandbits(64) | 1 for _ in range(num_hashes)], dtype=np.uint64)[:, None]
+        self.b = np.array([rng.getrandbits(64) for _ in range(num_hashes)], dtype=np.uint64)[:, None]
+
+    def _permute(self, hashes):
+        return (self.a * hashes[None, :] + self.b) >> np.uint64(32)
+
+    def signature_from_hashes(self, hashes):
+        """Compute the signature of an already hashed token set as a uint64 array."""
+        if hashes.size == 0:
+            return np.zeros(self.num_hashes, dtype=np.uint64)
+        block = max(1, BLOCK_SIZE // self.num_hashes)
+        signature = self._permute(hashes[:block]).min(axis=1)
+        for start in range(block, hashes.size, block):
+            np.minimum(signature, self._permute(hashes[start:start + block]).min(axis=1), out=signature)
+        return signature
+
+    def get_signature(self, tokens):
+        """Generate the MinHash signature for a set of tokens."""
+        return self.signature_from_hashes(hash_tokens(tokens)).tolist()
+
+    def get_signatures(self, token_sets):
+        """
+        Sign many documents at once.
+
+        Args:
+            token_sets (list): One token iterable per document.
+
+        Returns:
+            np.ndarray: (documents, num_hashes) uint64 matrix; row i equals get_signature(token_sets[i]).
+        """
+        hashed = [hash_tokens(tokens) for tokens in token_sets]
+        signatures = np.zeros((len(hashed), self.num_hashes), dtype=np.uint64)
+        block = max(1, BLOCK_SIZE // self.num_hashes)
+
+        # Group documents into blocks of about `block` tokens and reduce each
+        # document's column range with one minimum.reduceat per block.
+        group, group_size = [], 0
+        for doc, hashes in enumerate(hashed):
+            if hashes.size > block:
+                signatures[doc] = self.signature_from_hashes(hashes)
+                continue
+            if hashes.size == 0:
+                continue
+            if group_size + hashes.size > block:
+                self._sign_group(group, hashed, signatures)
+                group, group_size = [], 0
+            group.append(doc)
+            group_size += hashes.size
+        self._sign_group(group, hashed, signatures)
+        return signatures
+
+    def _sign_group(self, group, hashed, signatures):
+        if not group:
+            return
+        sizes = np.array([hashed[doc].size for doc in group])
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        permuted = self._permute(np.concatenate([hashed[doc] for doc in group]))
+        signatures[group] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+
+def estimate_jaccard(signature1, signature2):
+    """Estimate Jaccard similarity as the fraction of equal MinHash values."""
+    return float(np.mean(np.asarray(signature1, dtype=np.uint64) == np.asarray(signature2, dtype=np.uint64)))
+
+
+class DuplicateIndex:
+    """
+    Near-duplicate detection with banded locality-sensitive hashing.
+
+    A signature is cut into `bands` bands of num_hashes / bands rows; pages
+    sharing at least one band bucket are candidates and only those are compared
+    signature by signature. Signatures and buckets are stored in
+    crawldb.page_minhash and crawldb.page_lsh_band, so the index survives
+    restarts and is shared by all workers.
+    """
+
+    def __init__(self, db, num_hashes=200, bands=20, threshold=0.8, seed=1):
+        """
+        Args:
+            db (PostgresDB): Connected database wrapper.
+            num_hashes (int): Signature length, must be divisible by bands.
+            bands (int): Number of LSH bands. With 200 hashes and 20 bands
+                pages become candidates from a similarity of about 0.75.
+            threshold (float): Estimated Jaccard similarity counted as duplicate.
+            seed (int): Seed of the hash family; changing it invalidates stored signatures.
+        """
+        if num_hashes % bands:
+            raise ValueError("num_hashes must be divisible by bands")
+        self.db = db
+        self.minhash = MinHash(num_hashes, seed)
+        self.bands = bands
+        self.rows = num_hashes // bands
+        self.threshold = threshold
+
+    def init_schema(self):
+        """Create the signature and bucket tables."""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS crawldb.page_minhash (
+                        url         varchar(3000) PRIMARY KEY,
+                        signature   bigint[] NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS crawldb.page_lsh_band (
+                        band        smallint NOT NULL,
+                        bucket      bigint NOT NULL,
+                        url         varchar(3000) NOT NULL REFERENCES crawldb.page_minhash(url) ON DELETE CASCADE,
+                        CONSTRAINT pk_page_lsh_band PRIMARY KEY (band, bucket, url)
+                    );
+                """)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error initializing dedup schema: {e}")
+            finally:
+                cursor.close()
+
+    def band_buckets(self, signature):
+        """Return one signed 64-bit bucket key per band."""
+        rows = np.asarray(signature, dtype="<u8").reshape(self.bands, self.rows)
+        return [int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "little", signed=True)
+                for band in rows]
+
+    def find_duplicate(self, signature, buckets=None, exclude_url=None):
+        """
+        Look up the most similar stored page that shares a band bucket.
+
+        Returns:
+            tuple: (url, similarity) of the best match above threshold, or (None, 0.0).
+        """
+        buckets = buckets or self.band_buckets(signature)
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT DISTINCT m.url, m.signature
+                    FROM crawldb.page_lsh_band b
+                    JOIN crawldb.page_minhash m ON m.url = b.url
+                    WHERE (b.band, b.bucket) IN (
+                        SELECT * FROM unnest(%s::smallint[], %s::bigint[])
+                    )
+                    AND m.url IS DISTINCT FROM %s;
+                """, (list(range(self.bands)), buckets, exclude_url))
+                candidates = cursor.fetchall()
+
+        if not candidates:
+            return None, 0.0
+        matrix = np.array([candidate for _, candidate in candidates], dtype=np.uint64)
+        similarities = (matrix == np.asarray(signature, dtype=np.uint64)).mean(axis=1)
+        best = int(similarities.argmax())
+        if similarities[best] >= self.threshold:
+            return candidates[best][0], float(similarities[best])
+        return None, 0.0
+
+    def add(self, url, signature, buckets=None):
+        """Store a page signature and its band buckets."""
+        buckets = buckets or self.band_buckets(signature)
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    INSERT INTO crawldb.page_minhash (url, signature) VALUES (%s, %s)
+                    ON CONFLICT (url) DO NOTHING;
+                """, (url, list(signature)))
+                cursor.execute("""
+                    INSERT INTO crawldb.page_lsh_band (band, bucket, url)
+                    SELECT band, bucket, %s FROM unnest(%s::smallint[], %s::bigint[]) AS t(band, bucket)
+                    ON CONFLICT DO NOTHING;
+                """, (url, list(range(self.bands)), buckets))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error storing minhash for {url}: {e}")
+            finally:
+                cursor.close()
+
+    def check_and_add(self, url, tokens):
+        """
+        Check a page against the index and add it if it is new.
+
+        Returns:
+            tuple: (duplicate url or None, similarity)
+        """
+        signature = self.minhash.get_signature(tokens)
+        buckets = self.band_buckets(signature)
+        duplicate_url, similarity = self.find_duplicate(signature, buckets, exclude_url=url)
+        if duplicate_url is None:
+            self.add(url, signature, buckets)
+        return duplicate_url, similarity
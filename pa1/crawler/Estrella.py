@@ -1,24 +1,24 @@
 import os
 import time
+import argparse
+import asyncio
 import hashlib
 import requests
 import dotenv
 import heapq
-import random
-import re
-import numpy as np
-from urllib.parse import urljoin, urlparse, urlsplit
+from urllib.parse import urljoin, urlparse
 import urllib.robotparser
-from bs4 import BeautifulSoup
 from threading import Thread, Lock
 from datetime import datetime
 from Connection import PostgresDB
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from mimetypes import guess_extension, guess_type
-import mimetypes
+from FetchEngine import AsyncFetchEngine
+from BrowserPool import BrowserPool
+from Frontier import SharedFrontier
+from BatchWriter import BatchWriter
+from Dedup import DuplicateIndex
+from LinkScorer import LinkScorer
+from PageAnalyzer import PageAnalyzer
+from AssetFetcher import AssetFetcher, DatabaseSink, DiskSink
 import requests
 from urllib.parse import urljoin
 import xml.etree.ElementTree as ET
@@ -31,11 +31,6 @@ db_password = os.getenv("DB_PASSWORD")
 db_host = os.getenv("DB_HOST")
 db_port = os.getenv("DB_PORT")
 
-chrome_options = Options()
-chrome_options.add_argument("--headless")
-chrome_options.add_argument("--disable-gpu")
-chrome_options.add_argument("--no-sandbox")
-
 
 class SitemapFetcher:
     def __init__(self, domain):
@@ -90,37 +85,21 @@ class SitemapFetcher:
                 print(f"Error parsing {sitemap_url}: {e}")
         return all_urls
 
-class MinHash:
-    def __init__(self, num_hashes=200):
-        self.num_hashes = num_hashes
-        self.hash_functions = [self._generate_hash_function() for _ in range(num_hashes)]
-
-    def _generate_hash_function(self):
-        """Generate a random hash function."""
-        a = random.randint(1, 2**32 - 1)
-        b = random.randint(0, 2**32 - 1)
-        return lambda x: (a * x + b) % (2**32)
-
-    def _hash(self, x, func):
-        """Apply a hash function to a value."""
-        return func(x)
-
-    def get_signature(self, tokens):
-        """Generate the MinHash signature for a set of tokens."""
-        signature = []
-        for func in self.hash_functions:
-            min_hash = min([self._hash(hash(token), func) for token in tokens])
-            signature.append(min_hash)
-        return signature
-    
 class Estrella:
-    def __init__(self, domain, workers=4, max_pages=5000):
-        print(f"Initializing Estrella with URL: {domain}, max_depth: {workers}, max_pages: {max_pages}")
+    def __init__(self, domain, workers=4, max_pages=5000, engine="selenium", max_in_flight=1000, browsers=None,
+                 shared_frontier=False, asset_workers=8, max_asset_bytes=5 * 1024 * 1024, asset_dir=None,
+                 download_binaries=False):
+        print(f"Initializing Estrella with URL: {domain}, max_depth: {workers}, max_pages: {max_pages}, engine: {engine}")
         self.domain = domain.rstrip('/')  # Ensure no trailing slash
         self.workers = workers
         self.max_pages = max_pages
+        self.engine = engine
+        self.max_in_flight = max_in_flight
+        self.browser_pool = BrowserPool(size=browsers or workers)
         self.page_count = 0
         self.keywords = ["erasmus", "mednarodna", "izmenjava", "program", "mobilnost", "mednarodna izmenjava", "mednarodna mobilnost", "prijave na erasmus", "prijave na izmenjavo", "prijave na mobilnost", "prijave na erasmus+", "prijave na izmenjavo+", "prijave na mobilnost+", "prijave na erasmus program", "prijave na izmenjavo program", "prijave na mobilnost program"]
+        self.link_scorer = LinkScorer(self.keywords)
+        self.page_analyzer = PageAnalyzer()
         self.user_agent = "FRI-weir-BabaVanga"
         self.header = {'User-Agent': self.user_agent}
         self.robots_chache = {}
@@ -131,22 +110,34 @@ class Estrella:
         self.urls_in_queue = set()
         self.queue = []
         self.page_hashes = set()
-        self.minhash_dict = {}
+        self.download_binaries = download_binaries
 
         self.init_db()
+        # Images (and binaries if enabled) are downloaded in the background, into asset_dir or the database.
+        sink = DiskSink(self.writer, asset_dir) if asset_dir else DatabaseSink(self.writer)
+        self.assets = AssetFetcher(sink, self.user_agent, workers=asset_workers, max_bytes=max_asset_bytes)
+        self.frontier = None
+        if shared_frontier:
+            self.frontier = SharedFrontier(self.db)
+            self.frontier.init_schema()
         self.load_visited_urls()  # Load previously visited URLs
         self.init_robots_parser()
         self.init_sitemap_parser()
-        self.minhasher = MinHash(num_hashes=200)
+        self.dedup = DuplicateIndex(self.db, num_hashes=200, bands=20, threshold=0.8)
+        self.dedup.init_schema()
+        # Seeds are stored with their site, so the site must be known first
+        self.init_site()
         
         # Initialize queue with unvisited URLs
         self.seed_initial_urls()
-        print(f"Initial queue size: {len(self.queue)}")
+        print(f"Initial queue size: {self.queue_size()}")
 
     def init_db(self):
-        self.db = PostgresDB(db_name, db_user, db_password, db_host, db_port)
+        # One connection per worker thread plus the batch writer and the shared frontier
+        self.db = PostgresDB(db_name, db_user, db_password, db_host, db_port, max_connections=self.workers + 2)
         self.db.connect()
         self.db._init_schema()
+        self.writer = BatchWriter(self.db)
 
     def init_robots_parser(self):
 
@@ -179,60 +170,178 @@ class Estrella:
 
     def in_domain(self, url):
         return url.startswith(self.domain)
-    
-    def crawl(self):
-        """Main crawling method"""
-        # First check if the domain is allowed by robots.txt
-        if not self.is_url_allowed_in_robots(self.domain):
-            print(f"Domain {self.domain} is not allowed by robots.txt")
-            return
 
-        # Get or create site ID
+    def init_site(self):
+        """Get or create the site row of the domain; site_id stays None if that fails."""
+        self.site_id = None
         try:
             # Try to get existing site ID first
-            self.cursor = self.db.conn.cursor()
-            self.cursor.execute("SELECT id FROM crawldb.site WHERE domain = %s", (self.domain,))
-            result = self.cursor.fetchone()
+            site_id = self.db.get_site_id(self.domain)
             
-            if result:
-                self.site_id = result[0]
+            if site_id:
+                self.site_id = site_id
                 print(f"Found existing site ID: {self.site_id}")
             else:
                 # If site doesn't exist, create new one
-                self.site_id = self.db.insert_site(self.domain, self.robots_content, str(self.sitemap_content))
+                self.site_id = self.db.insert_site(self.domain, self.robots_content,
+                                                  str(getattr(self, "sitemap_content", self.sitemap_urls)))
                 print(f"Created new site with ID: {self.site_id}")
         except Exception as e:
             print(f"Error getting/creating site: {e}")
+    
+    def crawl(self):
+        """Main crawling method"""
+        # First check if the domain is allowed by robots.txt
+        if not self.is_url_allowed_in_robots(self.domain):
+            print(f"Domain {self.domain} is not allowed by robots.txt")
             return
-        finally:
-            if hasattr(self, 'cursor') and self.cursor:
-                self.cursor.close()
-
-        # Start crawler threads
-        threads = []
-        for _ in range(self.workers):
-            thread = Thread(target=self.crawl_next_page)
-            thread.start()
-            threads.append(thread)
-        
-        for thread in threads:
-            thread.join()
+        if self.site_id is None:
+            return
+
+        if self.engine == "async":
+            self.crawl_async()
+        else:
+            # Start crawler threads
+            threads = []
+            for _ in range(self.workers):
+                thread = Thread(target=self.crawl_next_page)
+                thread.start()
+                threads.append(thread)
+            
+            for thread in threads:
+                thread.join()
         
+        self.browser_pool.close()
+        self.assets.close()
+        self.writer.close()
+        if self.frontier:
+            self.frontier.close()
         self.db.close()
 
-    def detect_page_data_type(self, url, html_content, driver):
+    def crawl_async(self):
+        """Crawl with the aiohttp fetch engine, rendering only JavaScript-heavy pages with Selenium."""
+        engine = AsyncFetchEngine(self.user_agent,
+                                  crawl_delay=self.host_crawl_delay,
+                                  renderer=self.render_page,
+                                  max_in_flight=self.max_in_flight,
+                                  workers=self.workers)
+        asyncio.run(engine.run(self.next_url, self.handle_fetch_result))
+        print(f"Async crawl finished. Final page count: {self.page_count}")
+
+    def host_crawl_delay(self, host):
+        """Delay between two requests to the same host, taken from robots.txt."""
+        if self.crawl_delay:
+            return self.crawl_delay
+        return self.request_rate
+
+    def enqueue_many(self, links):
+        """Push (url, priority) pairs onto the in-process queue or the shared frontier."""
+        if self.frontier:
+            self.frontier.add_many(links, self.site_id)
+            with self.lock:
+                self.urls_in_queue.update(url for url, _ in links)
+            return
+
+        with self.lock:
+            for url, priority in links:
+                heapq.heappush(self.queue, (priority, url))
+                self.urls_in_queue.add(url)
+
+    def dequeue(self):
+        """Pop the best (priority, url) pair, or None if the queue is empty."""
+        if self.frontier:
+            item = self.frontier.next_url()
+        else:
+            with self.lock:
+                item = heapq.heappop(self.queue) if self.queue else None
+        if item:
+            with self.lock:
+                self.urls_in_queue.discard(item[1])
+        return item
+
+    def queue_size(self):
+        if self.frontier:
+            return self.frontier.pending()
+        return len(self.queue)
+
+    def finish_url(self, url):
+        """Retire a URL from the shared frontier once it has been handled."""
+        if self.frontier:
+            self.frontier.finish(url)
+
+    def release_url(self, url):
+        """Hand a URL back to the shared frontier so it can be retried."""
+        if self.frontier:
+            self.frontier.release(url)
+
+    def next_url(self):
+        """Pop the next crawlable URL from the queue, or None if there is nothing to crawl."""
+        while self.page_count < self.max_pages:
+            item = self.dequeue()
+            if item is None:
+                return None
+            priority, url = item
+            if not self.in_domain(url) or url in self.visited_urls:
+                self.finish_url(url)
+                continue
+            if not self.is_url_allowed_in_robots(url):
+                print(f"  Skipping {url} due to robots.txt")
+                self.finish_url(url)
+                continue
+            with self.lock:
+                if url in self.visited_urls:
+                    continue
+                self.visited_urls.add(url)
+            print(f"Crawling URL: {url}, Priority: {priority}")
+            return url
+        return None
+
+    def render_page(self, url):
+        """Render a page with a pooled headless Chrome and return its HTML."""
+        try:
+            html_content, _ = self.browser_pool.render(url)
+            return html_content
+        except Exception as e:
+            print(f"WebDriver failed to render {url}: {e}")
+            return None
+
+    def retry_url(self, url):
+        """Forget a URL that failed to fetch, so it can be found and crawled again."""
+        with self.lock:
+            self.visited_urls.discard(url)
+        self.release_url(url)
+
+    def handle_fetch_result(self, result):
+        """Store a page fetched by the async engine."""
+        if result.status is None:
+            self.retry_url(result.url)
+            return
+        if result.status >= 400:
+            print(f"Failed to fetch {result.url} (status {result.status})")
+            self.finish_url(result.url)
+            return
+        try:
+            if self.process_page(result.url, result.html, result.content_type, result.status) is None:
+                self.retry_url(result.url)
+            else:
+                self.finish_url(result.url)
+        except Exception as e:
+            print(f"Error crawling {result.url}:", e)
+            self.retry_url(result.url)
+
+    def detect_page_data_type(self, url, html_content, content_type):
         """Detects page type (HTML, BINARY, or DUPLICATE) and handles insertion into DB."""
         try:
-            page_hash = hashlib.sha256(html_content.encode()).hexdigest()
-            if page_hash in self.page_hashes:
-                print("Page already visited (duplicate content)")
-                return "DUPLICATE", None
+            if html_content is not None:
+                page_hash = hashlib.sha256(html_content.encode()).hexdigest()
+                if page_hash in self.page_hashes:
+                    print("Page already visited (duplicate content)")
+                    return "DUPLICATE", None
             
-            content_type = driver.execute_script("return document.contentType")  
             print(f"Detected content type: {content_type}")
 
-            if content_type == "text/html":
-                if self.detect_duplicate(html_content, self.site_id):
+            if content_type in ("text/html", "application/xhtml+xml"):
+                if self.detect_duplicate(html_content, url):
                     print("Duplicate page detected")
                     return "DUPLICATE", None
                 
@@ -256,216 +365,124 @@ class Estrella:
             print("Error detecting page type:", e)
             return "ERROR", None
         
-    def extract_binary_files_from_html(self, page_id, html_content):
+    def store_binary_references(self, page_id, binaries):
         """
-        Extract binary files (e.g., images, PDFs, videos) from HTML content.
-
-        Args:
-            html_content (str): The HTML content of the page.
+        Store binary files (PDFs, DOCs, ...) linked or embedded on a page. Only their
+        URLs are stored unless download_binaries is set.
 
-        Returns:
-            List of tuples: Each tuple contains (page_id, data_type_code).
-        """
-        binary_files = []
-        
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        binary_tags = soup.find_all(['a', 'embed', 'object', 'iframe'])
-
-        for tag in binary_tags:
-            src = tag.get('src') or tag.get('href')  
-            if not src:
-                continue  
-
-            src_url = urljoin(html_content, src)
-
-            file_type = self.get_file_type(src_url)
-            if file_type:
-                # Download binary data
-                #file_data = self.download_binary_file(src_url)
-                #if file_data:
-                 #   # Create a unique identifier for the binary file (could be the URL or a hash of the content)
-                 #   page_id = hashlib.sha256(src_url.encode()).hexdigest()
-                    binary_files.append((page_id, file_type, src_url))
-                    self.db.insert_page_data(page_id, file_type, src_url)
-                    print(f" -Binary file: {src_url}, Type: {file_type}, Page ID: {page_id}")
-        
-        return binary_files
-    
-    def get_file_type(self, file_url):
-        """
-        Get the file type based on the URL (can also check file extension).
-        
         Args:
-            file_url (str): URL to the file.
-        
-        Returns:
-            str: File type (e.g., PDF, PNG, etc.).
+            page_id (int|Future): ID of the page the references were found on.
+            binaries (list): (url, data_type_code) tuples from PageAnalyzer.
         """
-        mimetype, encoding = mimetypes.guess_type(file_url)
-        if mimetype:
-            return self.map_mimetype_to_code(mimetype)
-        return None
-    
-    def map_mimetype_to_code(self, mimetype):
-        """
-        Map the mimetype to a specific data type code.
-        
-        Args:
-            mimetype (str): The mimetype of the file (e.g., 'application/pdf').
-        
-        Returns:
-            str: The corresponding data type code (e.g., 'PDF').
-        """
-        binary_types = {
-            'application/pdf': 'PDF',
-            'application/msword': 'DOC',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'DOCX',
-            'application/vnd.ms-powerpoint': 'PPT',
-            'application/vnd.openxmlformats-officedocument.presentationml.presentation': 'PPTX'
-        }
+        for src_url, file_type in binaries:
+            if self.download_binaries:
+                self.assets.submit_binary(page_id, src_url, file_type)
+            else:
+                self.writer.insert_page_data(page_id, file_type, src_url)
+            print(f" -Binary file: {src_url}, Type: {file_type}, Page ID: {page_id}")
 
-        return binary_types.get(mimetype)
-    
-    def extract_images(self, html_content, base_url):
+    def process_page(self, url, html_content, content_type, http_status_code=200):
         """
-        Extracts image URLs from an HTML page and downloads the image data.
-        
-        :param html_content: The HTML source of the web page.
-        :param base_url: The base URL of the website (to resolve relative links).
-        :return: List of tuples (filename, content_type, image_data).
-        """
-        soup = BeautifulSoup(html_content, "html.parser")
-        images = []
+        Store a fetched page and push its outgoing links onto the queue.
 
-        for img_tag in soup.find_all('img', src=True):
-            img_url = urljoin(base_url, img_tag['src'])  
-
-            try:
-                response = requests.get(img_url, timeout=5)  
-                if response.status_code == 200:
-                    content_type = response.headers.get("Content-Type", "unknown")
-                    ext = guess_extension(content_type) or ".jpg"
-                    filename = img_url.split("/")[-1] if "." in img_url.split("/")[-1] else f"image{ext}"
-                    image_data = response.content
+        Args:
+            url (str): URL of the page.
+            html_content (str): Page source (None for binary responses).
+            content_type (str): MIME type reported for the page.
+            http_status_code (int): HTTP status of the response.
 
-                    images.append((filename, content_type, image_data))
-            except Exception as e:
-                #print(f"Failed to fetch image {img_url}: {e}")
-                pass
-        return images
-    
-    def extract_links(self, html, base_url):
-        """Extracts and returns all links from the HTML content, including JavaScript onclick links."""
+        Returns:
+            str: Detected page type, or None if the page limit was reached and nothing was stored.
+        """
+        page_type, processed_content = self.detect_page_data_type(url, html_content, content_type)
         
-        soup = BeautifulSoup(html, "html.parser")
-        links = []
+        if page_type == "DUPLICATE":
+            return page_type
 
-        # Extract from <a> tags
-        for a_tag in soup.find_all("a", href=True):
-            href = a_tag["href"].strip()
+        if page_type == "HTML":
+            # Reserve a slot before storing, so no page is written past max_pages.
+            with self.lock:
+                if self.page_count >= self.max_pages:
+                    print(f"Page limit reached, not storing {url}")
+                    return None
+                self.page_count += 1
+                last_page = self.page_count >= self.max_pages
+
+        page_id = self.writer.insert_page(site_id=self.site_id,
+                                page_type_code=page_type,
+                                url=url,
+                                html_content=processed_content,
+                                http_status_code=http_status_code,
+                                accessed_time=datetime.now())
+
+        if page_type == "HTML":
+            if last_page:
+                return page_type
             
-            if href.startswith("http"):
-                full_url = href
-            elif href.startswith("//"):
-                full_url = "https:" + href
-            elif href.startswith("/"):
-                full_url = urljoin(base_url, href)
-            else:
-                full_url = urljoin(base_url, href)
-
-            links.append((full_url, a_tag))
-
-        # JavaScript-based links
-        for tag in soup.find_all(onclick=True):
-            onclick_text = tag["onclick"]
-            match = re.search(r"location\.href\s*=\s*[\"'](.*?)[\"']", onclick_text)
-            if match:
-                js_href = match.group(1)
-                if js_href.startswith("http"):
-                    full_url = js_href
-                elif js_href.startswith("//"):
-                    full_url = "https:" + js_href
-                elif js_href.startswith("/"):
-                    full_url = urljoin(base_url, js_href)
-                else:
-                    full_url = urljoin(base_url, js_href)
-
-                links.append((full_url, tag))
-
-        return links
-    
-    def priority(self, html, link, link_tag):
-        """
-        Compute the priority of a link.
-
-        Args:
-            html (str): HTML content of the page.
-            link (str): Link URL.
-            link_tag (bs4.Tag): BeautifulSoup tag representing the link.
+            # One parse of the page yields links, onclick targets, images and binaries.
+            analysis = self.page_analyzer.analyze(html_content, url)
+
+            for image_url in analysis.images:
+                self.assets.submit_image(page_id, image_url)
+            self.store_binary_references(page_id, analysis.binaries)
+
+            links = analysis.links + analysis.onclick
+            print(f"  - Found {len(links)} links")
+
+            new_links = {}
+            for link, context in analysis.links:
+                if link not in self.visited_urls and link not in self.urls_in_queue and link not in new_links and self.in_domain(link):
+                    new_links[link] = context
+
+            # Score all <a> links of the page in one batch.
+            scores = self.link_scorer.score_contexts(list(new_links.values()))
+            for link, priority in zip(list(new_links), scores):
+                new_links[link] = priority
+            # onclick targets have no anchor text of their own and keep a neutral priority.
+            for link, _ in analysis.onclick:
+                if link not in self.visited_urls and link not in self.urls_in_queue and link not in new_links and self.in_domain(link):
+                    new_links[link] = 0.5
+            for link, priority in new_links.items():
+                print(f"  - Link added to queue {link}, Priority: {priority}")
+            self.enqueue_many(list(new_links.items()))
+            # Only links the crawler may follow are stored, so the link table matches the crawl graph.
+            for link in dict.fromkeys(link for link, _ in links):
+                if self.in_domain(link) and self.is_url_allowed_in_robots(link):
+                    self.writer.insert_link(page_id, link)
+
+        elif page_type == "BINARY":
+            self.writer.insert_page_data(page_id, processed_content, None)
+
+        return page_type
 
-        Returns:
-            float: Priority score (lower number represents high priority).
-        """
-        highest_similarity = 0.0
-        for keyword in self.keywords:
-            window_size = 50
-            sourounding_text = link_tag.parent.text
-
-            index = sourounding_text.find(link_tag.text)
-            start = max(0, index - window_size)
-            end = min(len(sourounding_text), index + window_size)
-            sourounding_text = sourounding_text[start:end]
-
-            vectorizer = CountVectorizer(stop_words='english')
-            texts = [keyword, sourounding_text]
-            word_vectors = vectorizer.fit_transform(texts)
-
-            similarity = cosine_similarity(word_vectors[0], word_vectors[1])[0][0]
-            if similarity > highest_similarity:
-                highest_similarity = similarity
-    
-        return 1 - highest_similarity
-    
     def crawl_next_page(self):
-        driver = None
-        try:
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--remote-debugging-port=0")
-            driver = webdriver.Chrome(options=chrome_options)
-        except Exception as e:
-            print(f"Error initializing WebDriver: {e}")
-            return
-
         remaining_pages = self.max_pages - self.page_count
         print(f"Starting crawler thread. Remaining pages to crawl: {remaining_pages}")
 
         while remaining_pages > 0:
+            if self.page_count >= self.max_pages:
+                break
+
+            item = self.dequeue()
             # If queue is empty, try to find more URLs
-            if not self.queue:
+            if item is None:
                 print("Queue is empty, trying to find more URLs...")
                 self.seed_initial_urls()
-                if not self.queue:
+                item = self.dequeue()
+                if item is None:
                     print("No more URLs found, exiting thread")
                     break
+            priority, url = item
 
-            print(f"Page count: {self.page_count}/{self.max_pages} (Queue size: {len(self.queue)})")
-            
-            with self.lock:
-                if not self.queue or self.page_count >= self.max_pages:
-                    break
-                priority, url = heapq.heappop(self.queue)
-                self.urls_in_queue.remove(url)
+            print(f"Page count: {self.page_count}/{self.max_pages} (Queue size: {self.queue_size()})")
 
             if not self.in_domain(url) or url in self.visited_urls:
+                self.finish_url(url)
                 continue
 
             with self.lock:
                 if self.page_count >= self.max_pages:
+                    self.release_url(url)
                     break
                 self.visited_urls.add(url)
 
@@ -474,132 +491,50 @@ class Estrella:
             try:
                 if not self.is_url_allowed_in_robots(url):
                     print(f"  Skipping {url} due to robots.txt")
+                    self.finish_url(url)
                     continue
 
                 print(f"Crawling URL: {url}, Priority: {priority}")
                 
-                # Try to get the page with WebDriver
+                # Try to get the page with a pooled WebDriver
                 try:
-                    driver.get(url)
-                    print("Waiting for page to load... 3s")
-                    time.sleep(3)
-                    html_content = driver.page_source
+                    html_content, content_type = self.browser_pool.render(url)
                 except Exception as e:
                     print(f"WebDriver failed for {url}, trying with requests: {e}")
                     # Fallback to requests if WebDriver fails
                     try:
                         response = requests.get(url, headers=self.header, timeout=10)
                         html_content = response.text
+                        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
                     except Exception as req_e:
                         print(f"Both WebDriver and requests failed for {url}: {req_e}")
-                        # Try to reinitialize WebDriver
-                        try:
-                            if driver:
-                                driver.quit()
-                            driver = webdriver.Chrome(options=chrome_options)
-                        except Exception as driver_e:
-                            print(f"Failed to reinitialize WebDriver: {driver_e}")
+                        self.release_url(url)
                         continue
 
-                page_type, processed_content = self.detect_page_data_type(url, html_content, driver)
-                
-                if page_type == "DUPLICATE":
-                    continue  
-
-                page_id = self.db.insert_page(site_id=self.site_id,
-                                        page_type_code=page_type,
-                                        url=url,
-                                        html_content=processed_content,
-                                        http_status_code=200,
-                                        accessed_time=datetime.now())
-
-                if page_type == "HTML":
-                    with self.lock:
-                        self.page_count += 1
-                        remaining_pages = self.max_pages - self.page_count
-                        if remaining_pages <= 0:
-                            break
-                    
-                    images = self.extract_images(html_content, url)
-                    for filename, content_type, image_data in images:
-                        self.db.insert_image(page_id, filename, content_type, image_data, datetime.now())
-                    self.extract_binary_files_from_html(page_id, html_content)
-
-                    # Extract and add new links to queue
-                    url_parts = urlsplit(url)
-                    base_url = url_parts.scheme + "://" + url_parts.netloc
-                    links = self.extract_links(html_content, base_url)
-                    print(f"  - Found {len(links)} links")
-
-                    # Try to find links in JavaScript onclick events and other attributes
-                    soup = BeautifulSoup(html_content, 'html.parser')
-                    onclick_links = []
-                    for tag in soup.find_all(onclick=True):
-                        onclick_text = tag['onclick']
-                        urls = re.findall(r'(?:window\.location|location\.href)\s*=\s*[\'"]([^\'"]+)[\'"]', onclick_text)
-                        onclick_links.extend(urls)
-                    
-                    # Add onclick links to the regular links
-                    for onclick_url in onclick_links:
-                        full_url = urljoin(base_url, onclick_url)
-                        if self.in_domain(full_url):
-                            links.append((full_url, None))
-
-                    for link, link_tag in links:
-                        if link not in self.visited_urls and link not in self.urls_in_queue and self.in_domain(link):
-                            priority = self.priority(html_content, link, link_tag) if link_tag else 0.5
-                            print(f"  - Link added to queue {link}, Priority: {priority}")
-                            with self.lock:
-                                heapq.heappush(self.queue, (priority, link))
-                                self.urls_in_queue.add(link)
-
-                elif page_type == "BINARY":
-                    self.db.insert_page_data(page_id, "BINARY")
+                if self.process_page(url, html_content, content_type) is None:
+                    self.retry_url(url)
+                    break
+                self.finish_url(url)
+                remaining_pages = self.max_pages - self.page_count
 
             except Exception as e:
                 print(f"Error crawling {url}:", e)
-                with self.lock:
-                    if url in self.visited_urls:
-                        self.visited_urls.remove(url)
-                # Try to reinitialize WebDriver if it seems to be the issue
-                if "WebDriver" in str(e) or "session" in str(e):
-                    try:
-                        if driver:
-                            driver.quit()
-                        driver = webdriver.Chrome(options=chrome_options)
-                    except Exception as driver_e:
-                        print(f"Failed to reinitialize WebDriver: {driver_e}")
+                self.retry_url(url)
 
-        if driver:
-            try:
-                driver.quit()
-            except:
-                pass
         print(f"Crawler thread finished. Final page count: {self.page_count}")
 
-    def compare_minhash_signature(self, minhash1, minhash2):
-        """Compute Jaccard similarity using MinHash signatures."""
-        return np.mean([1 if minhash1[i] == minhash2[i] else 0 for i in range(len(minhash1))])
-
-    def detect_duplicate(self, html_content, page_id, num_hashes=200, threshold=0.8):
+    def detect_duplicate(self, html_content, url):
 
-        """Detect duplicate page using MinHash and Jaccard similarity."""
+        """Detect a near-duplicate page using MinHash signatures and the persistent LSH index."""
 
         tokens = set(html_content.split())  
-        
-        minhash = MinHash(num_hashes)
 
-        current_signature = minhash.get_signature(tokens)
+        duplicate_url, similarity = self.dedup.check_and_add(url, tokens)
+        if duplicate_url:
+            print(f"Duplicate detected between pages {url} and {duplicate_url} with similarity {similarity}")
+            return True  # Duplicate found
 
-        for existing_page_id, existing_signature in self.minhash_dict.items():
-            similarity = self.compare_minhash_signature(current_signature, existing_signature)
-            
-            if similarity >= threshold:
-                print(f"Duplicate detected between pages {page_id} and {existing_page_id} with similarity {similarity}")
-                return True  # Duplicate found
-        
-        self.minhash_dict[page_id] = current_signature
-        print(f"Page {page_id} added to the database.")
+        print(f"Page {url} added to the duplicate index.")
         return False 
     
     def load_visited_urls(self):
@@ -616,11 +551,11 @@ class Estrella:
     def seed_initial_urls(self):
         """Find and add new URLs to crawl that haven't been visited yet."""
         print("Seeding initial URLs...")
-        initial_queue_size = len(self.queue)
+        seeds = []
         
         # 1. Try homepage first
         if self.domain not in self.visited_urls:
-            heapq.heappush(self.queue, (0, self.domain))
+            seeds.append((self.domain, 0))
             self.urls_in_queue.add(self.domain)
             print(f"Added domain to queue: {self.domain}")
 
@@ -629,14 +564,12 @@ class Estrella:
             print("Fetching URLs from homepage...")
             response = requests.get(self.domain, headers=self.header, timeout=10)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                links = soup.find_all('a', href=True)
-                for link in links:
-                    url = urljoin(self.domain, link['href'])
+                analysis = self.page_analyzer.analyze(response.text, self.domain)
+                for url, _ in analysis.links:
                     if (url not in self.visited_urls and 
                         url not in self.urls_in_queue and 
                         self.in_domain(url)):
-                        heapq.heappush(self.queue, (0, url))
+                        seeds.append((url, 0))
                         self.urls_in_queue.add(url)
                         print(f"Added URL from homepage: {url}")
         except Exception as e:
@@ -645,55 +578,39 @@ class Estrella:
         # 3. Check the last 20 visited pages for new URLs
         try:
             print("Checking recently visited pages for new URLs...")
-            cursor = self.db.conn.cursor()
-            
             # First get the site ID
-            cursor.execute("SELECT id FROM crawldb.site WHERE domain = %s", (self.domain,))
-            result = cursor.fetchone()
-            if result:
-                site_id = result[0]
-                
+            site_id = self.db.get_site_id(self.domain)
+            if site_id:
                 # Now get recent pages for this site
-                cursor.execute("""
+                recent_pages = self.db.fetch_data("""
                     SELECT url, html_content 
                     FROM crawldb.page 
                     WHERE page_type_code = 'HTML' 
                     AND site_id = %s
                     ORDER BY accessed_time DESC 
                     LIMIT 20
-                """, (site_id,))
-                
-                recent_pages = cursor.fetchall()
+                """, (site_id,)) or []
                 print(f"Found {len(recent_pages)} recent pages to check")
                 
                 for page_url, html_content in recent_pages:
                     if html_content:
-                        soup = BeautifulSoup(html_content, 'html.parser')
+                        analysis = self.page_analyzer.analyze(html_content, page_url)
                         
                         # Get regular links
-                        links = soup.find_all('a', href=True)
-                        for link in links:
-                            url = urljoin(page_url, link['href'])
+                        for url, _ in analysis.links:
                             if (url not in self.visited_urls and 
                                 url not in self.urls_in_queue and 
                                 self.in_domain(url)):
-                                heapq.heappush(self.queue, (0, url))
+                                seeds.append((url, 0))
                                 self.urls_in_queue.add(url)
                                 print(f"Added URL from recent page {page_url}: {url}")
                         
                         # Get JavaScript links
-                        onclick_links = []
-                        for tag in soup.find_all(onclick=True):
-                            onclick_text = tag['onclick']
-                            urls = re.findall(r'(?:window\.location|location\.href)\s*=\s*[\'"]([^\'"]+)[\'"]', onclick_text)
-                            onclick_links.extend(urls)
-                        
-                        for onclick_url in onclick_links:
-                            url = urljoin(page_url, onclick_url)
+                        for url, _ in analysis.onclick:
                             if (url not in self.visited_urls and 
                                 url not in self.urls_in_queue and 
                                 self.in_domain(url)):
-                                heapq.heappush(self.queue, (0, url))
+                                seeds.append((url, 0))
                                 self.urls_in_queue.add(url)
                                 print(f"Added JavaScript URL from recent page {page_url}: {url}")
             else:
@@ -701,9 +618,6 @@ class Estrella:
                             
         except Exception as e:
             print(f"Error checking recent pages: {e}")
-        finally:
-            if cursor:
-                cursor.close()
 
         # 4. Try common paths that might exist
         common_paths = [
@@ -729,7 +643,7 @@ class Estrella:
             if (url not in self.visited_urls and 
                 url not in self.urls_in_queue and 
                 self.in_domain(url)):
-                heapq.heappush(self.queue, (0, url))
+                seeds.append((url, 0))
                 self.urls_in_queue.add(url)
                 print(f"Added common path: {url}")
 
@@ -744,20 +658,33 @@ class Estrella:
                 if (url not in self.visited_urls and 
                     url not in self.urls_in_queue and 
                     self.in_domain(url)):
-                    heapq.heappush(self.queue, (0, url))
+                    seeds.append((url, 0))
                     self.urls_in_queue.add(url)
                     print(f"Added URL from sitemap: {url}")
 
-        new_urls_added = len(self.queue) - initial_queue_size
+        self.enqueue_many(seeds)
+        new_urls_added = len(seeds)
         if new_urls_added == 0:
             print("WARNING: Could not find any new URLs to crawl!")
         else:
             print(f"Successfully added {new_urls_added} new URLs to crawl")
 
 if __name__ == "__main__":
-    url = "https://www.fri.uni-lj.si/"  
-    workers = 6
-    max_pages = 5000
-
-    estrella = Estrella(url, workers, max_pages)
+    parser = argparse.ArgumentParser(description="Crawl a domain into crawldb")
+    parser.add_argument("--url", default="https://www.fri.uni-lj.si/", help="Domain to crawl")
+    parser.add_argument("--workers", type=int, default=6, help="Crawler threads (async engine: result handler threads)")
+    parser.add_argument("--max-pages", type=int, default=5000, help="Stop after storing this many HTML pages")
+    parser.add_argument("--engine", choices=["selenium", "async"], default="selenium",
+                        help="selenium renders every page; async fetches with aiohttp and renders only JavaScript pages")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Concurrent fetches of the async engine")
+    parser.add_argument("--browsers", type=int, help="Pooled headless browsers (default: one per worker)")
+    parser.add_argument("--shared-frontier", action="store_true",
+                        help="Keep the frontier in the database so several crawler processes can share it")
+    parser.add_argument("--asset-dir", help="Store downloaded images and binaries in this directory instead of the database")
+    parser.add_argument("--download-binaries", action="store_true", help="Download linked binaries, not only their URLs")
+    args = parser.parse_args()
+
+    estrella = Estrella(args.url, args.workers, args.max_pages, engine=args.engine, max_in_flight=args.max_in_flight,
+                        browsers=args.browsers, shared_frontier=args.shared_frontier, asset_dir=args.asset_dir,
+                        download_binaries=args.download_binaries)
     estrella.crawl()
\ No newline at end of file
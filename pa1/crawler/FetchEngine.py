@@ -0,0 +1,168 @@
+import asyncio
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import aiohttp
+
+FetchResult = namedtuple("FetchResult", ["url", "status", "content_type", "html", "rendered"])
+
+# Markers of client-side rendered pages: an empty SPA mount point or a
+# <noscript> block asking the visitor to turn JavaScript on.
+EMPTY_APP_ROOT = re.compile(r"<div[^>]+id=[\"'](?:root|app|__next|__nuxt)[\"'][^>]*>\s*</div>", re.IGNORECASE)
+NOSCRIPT_NOTICE = re.compile(r"<noscript[^>]*>[^<]*(?:enable|omogo\w*)\s+javascript", re.IGNORECASE)
+SCRIPT_OR_STYLE = re.compile(r"<(script|style)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r"<[^>]+>")
+
+
+def needs_js_rendering(html, min_words=50):
+    """
+    Guess whether a page needs a real browser to show its content.
+
+    Args:
+        html (str): Raw HTML returned by the server.
+        min_words (int): Pages with fewer visible words that still ship
+            scripts are treated as client-side rendered.
+
+    Returns:
+        bool: True if the page should be rendered with Selenium.
+    """
+    if not html:
+        return False
+    if EMPTY_APP_ROOT.search(html) or NOSCRIPT_NOTICE.search(html):
+        return True
+
+    visible_text = TAG.sub(" ", SCRIPT_OR_STYLE.sub(" ", html))
+    return len(visible_text.split()) < min_words and "<script" in html.lower()
+
+
+class HostTokenBucket:
+    """Token bucket limiting how often a single host is hit."""
+
+    def __init__(self, delay, burst=1):
+        self.delay = delay
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request to this host is allowed."""
+        if not self.delay or self.delay <= 0:
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.delay)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.delay)
+
+
+class AsyncFetchEngine:
+    """
+    Fetches pages with aiohttp, keeping many requests in flight while each
+    host is throttled by its own token bucket. Pages that look like they need
+    JavaScript are handed to a blocking renderer (Selenium) in a thread pool.
+    """
+
+    def __init__(self, user_agent, crawl_delay=None, renderer=None, max_in_flight=1000,
+                 per_host_connections=8, workers=4, timeout=10, burst=1):
+        """
+        Args:
+            user_agent (str): User-Agent header sent with every request.
+            crawl_delay (callable): Maps a host name to its delay in seconds
+                (usually from robots.txt). None disables throttling.
+            renderer (callable): Blocking function url -> html used for pages
+                flagged by needs_js_rendering. None disables rendering.
+            max_in_flight (int): Maximum number of concurrent fetches.
+            per_host_connections (int): Open connections allowed per host.
+            workers (int): Threads for rendering and result handling.
+            timeout (int): Total timeout of a single request in seconds.
+            burst (int): Requests a host may receive back to back.
+        """
+        self.user_agent = user_agent
+        self.crawl_delay = crawl_delay
+        self.renderer = renderer
+        self.max_in_flight = max_in_flight
+        self.per_host_connections = per_host_connections
+        self.workers = workers
+        self.timeout = timeout
+        self.burst = burst
+        self.buckets = {}
+
+    def bucket_for(self, host):
+        """Return the token bucket of a host, creating it on first use."""
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            delay = self.crawl_delay(host) if self.crawl_delay else None
+            bucket = HostTokenBucket(delay, self.burst)
+            self.buckets[host] = bucket
+        return bucket
+
+    async def fetch(self, session, url):
+        """Fetch a single URL, respecting the per-host rate limit."""
+        await self.bucket_for(urlparse(url).netloc).acquire()
+
+        async with session.get(url, allow_redirects=True) as response:
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            html = None
+            # Only HTML bodies are read; binaries are classified by their header.
+            if content_type in ("text/html", "application/xhtml+xml", ""):
+                html = await response.text(errors="replace")
+            return FetchResult(url, response.status, content_type or "text/html", html, False)
+
+    async def _crawl_one(self, session, url, on_result, executor, slots):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await self.fetch(session, url)
+            if self.renderer and result.html is not None and needs_js_rendering(result.html):
+                print(f"Rendering {url} with Selenium")
+                rendered_html = await loop.run_in_executor(executor, self.renderer, url)
+                if rendered_html:
+                    result = result._replace(html=rendered_html, rendered=True)
+            await loop.run_in_executor(executor, on_result, result)
+        except Exception as e:
+            print(f"Error fetching {url}: {e}")
+            await loop.run_in_executor(executor, on_result, FetchResult(url, None, None, None, False))
+        finally:
+            slots.release()
+
+    async def run(self, next_url, on_result):
+        """
+        Crawl until the frontier is exhausted.
+
+        Args:
+            next_url (callable): Returns the next URL to fetch or None when
+                nothing is ready. It may block (e.g. leasing from the shared
+                frontier), so it runs on its own thread.
+            on_result (callable): Blocking handler called with every
+                FetchResult; it runs in a worker thread and may add new URLs.
+        """
+        slots = asyncio.Semaphore(self.max_in_flight)
+        in_flight = set()
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.per_host_connections)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                ThreadPoolExecutor(max_workers=1) as frontier_executor:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                             headers={"User-Agent": self.user_agent}) as session:
+                while True:
+                    url = await loop.run_in_executor(frontier_executor, next_url)
+                    if url is None:
+                        if not in_flight:
+                            break
+                        # Running fetches may still discover new links.
+                        await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                        continue
+
+                    await slots.acquire()
+                    task = asyncio.create_task(self._crawl_one(session, url, on_result, executor, slots))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
@@ -0,0 +1,223 @@
+import os
+import socket
+from threading import Lock, Event, Thread
+from psycopg2.extras import execute_values
+
+
+class SharedFrontier:
+    """
+    Crawl frontier stored as FRONTIER rows in crawldb.page.
+
+    Workers lease batches of URLs with FOR UPDATE SKIP LOCKED, so any number of
+    processes or machines can drain the same frontier without blocking each
+    other. A lease expires after lease_seconds; URLs leased by a crashed worker
+    are then handed out again automatically. Leases of URLs a live worker still
+    holds are renewed in the background, so a long local buffer never outlives
+    its lease.
+
+    URLs handled without being stored are retired with lease_expires =
+    'infinity'. They are kept (links may point at them) but excluded from the
+    dequeue index, so leasing cost does not grow with the crawl.
+    """
+
+    def __init__(self, db, owner=None, lease_seconds=300, batch_size=50):
+        """
+        Args:
+            db (PostgresDB): Connected database wrapper.
+            owner (str): Name of this worker, defaults to host:pid.
+            lease_seconds (int): How long a leased URL stays reserved.
+            batch_size (int): URLs leased per round trip.
+        """
+        self.db = db
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.buffer = []
+        self.active = set()
+        self.lock = Lock()
+        self.stopped = Event()
+        self.renewer = Thread(target=self._renew_periodically, daemon=True)
+        self.renewer.start()
+
+    def init_schema(self):
+        """Add the priority and lease columns plus the partial index of pending URLs used for dequeueing."""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS priority FLOAT DEFAULT 0;
+                    ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(255);
+                    ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS lease_expires TIMESTAMP;
+                    DROP INDEX IF EXISTS crawldb.idx_page_frontier_priority;
+                    CREATE INDEX IF NOT EXISTS idx_page_frontier_pending
+                        ON crawldb.page (priority, id)
+                        WHERE page_type_code = 'FRONTIER' AND lease_expires IS DISTINCT FROM 'infinity';
+                """)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error initializing frontier schema: {e}")
+            finally:
+                cursor.close()
+
+    def add_many(self, urls, site_id=None):
+        """
+        Add URLs to the frontier. Known URLs keep their row, but a frontier
+        entry is moved up if it is found again with a better priority.
+
+        Args:
+            urls (list): (url, priority) tuples.
+            site_id (int): Site the URLs belong to.
+        """
+        # ON CONFLICT may touch each row only once per statement.
+        best = {}
+        for url, priority in urls:
+            if url not in best or priority < best[url]:
+                best[url] = priority
+        if not best:
+            return
+
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                execute_values(cursor, """
+                    INSERT INTO crawldb.page (site_id, url, page_type_code, priority)
+                    VALUES %s
+                    ON CONFLICT (url) DO UPDATE
+                    SET priority = LEAST(crawldb.page.priority, EXCLUDED.priority)
+                    WHERE crawldb.page.page_type_code = 'FRONTIER';
+                """, [(site_id, url, 'FRONTIER', priority) for url, priority in best.items()])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error adding URLs to frontier: {e}")
+            finally:
+                cursor.close()
+
+    def add(self, url, priority=0, site_id=None):
+        """Add a single URL to the frontier."""
+        self.add_many([(url, priority)], site_id)
+
+    def lease(self, limit=None):
+        """
+        Reserve the best unleased frontier URLs for this worker.
+
+        Returns:
+            list: (priority, url) tuples ordered by priority.
+        """
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    UPDATE crawldb.page p
+                    SET lease_owner = %s,
+                        lease_expires = now() + %s * interval '1 second'
+                    WHERE p.id IN (
+                        SELECT id
+                        FROM crawldb.page
+                        WHERE page_type_code = 'FRONTIER'
+                        AND lease_expires IS DISTINCT FROM 'infinity'
+                        AND (lease_expires IS NULL OR lease_expires < now())
+                        ORDER BY priority, id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING p.priority, p.url;
+                """, (self.owner, self.lease_seconds, limit or self.batch_size))
+                leased = sorted(cursor.fetchall())
+                conn.commit()
+                return leased
+            except Exception as e:
+                conn.rollback()
+                print(f"Error leasing frontier URLs: {e}")
+                return []
+            finally:
+                cursor.close()
+
+    def next_url(self):
+        """Return the next leased (priority, url), leasing a new batch when needed, or None."""
+        with self.lock:
+            if not self.buffer:
+                # Keep the buffer reversed so pop() returns the best entry.
+                self.buffer = self.lease()[::-1]
+            if self.buffer:
+                item = self.buffer.pop()
+                self.active.add(item[1])
+                return item
+        return None
+
+    def renew(self):
+        """Extend the leases of all URLs this worker holds, buffered or being crawled."""
+        with self.lock:
+            urls = [url for _, url in self.buffer] + list(self.active)
+        if not urls:
+            return
+
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    UPDATE crawldb.page
+                    SET lease_expires = now() + %s * interval '1 second'
+                    WHERE url = ANY(%s) AND lease_owner = %s
+                    AND page_type_code = 'FRONTIER' AND lease_expires IS DISTINCT FROM 'infinity';
+                """, (self.lease_seconds, urls, self.owner))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error renewing frontier leases: {e}")
+            finally:
+                cursor.close()
+
+    def _renew_periodically(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            self.renew()
+
+    def _set_lease(self, url, expires):
+        with self.lock:
+            self.active.discard(url)
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    UPDATE crawldb.page
+                    SET lease_owner = %s, lease_expires = {expires}
+                    WHERE url = %s AND page_type_code = 'FRONTIER';
+                """, (self.owner, url))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error updating frontier lease: {e}")
+            finally:
+                cursor.close()
+
+    def finish(self, url):
+        """Retire a URL that was handled without being stored, so it is never leased again."""
+        self._set_lease(url, "'infinity'")
+
+    def release(self, url):
+        """Give a leased URL back to the frontier so another worker can retry it."""
+        self._set_lease(url, "NULL")
+
+    def pending(self):
+        """Number of URLs left in the shared frontier, including those leased by any worker."""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT COUNT(*)
+                    FROM crawldb.page
+                    WHERE page_type_code = 'FRONTIER' AND lease_expires IS DISTINCT FROM 'infinity';
+                """)
+                return cursor.fetchone()[0]
+            except Exception as e:
+                conn.rollback()
+                print(f"Error counting frontier URLs: {e}")
+                return 0
+            finally:
+                cursor.close()
+
+    def close(self):
+        """Stop renewing leases; URLs still held expire and are leased again by other workers."""
+        self.stopped.set()
+        self.renewer.join()
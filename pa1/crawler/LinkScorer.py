@@ -0,0 +1,98 @@
+import math
+from collections import Counter
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+def context_window(surrounding_text, link_text, window_size=50):
+    """
+    Text around a link: up to window_size characters on each side of where
+    the link text starts inside the text of its parent element.
+
+    Args:
+        surrounding_text (str): Text of the link's parent element.
+        link_text (str): Text of the link itself.
+        window_size (int): Characters kept before and after the link text.
+
+    Returns:
+        str: Surrounding text.
+    """
+    index = surrounding_text.find(link_text)
+    start = max(0, index - window_size)
+    end = min(len(surrounding_text), index + window_size)
+    return surrounding_text[start:end]
+
+
+def link_context(link_tag, window_size=50):
+    """Context window of a BeautifulSoup link tag."""
+    return context_window(link_tag.parent.text, link_tag.text, window_size)
+
+
+class LinkScorer:
+    """
+    Scores links by how well their surrounding text matches a list of keywords.
+
+    The keywords are tokenized once into a fixed vocabulary and an L2-normalized
+    sparse keyword matrix. A page's link contexts are then scored together with
+    one sparse matrix product. The score is 1 - (highest cosine similarity to
+    any keyword), using the same tokenization as CountVectorizer(stop_words='english'),
+    so lower numbers mean higher priority.
+    """
+
+    def __init__(self, keywords, stop_words='english'):
+        """
+        Args:
+            keywords (list): Keywords or keyword phrases to score against.
+            stop_words (str|list): Stop words, as accepted by CountVectorizer.
+        """
+        self.keywords = list(keywords)
+        self.analyzer = CountVectorizer(stop_words=stop_words).build_analyzer()
+        self.vocabulary = {}
+
+        rows, cols, values = [], [], []
+        for row, keyword in enumerate(self.keywords):
+            counts = Counter(self.analyzer(keyword))
+            norm = math.sqrt(sum(count * count for count in counts.values()))
+            for token, count in counts.items():
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                values.append(count / norm)
+        self.keyword_matrix = csr_matrix((values, (rows, cols)),
+                                         shape=(len(self.keywords), len(self.vocabulary))).T.tocsr()
+
+    def score_contexts(self, contexts):
+        """
+        Score many link contexts at once.
+
+        Args:
+            contexts (list): Surrounding texts, one per link.
+
+        Returns:
+            list: Priority per context (lower number represents high priority).
+        """
+        if not contexts:
+            return []
+
+        rows, cols, values = [], [], []
+        norms = np.zeros(len(contexts))
+        for row, context in enumerate(contexts):
+            counts = Counter(self.analyzer(context))
+            # The norm covers every context token, including those no keyword contains.
+            norms[row] = math.sqrt(sum(count * count for count in counts.values()))
+            for token, count in counts.items():
+                col = self.vocabulary.get(token)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(count)
+        context_matrix = csr_matrix((values, (rows, cols)), shape=(len(contexts), len(self.vocabulary)))
+
+        similarities = (context_matrix @ self.keyword_matrix).toarray()
+        highest = similarities.max(axis=1) if similarities.shape[1] else np.zeros(len(contexts))
+        highest = np.divide(highest, norms, out=np.zeros_like(highest), where=norms > 0)
+        return (1 - np.maximum(highest, 0.0)).tolist()
+
+    def score(self, context):
+        """Score a single link context."""
+        return self.score_contexts([context])[0]
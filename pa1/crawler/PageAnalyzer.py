@@ -0,0 +1,142 @@
+import mimetypes
+import re
+from collections import namedtuple
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from LinkScorer import context_window
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# Everything found on a page in one parse.
+#   links:    (url, context) for every <a href>, context is the text around the link
+#   onclick:  (url, context) for JavaScript navigation in onclick attributes
+#   images:   image URLs
+#   binaries: (url, data_type_code) for linked or embedded documents
+PageAnalysis = namedtuple("PageAnalysis", ["links", "onclick", "images", "binaries"])
+
+ONCLICK_PATTERN = re.compile(r'(?:window\.location|location\.href)\s*=\s*[\'"]([^\'"]+)[\'"]')
+
+BINARY_TYPES = {
+    'application/pdf': 'PDF',
+    'application/msword': 'DOC',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'DOCX',
+    'application/vnd.ms-powerpoint': 'PPT',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation': 'PPTX',
+}
+
+BINARY_TAGS = {"a", "embed", "object", "iframe"}
+
+
+def resolve_url(base_url, href):
+    """Resolve a link against the page URL; protocol-relative links default to https."""
+    href = href.strip()
+    if href.startswith("//"):
+        return "https:" + href
+    return urljoin(base_url, href)
+
+
+class PageAnalyzer:
+    """
+    Extracts links, onclick targets, images and binary references from an
+    HTML page in a single parse and a single walk over the tree.
+
+    lxml is used when it is installed, html.parser through BeautifulSoup otherwise.
+    """
+
+    def __init__(self, window_size=50, binary_types=None, parser=None):
+        """
+        Args:
+            window_size (int): Characters of text kept on each side of a link as its context.
+            binary_types (dict): MIME type to page_data type code for binary references.
+            parser (str): "lxml" or "html.parser"; defaults to lxml when available.
+        """
+        self.window_size = window_size
+        self.binary_types = binary_types or BINARY_TYPES
+        self.parser = parser or ("lxml" if HAS_LXML else "html.parser")
+
+    def _elements(self, html_content):
+        """Parse the page and yield (tag name, attributes, text getter, parent element) per element."""
+        if self.parser == "lxml":
+            try:
+                try:
+                    root = lxml.html.fromstring(html_content)
+                except ValueError:
+                    # Strings with an XML encoding declaration are rejected as str.
+                    root = lxml.html.fromstring(html_content.encode("utf-8"))
+            except ParserError:
+                # Comment-only or otherwise empty documents have no elements.
+                return
+            for element in root.iter():
+                if isinstance(element.tag, str):
+                    yield (element.tag.lower(), element.attrib,
+                           element.text_content, element.getparent())
+        else:
+            for tag in BeautifulSoup(html_content, "html.parser").find_all(True):
+                yield tag.name, tag.attrs, tag.get_text, tag.parent
+
+    def _text(self, element):
+        if element is None:
+            return ""
+        return element.text_content() if self.parser == "lxml" else element.get_text()
+
+    def file_type(self, url):
+        """Return the page_data type code of a URL based on its extension, or None."""
+        mimetype, _ = mimetypes.guess_type(url)
+        return self.binary_types.get(mimetype) if mimetype else None
+
+    def analyze(self, html_content, url):
+        """
+        Analyze an HTML page.
+
+        Args:
+            html_content (str): Page source.
+            url (str): URL of the page, used to resolve relative links.
+
+        Returns:
+            PageAnalysis: Links, onclick targets, images and binary references.
+        """
+        links, onclick, images, binaries = [], [], [], []
+        if not html_content or not html_content.strip():
+            return PageAnalysis(links, onclick, images, binaries)
+
+        base_url = url
+        # Many links share a parent (menus, lists); its text is computed once.
+        # The parent is kept in the cache so its id() cannot be reused.
+        parent_texts = {}
+
+        def context(text_of, parent):
+            key = id(parent)
+            if key not in parent_texts:
+                parent_texts[key] = (parent, self._text(parent))
+            return context_window(parent_texts[key][1], text_of(), self.window_size)
+
+        for name, attrs, text_of, parent in self._elements(html_content):
+            if name == "base" and attrs.get("href"):
+                base_url = resolve_url(url, attrs["href"])
+
+            if name == "a" and attrs.get("href"):
+                links.append((resolve_url(base_url, attrs["href"]), context(text_of, parent)))
+
+            if name == "img" and attrs.get("src"):
+                images.append(resolve_url(base_url, attrs["src"]))
+
+            if name in BINARY_TAGS:
+                src = attrs.get("src") or attrs.get("href")
+                if src:
+                    src_url = resolve_url(base_url, src)
+                    file_type = self.file_type(src_url)
+                    if file_type:
+                        binaries.append((src_url, file_type))
+
+            if attrs.get("onclick"):
+                targets = ONCLICK_PATTERN.findall(attrs["onclick"])
+                if targets:
+                    target_context = context(text_of, parent)
+                    onclick.extend((resolve_url(base_url, target), target_context) for target in targets)
+
+        return PageAnalysis(links, onclick, images, binaries)
@@ -1,9 +1,12 @@
 import os
+import time
 import dotenv
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import sys
 import os
 
@@ -12,6 +15,8 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from vector_processor import VectorProcessor
+from embedding_cache import EmbeddingCache, PostgresEmbeddingStore, SqliteEmbeddingStore
+from vector_snapshot import SnapshotQuerier, QUANTIZATIONS
 from html_cleaner import HTMLCleaner
 
 
@@ -22,22 +27,259 @@ db_password = os.getenv("DB_PASSWORD", "Admin")
 db_host = os.getenv("DB_HOST", "localhost")
 db_port = os.getenv("DB_PORT", "5432")
 
+# pgvector rejects hnsw.ef_search values above this, and HNSW returns at most
+# ef_search rows, so it also bounds the candidates taken from an HNSW index.
+MAX_EF_SEARCH = 1000
+
+# Nearest segments for semantic_search. The exact variant orders by the full
+# vector; the quantized ones take rerank candidates in the order of a
+# quantized index (see vector_index.py) and re-rank them with the full vector.
+NEAREST_QUERY = """
+        SELECT 
+            ps.id AS segment_id,
+            ps.page_id,
+            ps.page_segment,
+            ps.embedding <=> %(embedding)s::vector AS distance
+        FROM 
+            crawldb.page_segment ps
+        ORDER BY 
+            distance
+        LIMIT %(limit)s
+"""
+
+QUANTIZED_NEAREST_QUERY = """
+        SELECT 
+            coarse.segment_id,
+            coarse.page_id,
+            coarse.page_segment,
+            coarse.embedding <=> %(embedding)s::vector AS distance
+        FROM (
+            SELECT ps.id AS segment_id, ps.page_id, ps.page_segment, ps.embedding
+            FROM crawldb.page_segment ps
+            ORDER BY {coarse_order}
+            LIMIT %(candidates)s
+        ) coarse
+        ORDER BY 
+            distance
+        LIMIT %(limit)s
+"""
+
+# Coarse orderings; they must match the expressions of the quantized indexes
+QUANTIZED_ORDERS = {
+    "halfvec": "ps.embedding::halfvec({dim}) <=> %(embedding)s::halfvec({dim})",
+    "binary": "binary_quantize(ps.embedding)::bit({dim}) <~> binary_quantize(%(embedding)s::vector)",
+}
+
+# Hybrid search candidates. Both retrievals are driven by an index (GIN on
+# page_segment_tsv, ANN on embedding); the other signal is only computed for
+# the returned candidates.
+TEXT_CANDIDATES_QUERY = """
+    SELECT 
+        c.segment_id,
+        c.page_id,
+        c.page_segment,
+        cp.url,
+        c.text_rank,
+        TRUE AS text_match,
+        1 - (c.embedding <=> %(embedding)s::vector) AS vector_similarity
+    FROM (
+        SELECT 
+            ps.id AS segment_id,
+            ps.page_id,
+            ps.page_segment,
+            ps.embedding,
+            ts_rank_cd(ps.page_segment_tsv, q) AS text_rank
+        FROM 
+            crawldb.page_segment ps,
+            plainto_tsquery('english', %(query)s) q
+        WHERE 
+            ps.page_segment_tsv @@ q
+        ORDER BY 
+            text_rank DESC
+        LIMIT %(limit)s
+    ) c
+    JOIN 
+        crawldb.cleaned_page cp ON c.page_id = cp.id;
+"""
+
+VECTOR_CANDIDATES_QUERY = """
+    SELECT 
+        c.segment_id,
+        c.page_id,
+        c.page_segment,
+        cp.url,
+        ts_rank_cd(c.page_segment_tsv, q) AS text_rank,
+        c.page_segment_tsv @@ q AS text_match,
+        1 - c.distance AS vector_similarity
+    FROM (
+        SELECT 
+            ps.id AS segment_id,
+            ps.page_id,
+            ps.page_segment,
+            ps.page_segment_tsv,
+            ps.embedding <=> %(embedding)s::vector AS distance
+        FROM 
+            crawldb.page_segment ps
+        ORDER BY 
+            distance
+        LIMIT %(limit)s
+    ) c
+    JOIN 
+        crawldb.cleaned_page cp ON c.page_id = cp.id,
+        plainto_tsquery('english', %(query)s) q;
+"""
+
+
+def fuse_hybrid_candidates(candidates: List[Dict[str, Any]], limit: int, text_weight: float = 0.4,
+                           vector_weight: float = 0.6, vector_threshold: float = 0.6) -> List[Dict[str, Any]]:
+    """Merge full-text and vector candidates into one ranking.
+    
+    Args:
+        candidates: Rows from both retrievals; a segment may appear in both
+        limit: Maximum number of results to return
+        text_weight: Weight of the full-text rank
+        vector_weight: Weight of the vector similarity
+        vector_threshold: Minimum similarity for segments that do not match the keywords
+        
+    Returns:
+        Segments ordered by combined_score
+    """
+    merged = {}
+    for row in candidates:
+        if row['text_match'] or row['vector_similarity'] > vector_threshold:
+            merged.setdefault(row['segment_id'], row)
+    
+    results = []
+    for row in merged.values():
+        row = dict(row)
+        row['combined_score'] = row['text_rank'] * text_weight + row['vector_similarity'] * vector_weight
+        del row['text_match']
+        results.append(row)
+    results.sort(key=lambda row: row['combined_score'], reverse=True)
+    return results[:limit]
+
+
+# Candidate retrievers of hybrid_search. Each returns a bounded, ranked list
+# of segment ids straight from its index.
+TEXT_RETRIEVER_QUERY = """
+    SELECT ps.id AS segment_id, ts_rank_cd(ps.page_segment_tsv, q) AS score
+    FROM crawldb.page_segment ps, plainto_tsquery('english', %(query)s) q
+    WHERE ps.page_segment_tsv @@ q
+    ORDER BY score DESC
+    LIMIT %(limit)s;
+"""
+
+VECTOR_RETRIEVER_QUERY = """
+    SELECT ps.id AS segment_id, ps.embedding <=> %(embedding)s::vector AS distance
+    FROM crawldb.page_segment ps
+    ORDER BY distance
+    LIMIT %(limit)s;
+"""
+
+
+# Batch variants: one statement answers many queries, each passed by its
+# position in the batch and looked up through the same indexes.
+TEXT_RETRIEVER_BATCH_QUERY = """
+    SELECT q.query_index, c.segment_id, c.score
+    FROM unnest(%(queries)s::text[]) WITH ORDINALITY AS q(query, query_index)
+    CROSS JOIN LATERAL (
+        SELECT ps.id AS segment_id, ts_rank_cd(ps.page_segment_tsv, tsq) AS score
+        FROM crawldb.page_segment ps, plainto_tsquery('english', q.query) tsq
+        WHERE ps.page_segment_tsv @@ tsq
+        ORDER BY score DESC
+        LIMIT %(limit)s
+    ) c;
+"""
+
+VECTOR_RETRIEVER_BATCH_QUERY = """
+    SELECT q.query_index, c.segment_id, c.distance
+    FROM unnest(%(embeddings)s::vector[]) WITH ORDINALITY AS q(embedding, query_index)
+    CROSS JOIN LATERAL (
+        SELECT ps.id AS segment_id, ps.embedding <=> q.embedding AS distance
+        FROM crawldb.page_segment ps
+        ORDER BY distance
+        LIMIT %(limit)s
+    ) c;
+"""
+
+# Connections (and threads) used for parallel candidate retrieval
+RETRIEVAL_CONNECTIONS = 4
+
+
+def vector_literal(embedding) -> str:
+    """Text form of a pgvector value, used to pass many vectors as one vector[] parameter."""
+    return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[int]], weights: Dict[str, float],
+                           k: int = 60) -> Dict[int, float]:
+    """Fuse ranked lists with weighted reciprocal rank fusion.
+    
+    Args:
+        rankings: Segment ids of each retriever, best first
+        weights: Weight of each retriever
+        k: RRF constant; larger values flatten the difference between ranks
+        
+    Returns:
+        Fused score of every segment id
+    """
+    fused: Dict[int, float] = {}
+    for name, ids in rankings.items():
+        weight = weights.get(name, 1.0)
+        for rank, segment_id in enumerate(ids, 1):
+            fused[segment_id] = fused.get(segment_id, 0.0) + weight / (k + rank)
+    return fused
+
+
+def normalized_score_fusion(scores: Dict[str, Dict[int, float]], weights: Dict[str, float]) -> Dict[int, float]:
+    """Fuse retriever scores after min-max normalizing each list to 0-1.
+    
+    Args:
+        scores: Score of each segment id per retriever (higher is better)
+        weights: Weight of each retriever
+        
+    Returns:
+        Weighted sum of the normalized scores of every segment id
+    """
+    fused: Dict[int, float] = {}
+    for name, retriever_scores in scores.items():
+        if not retriever_scores:
+            continue
+        weight = weights.get(name, 1.0)
+        low, high = min(retriever_scores.values()), max(retriever_scores.values())
+        for segment_id, score in retriever_scores.items():
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            fused[segment_id] = fused.get(segment_id, 0.0) + weight * normalized
+    return fused
+
 
 class VectorDBQuerier:
-    def __init__(self, vector_processor: VectorProcessor):
+    def __init__(self, vector_processor: VectorProcessor, ef_search: Optional[int] = None,
+                 probes: Optional[int] = None, quantization: Optional[str] = None, rerank_factor: int = 10):
         """Initialize the vector database querier.
         
         Args:
             vector_processor: Instance of VectorProcessor for creating embeddings
+            ef_search: Default HNSW candidate list size for vector searches (pgvector default: 40)
+            probes: Default number of IVFFlat lists scanned by vector searches (pgvector default: 1)
+            quantization: Default coarse pass of semantic_search: None, "halfvec" or "binary"
+            rerank_factor: Candidates per result re-ranked with full vectors after a quantized pass
         """
+        if quantization not in (None, *QUANTIZED_ORDERS):
+            raise ValueError(f"Unknown quantization {quantization}, expected one of {list(QUANTIZED_ORDERS)}")
         
         self.vector_processor = vector_processor
+        self.ef_search = ef_search
+        self.probes = probes
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
         self.connection = self._get_connection()
+        self.retrieval_pool = None
+        self.retrieval_executor = None
         print(f"Connecting to the database {db_name}")
         
-    def _get_connection(self):
-        """Establish database connection."""
-        connection_params = {
+    def _connection_params(self) -> Dict[str, Any]:
+        return {
             "host": db_host,
             "port": db_port,
             "database": db_name,
@@ -45,45 +287,154 @@ class VectorDBQuerier:
             "password": db_password,
             "cursor_factory": RealDictCursor
         }
-        return psycopg2.connect(**connection_params)
     
-    def semantic_search(self, query: str, limit: int = 5, similarity_threshold: float = 0.5) -> List[Dict[str, Any]]:
+    def _get_connection(self):
+        """Establish database connection."""
+        return psycopg2.connect(**self._connection_params())
+    
+    def _ensure_retrieval_pool(self):
+        if self.retrieval_pool is None:
+            self.retrieval_pool = ThreadedConnectionPool(0, RETRIEVAL_CONNECTIONS, **self._connection_params())
+            self.retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_CONNECTIONS)
+    
+    def _run_batched(self, sql: str, params: Dict[str, Any], batch_key: str, chunk_size: int,
+                     ef_search: Optional[int] = None, probes: Optional[int] = None) -> Tuple[List[Dict[str, Any]], float]:
+        """Run a batch retriever over chunks of the batch in parallel.
+        
+        Args:
+            sql: Batch query numbering its inputs with query_index (1-based within the chunk)
+            params: Query parameters; params[batch_key] is the list that is split into chunks
+            batch_key: Name of the batched parameter
+            chunk_size: Inputs per statement
+            
+        Returns:
+            Rows with query_index rewritten to the 0-based position in the whole batch, and the
+            elapsed time in milliseconds
+        """
+        start = time.perf_counter()
+        batch = params[batch_key]
+        futures = []
+        for offset in range(0, len(batch), chunk_size):
+            chunk_params = dict(params, **{batch_key: batch[offset:offset + chunk_size]})
+            futures.append((offset, self.retrieval_executor.submit(
+                self._run_retriever, sql, chunk_params, ef_search, probes)))
+        rows = []
+        for offset, future in futures:
+            for row in future.result()[0]:
+                row['query_index'] = offset + row['query_index'] - 1
+                rows.append(row)
+        return rows, (time.perf_counter() - start) * 1000
+    
+    def _run_retriever(self, sql: str, params: Dict[str, Any], ef_search: Optional[int] = None,
+                       probes: Optional[int] = None) -> Tuple[List[Dict[str, Any]], float]:
+        """Run one candidate query on its own pooled connection.
+        
+        Returns:
+            Rows and the elapsed time in milliseconds
+        """
+        start = time.perf_counter()
+        connection = self.retrieval_pool.getconn()
+        try:
+            with connection:
+                with connection.cursor() as cursor:
+                    self._apply_search_settings(cursor, ef_search, probes)
+                    cursor.execute(sql, params)
+                    rows = cursor.fetchall()
+        finally:
+            self.retrieval_pool.putconn(connection)
+        return rows, (time.perf_counter() - start) * 1000
+    
+    def _apply_search_settings(self, cursor, ef_search: Optional[int] = None, probes: Optional[int] = None):
+        """Set the ANN index knobs for the current transaction only.
+        
+        Args:
+            cursor: Cursor inside the transaction that runs the search
+            ef_search: HNSW candidate list size; should be at least the number of results wanted,
+                and is clamped to MAX_EF_SEARCH
+            probes: IVFFlat lists to scan; higher values trade speed for recall
+        """
+        ef_search = ef_search or self.ef_search
+        probes = probes or self.probes
+        if ef_search:
+            ef_search = min(int(ef_search), MAX_EF_SEARCH)
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true);", (str(ef_search),))
+        if probes:
+            cursor.execute("SELECT set_config('ivfflat.probes', %s, true);", (str(int(probes)),))
+
+    def _ef_search_for(self, candidates: int, ef_search: Optional[int] = None) -> int:
+        """HNSW candidate list size that returns the given number of candidates.
+        
+        Args:
+            candidates: Rows wanted from the vector index
+            ef_search: Requested candidate list size; defaults to the querier setting
+            
+        Returns:
+            ef_search raised to candidates, clamped to MAX_EF_SEARCH
+        """
+        return min(max(ef_search or self.ef_search or 0, candidates), MAX_EF_SEARCH)
+
+    def semantic_search(self, query: str, limit: int = 5, similarity_threshold: float = 0.5,
+                        ef_search: Optional[int] = None, probes: Optional[int] = None,
+                        embedding: Optional[List[float]] = None, quantization: Optional[str] = None,
+                        rerank_factor: Optional[int] = None) -> List[Dict[str, Any]]:
         """Search for semantically similar content based on vector similarity.
         
+        The nearest segments are taken in distance order, so an HNSW or IVFFlat
+        index on the embedding is used when present, and the threshold is
+        applied to that candidate list. With quantization, limit * rerank_factor
+        candidates (at most MAX_EF_SEARCH) come from the halfvec or binary index
+        and are re-ranked by their full-precision distance.
+        
         Args:
             query: The search query text
             limit: Maximum number of results to return
             similarity_threshold: Minimum similarity score (0-1) to include in results
+            ef_search: HNSW candidate list size for this query; raised to the candidate count if lower
+            probes: IVFFlat lists scanned for this query
+            embedding: Precomputed embedding of query; created with the VectorProcessor when omitted
+            quantization: None (full vectors), "halfvec" or "binary"; defaults to the querier setting
+            rerank_factor: Candidates per result for the quantized pass; defaults to the querier setting
             
         Returns:
             List of matching segments with their metadata and similarity scores
         """
         try:
-            query_embedding = self.vector_processor.create_embedding(query)
-            
-            cursor = self.connection.cursor()
+            query_embedding = embedding if embedding is not None else self.vector_processor.create_embedding(query)
+            quantization = quantization or self.quantization
+            params = {'embedding': query_embedding, 'limit': limit, 'threshold': similarity_threshold}
+            if quantization:
+                params['candidates'] = min(limit * (rerank_factor or self.rerank_factor), MAX_EF_SEARCH)
+                coarse_order = QUANTIZED_ORDERS[quantization].format(dim=len(query_embedding))
+                nearest = QUANTIZED_NEAREST_QUERY.format(coarse_order=coarse_order)
+                # HNSW returns at most ef_search candidates
+                ef_search = self._ef_search_for(params['candidates'], ef_search)
+            else:
+                nearest = NEAREST_QUERY
+                ef_search = self._ef_search_for(limit, ef_search)
             
-            cursor.execute("""
+            with self.connection:
+                cursor = self.connection.cursor()
+                self._apply_search_settings(cursor, ef_search, probes)
+                
+                # The distance is computed once and the ORDER BY matches the index expression.
+                cursor.execute(f"""
     SELECT 
-        ps.id AS segment_id,
-        ps.page_id,
-        ps.page_segment,
+        nearest.segment_id,
+        nearest.page_id,
+        nearest.page_segment,
         cp.url,
-        1 - (ps.embedding <=> %s::vector) AS similarity
-    FROM 
-        crawldb.page_segment ps
+        1 - nearest.distance AS similarity
+    FROM ({nearest}) nearest
     JOIN 
-        crawldb.cleaned_page cp ON ps.page_id = cp.id
+        crawldb.cleaned_page cp ON nearest.page_id = cp.id
     WHERE 
-        1 - (ps.embedding <=> %s::vector) > %s
+        1 - nearest.distance > %(threshold)s
     ORDER BY 
-        similarity DESC
-    LIMIT %s;
-""", (query_embedding, query_embedding, similarity_threshold, limit))
+        nearest.distance;
+""", params)
 
-            
-            results = cursor.fetchall()
-            cursor.close()
+                results = cursor.fetchall()
+                cursor.close()
             
             return results
             
@@ -91,94 +442,338 @@ class VectorDBQuerier:
             print(f"Error in semantic search: {str(e)}")
             return []
     
-    def keyword_and_semantic_search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Hybrid search combining keyword matching and semantic similarity."""
+    def keyword_and_semantic_search(self, query: str, limit: int = 5, candidates: Optional[int] = None,
+                                    ef_search: Optional[int] = None, probes: Optional[int] = None,
+                                    embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Hybrid search combining keyword matching and semantic similarity.
+        
+        The top full-text matches (GIN index on page_segment_tsv) and the
+        nearest segments (vector index) are retrieved separately and fused
+        with fuse_hybrid_candidates, so no query scans the whole table.
+        
+        Args:
+            query: The search query text
+            limit: Maximum number of results to return
+            candidates: Candidates taken from each retrieval (default: 4 * limit, at least 20)
+            ef_search: HNSW candidate list size for this query
+            probes: IVFFlat lists scanned for this query
+            embedding: Precomputed embedding of query; created with the VectorProcessor when omitted
+            
+        Returns:
+            List of matching segments with text rank, vector similarity and combined score
+        """
         try:
+            query_embedding = embedding if embedding is not None else self.vector_processor.create_embedding(query)
+            candidates = candidates or max(limit * 4, 20)
+            params = {'query': query, 'embedding': query_embedding, 'limit': candidates}
+            
+            with self.connection:
+                cursor = self.connection.cursor()
+                # HNSW returns at most ef_search rows
+                self._apply_search_settings(cursor, self._ef_search_for(candidates, ef_search), probes)
+                cursor.execute(TEXT_CANDIDATES_QUERY, params)
+                rows = cursor.fetchall()
+                cursor.execute(VECTOR_CANDIDATES_QUERY, params)
+                rows += cursor.fetchall()
+                cursor.close()
+            
+            return fuse_hybrid_candidates(rows, limit)
+            
+        except Exception as e:
+            print(f"Error in hybrid search: {str(e)}")
+            return []
+    
+    def hybrid_search(self, query: str, limit: int = 5, fusion: str = "rrf",
+                      weights: Optional[Dict[str, float]] = None, candidates: Optional[Dict[str, int]] = None,
+                      rrf_k: int = 60, ef_search: Optional[int] = None,
+                      probes: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+        """Hybrid search that fuses independent full-text and vector retrievals.
+        
+        The full-text retriever (GIN index) starts while the query is being
+        embedded, the vector retriever (ANN index) as soon as the embedding is
+        ready; each runs on its own connection. Their bounded candidate lists
+        are fused by rank (RRF) or by min-max normalized score, and only the
+        final results are fetched with their text and URL.
+        
+        Args:
+            query: The search query text
+            limit: Maximum number of results to return
+            fusion: "rrf" or "normalized"
+            weights: Weight per retriever ("text", "vector"), 1.0 when omitted
+            candidates: Candidates taken per retriever ("text", "vector"), default 50 each
+            rrf_k: RRF constant
+            ef_search: HNSW candidate list size; raised to the vector candidate count if lower,
+                both clamped to MAX_EF_SEARCH
+            probes: IVFFlat lists scanned
+            
+        Returns:
+            Results ordered by fused_score, each with text_rank and/or similarity from the
+            retrievers that found it, and the latency of each stage in milliseconds
+        """
+        if fusion not in ("rrf", "normalized"):
+            raise ValueError(f"Unknown fusion method {fusion}, expected 'rrf' or 'normalized'")
+        weights = {"text": 1.0, "vector": 1.0, **(weights or {})}
+        candidates = {"text": 50, "vector": 50, **(candidates or {})}
+        # HNSW cannot return more vector candidates than MAX_EF_SEARCH
+        candidates['vector'] = min(candidates['vector'], MAX_EF_SEARCH)
+        self._ensure_retrieval_pool()
+        
+        timings: Dict[str, float] = {}
+        try:
+            start = time.perf_counter()
+            text_future = self.retrieval_executor.submit(
+                self._run_retriever, TEXT_RETRIEVER_QUERY, {'query': query, 'limit': candidates['text']})
+            
+            stage = time.perf_counter()
             query_embedding = self.vector_processor.create_embedding(query)
+            timings['embedding'] = (time.perf_counter() - stage) * 1000
+            
+            vector_future = self.retrieval_executor.submit(
+                self._run_retriever, VECTOR_RETRIEVER_QUERY,
+                {'embedding': query_embedding, 'limit': candidates['vector']},
+                self._ef_search_for(candidates['vector'], ef_search), probes)
+            text_rows, timings['text'] = text_future.result()
+            vector_rows, timings['vector'] = vector_future.result()
+            timings['retrieval'] = (time.perf_counter() - start) * 1000
+            
+            stage = time.perf_counter()
+            scores = {
+                "text": {row['segment_id']: row['score'] for row in text_rows},
+                "vector": {row['segment_id']: 1 - row['distance'] for row in vector_rows},
+            }
+            fused, top = self._fuse(scores, fusion, weights, rrf_k, limit)
+            timings['fusion'] = (time.perf_counter() - stage) * 1000
+            
+            stage = time.perf_counter()
+            rows = self._fetch_segments(top)
+            timings['fetch'] = (time.perf_counter() - stage) * 1000
+            
+            results = self._fused_results(top, fused, scores, rows)
+            timings['total'] = (time.perf_counter() - start) * 1000
+            return results, timings
+            
+        except Exception as e:
+            print(f"Error in hybrid search: {str(e)}")
+            return [], timings
+    
+    def _fuse(self, scores: Dict[str, Dict[int, float]], fusion: str, weights: Dict[str, float],
+              rrf_k: int, limit: int) -> Tuple[Dict[int, float], List[int]]:
+        """Fuse retriever scores (in rank order) and return all fused scores and the top ids."""
+        if fusion == "rrf":
+            rankings = {name: list(retriever_scores) for name, retriever_scores in scores.items()}
+            fused = reciprocal_rank_fusion(rankings, weights, rrf_k)
+        else:
+            fused = normalized_score_fusion(scores, weights)
+        return fused, sorted(fused, key=fused.get, reverse=True)[:limit]
+    
+    def _fetch_segments(self, segment_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Load text, page and URL of the given segments."""
+        with self.connection:
             cursor = self.connection.cursor()
-
             cursor.execute("""
-                SELECT 
-                    ps.id AS segment_id,
-                    ps.page_id,
-                    ps.page_segment,
-                    cp.url,
-                    ts_rank_cd(to_tsvector('english', ps.page_segment), plainto_tsquery('english', %s)) AS text_rank,
-                    1 - (ps.embedding <=> %s::vector) AS vector_similarity,
-                    (ts_rank_cd(to_tsvector('english', ps.page_segment), plainto_tsquery('english', %s)) * 0.4 + 
-                    (1 - (ps.embedding <=> %s::vector)) * 0.6) AS combined_score
-                FROM 
-                    crawldb.page_segment ps
-                JOIN 
-                    crawldb.cleaned_page cp ON ps.page_id = cp.id
-                WHERE 
-                    to_tsvector('english', ps.page_segment) @@ plainto_tsquery('english', %s)
-                    OR 1 - (ps.embedding <=> %s::vector) > 0.6
-                ORDER BY 
-                    combined_score DESC
-                LIMIT %s;
-            """, (query, query_embedding, query, query_embedding, query, query_embedding, limit))
-
-            results = cursor.fetchall()
+                SELECT ps.id AS segment_id, ps.page_id, ps.page_segment, cp.url
+                FROM crawldb.page_segment ps
+                JOIN crawldb.cleaned_page cp ON ps.page_id = cp.id
+                WHERE ps.id = ANY(%s);
+            """, (list(segment_ids),))
+            rows = {row['segment_id']: row for row in cursor.fetchall()}
             cursor.close()
+        return rows
+    
+    @staticmethod
+    def _fused_results(top: List[int], fused: Dict[int, float], scores: Dict[str, Dict[int, float]],
+                       rows: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = []
+        for segment_id in top:
+            if segment_id not in rows:
+                continue
+            result = dict(rows[segment_id])
+            result['fused_score'] = fused[segment_id]
+            if segment_id in scores['text']:
+                result['text_rank'] = scores['text'][segment_id]
+            if segment_id in scores['vector']:
+                result['similarity'] = scores['vector'][segment_id]
+            results.append(result)
+        return results
+    
+    def semantic_search_batch(self, queries: List[str], limit: int = 5, similarity_threshold: float = 0.5,
+                              chunk_size: int = 32, ef_search: Optional[int] = None,
+                              probes: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Semantic search for many queries at once.
+        
+        All queries are embedded together (cached ones skip the model), and
+        the nearest segments are found with one LATERAL join per chunk of
+        queries, chunks running in parallel on pooled connections.
+        
+        Args:
+            queries: Query texts
+            limit: Maximum number of results per query
+            similarity_threshold: Minimum similarity score (0-1) to include in results
+            chunk_size: Queries per SQL statement
+            ef_search: HNSW candidate list size; raised to limit if lower
+            probes: IVFFlat lists scanned
+            
+        Returns:
+            One result list per query, in the order of queries, like semantic_search
+        """
+        if not queries:
+            return []
+        try:
+            self._ensure_retrieval_pool()
+            embeddings = self.vector_processor.encode_texts(queries)
+            rows, _ = self._run_batched(
+                VECTOR_RETRIEVER_BATCH_QUERY,
+                {'embeddings': [vector_literal(embedding) for embedding in embeddings], 'limit': limit},
+                'embeddings', chunk_size, self._ef_search_for(limit, ef_search), probes)
+            
+            matches = [row for row in rows if 1 - row['distance'] > similarity_threshold]
+            segments = self._fetch_segments({row['segment_id'] for row in matches})
+            results = [[] for _ in queries]
+            for row in sorted(matches, key=lambda row: (row['query_index'], row['distance'])):
+                if row['segment_id'] in segments:
+                    result = dict(segments[row['segment_id']])
+                    result['similarity'] = 1 - row['distance']
+                    results[row['query_index']].append(result)
             return results
             
         except Exception as e:
-            print(f"Error in hybrid search: {str(e)}")
-            return []
+            print(f"Error in batch semantic search: {str(e)}")
+            return [[] for _ in queries]
     
-    def url_content_search(self, url_pattern: str, query: str = None, limit: int = 5) -> List[Dict[str, Any]]:
+    def hybrid_search_batch(self, queries: List[str], limit: int = 5, fusion: str = "rrf",
+                            weights: Optional[Dict[str, float]] = None,
+                            candidates: Optional[Dict[str, int]] = None, rrf_k: int = 60,
+                            chunk_size: int = 32, ef_search: Optional[int] = None,
+                            probes: Optional[int] = None) -> Tuple[List[List[Dict[str, Any]]], Dict[str, float]]:
+        """Hybrid search for many queries at once, fused per query like hybrid_search.
+        
+        The full-text retrieval of the whole batch starts while the queries
+        are embedded in one encode_texts call; both retrievers use batched
+        LATERAL joins over pooled connections.
+        
+        Args:
+            queries: Query texts
+            limit: Maximum number of results per query
+            fusion: "rrf" or "normalized"
+            weights: Weight per retriever ("text", "vector")
+            candidates: Candidates taken per retriever and query ("text", "vector")
+            rrf_k: RRF constant
+            chunk_size: Queries per SQL statement
+            ef_search: HNSW candidate list size; raised to the vector candidate count if lower,
+                both clamped to MAX_EF_SEARCH
+            probes: IVFFlat lists scanned
+            
+        Returns:
+            One result list per query, and the latency of each stage for the whole batch in milliseconds
+        """
+        if fusion not in ("rrf", "normalized"):
+            raise ValueError(f"Unknown fusion method {fusion}, expected 'rrf' or 'normalized'")
+        weights = {"text": 1.0, "vector": 1.0, **(weights or {})}
+        candidates = {"text": 50, "vector": 50, **(candidates or {})}
+        # HNSW cannot return more vector candidates than MAX_EF_SEARCH
+        candidates['vector'] = min(candidates['vector'], MAX_EF_SEARCH)
+        timings: Dict[str, float] = {}
+        if not queries:
+            return [], timings
+        self._ensure_retrieval_pool()
+        
+        try:
+            start = time.perf_counter()
+            # _run_batched waits on the shared executor, so it runs on its own thread here
+            with ThreadPoolExecutor(max_workers=1) as text_thread:
+                text_future = text_thread.submit(
+                    self._run_batched, TEXT_RETRIEVER_BATCH_QUERY,
+                    {'queries': list(queries), 'limit': candidates['text']}, 'queries', chunk_size)
+                
+                stage = time.perf_counter()
+                embeddings = self.vector_processor.encode_texts(queries)
+                timings['embedding'] = (time.perf_counter() - stage) * 1000
+                
+                vector_rows, timings['vector'] = self._run_batched(
+                    VECTOR_RETRIEVER_BATCH_QUERY,
+                    {'embeddings': [vector_literal(embedding) for embedding in embeddings],
+                     'limit': candidates['vector']},
+                    'embeddings', chunk_size, self._ef_search_for(candidates['vector'], ef_search), probes)
+                text_rows, timings['text'] = text_future.result()
+            timings['retrieval'] = (time.perf_counter() - start) * 1000
+            
+            stage = time.perf_counter()
+            scores = [{"text": {}, "vector": {}} for _ in queries]
+            for row in sorted(text_rows, key=lambda row: (row['query_index'], -row['score'])):
+                scores[row['query_index']]['text'][row['segment_id']] = row['score']
+            for row in sorted(vector_rows, key=lambda row: (row['query_index'], row['distance'])):
+                scores[row['query_index']]['vector'][row['segment_id']] = 1 - row['distance']
+            fused = [self._fuse(query_scores, fusion, weights, rrf_k, limit) for query_scores in scores]
+            timings['fusion'] = (time.perf_counter() - stage) * 1000
+            
+            stage = time.perf_counter()
+            rows = self._fetch_segments({segment_id for _, top in fused for segment_id in top})
+            timings['fetch'] = (time.perf_counter() - stage) * 1000
+            
+            results = [self._fused_results(top, query_fused, query_scores, rows)
+                       for (query_fused, top), query_scores in zip(fused, scores)]
+            timings['total'] = (time.perf_counter() - start) * 1000
+            return results, timings
+            
+        except Exception as e:
+            print(f"Error in batch hybrid search: {str(e)}")
+            return [[] for _ in queries], timings
+    
+    def url_content_search(self, url_pattern: str, query: str = None, limit: int = 5,
+                           embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Search for content within URLs matching a pattern, optionally filtered by query.
         
         Args:
             url_pattern: Pattern to match URLs (SQL LIKE pattern)
             query: Optional semantic query to filter results
             limit: Maximum number of results to return
+            embedding: Precomputed embedding of query; created with the VectorProcessor when omitted
             
         Returns:
             List of matching segments with their metadata
         """
         try:
-            cursor = self.connection.cursor()
-            
-            if query:
-                query_embedding = self.vector_processor.create_embedding(query)
+            with self.connection:
+                cursor = self.connection.cursor()
                 
-                cursor.execute("""
-                    SELECT 
-                        ps.id AS segment_id,
-                        ps.page_id,
-                        ps.page_segment,
-                        cp.url,
-                        1 - (ps.embedding <=> %s::float[]) AS similarity
-                    FROM 
-                        crawldb.page_segment ps
-                    JOIN 
-                        crawldb.cleaned_page cp ON ps.page_id = cp.id
-                    WHERE 
-                        cp.url LIKE %s
-                    ORDER BY 
-                        similarity DESC
-                    LIMIT %s;
-                """, (query_embedding, f"%{url_pattern}%", limit))
-            else:
-                cursor.execute("""
-                    SELECT 
-                        ps.id AS segment_id,
-                        ps.page_id,
-                        ps.page_segment,
-                        cp.url
-                    FROM 
-                        crawldb.page_segment ps
-                    JOIN 
-                        crawldb.cleaned_page cp ON ps.page_id = cp.id
-                    WHERE 
-                        cp.url LIKE %s
-                    LIMIT %s;
-                """, (f"%{url_pattern}%", limit))
-            
-            results = cursor.fetchall()
-            cursor.close()
+                if query:
+                    query_embedding = embedding if embedding is not None else self.vector_processor.create_embedding(query)
+                    
+                    cursor.execute("""
+                        SELECT 
+                            ps.id AS segment_id,
+                            ps.page_id,
+                            ps.page_segment,
+                            cp.url,
+                            1 - (ps.embedding <=> %s::vector) AS similarity
+                        FROM 
+                            crawldb.page_segment ps
+                        JOIN 
+                            crawldb.cleaned_page cp ON ps.page_id = cp.id
+                        WHERE 
+                            cp.url LIKE %s
+                        ORDER BY 
+                            similarity DESC
+                        LIMIT %s;
+                    """, (query_embedding, f"%{url_pattern}%", limit))
+                else:
+                    cursor.execute("""
+                        SELECT 
+                            ps.id AS segment_id,
+                            ps.page_id,
+                            ps.page_segment,
+                            cp.url
+                        FROM 
+                            crawldb.page_segment ps
+                        JOIN 
+                            crawldb.cleaned_page cp ON ps.page_id = cp.id
+                        WHERE 
+                            cp.url LIKE %s
+                        LIMIT %s;
+                    """, (f"%{url_pattern}%", limit))
+                
+                results = cursor.fetchall()
+                cursor.close()
             
             return results
             
@@ -196,16 +791,17 @@ class VectorDBQuerier:
             Tuple of (URL, full text content)
         """
         try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                SELECT url, plain_text
-                FROM crawldb.cleaned_page
-                WHERE id = %s;
-            """, (page_id,))
-            
-            result = cursor.fetchone()
-            cursor.close()
+            with self.connection:
+                cursor = self.connection.cursor()
+                
+                cursor.execute("""
+                    SELECT url, plain_text
+                    FROM crawldb.cleaned_page
+                    WHERE id = %s AND plain_text IS NOT NULL;
+                """, (page_id,))
+                
+                result = cursor.fetchone()
+                cursor.close()
             
             if result:
                 return result['url'], result['plain_text']
@@ -218,6 +814,10 @@ class VectorDBQuerier:
     
     def close(self):
         """Close the database connection."""
+        if self.retrieval_executor:
+            self.retrieval_executor.shutdown()
+        if self.retrieval_pool:
+            self.retrieval_pool.closeall()
         if self.connection:
             self.connection.close()
 
@@ -247,6 +847,8 @@ def display_results(results: List[Dict[str, Any]], show_similarity: bool = True)
             print(f"Text Rank: {result['text_rank']:.4f}")
         if 'combined_score' in result:
             print(f"Combined Score: {result['combined_score']:.4f}")
+        if 'fused_score' in result:
+            print(f"Fused Score: {result['fused_score']:.4f}")
             
         text = result['page_segment']
         if len(text) > 300:
@@ -256,6 +858,75 @@ def display_results(results: List[Dict[str, Any]], show_similarity: bool = True)
         print("-" * 80)
 
 
+def create_query_cache(model_name: str, cache: str = "memory", cache_path: str = "query_cache.sqlite",
+                       cache_memory: int = 1000) -> Optional[EmbeddingCache]:
+    """Create the cache of query embeddings.
+    
+    Args:
+        model_name: Model whose embeddings are cached
+        cache: "memory" (LRU only), "sqlite", "postgres" (shares crawldb.embedding_cache) or "none"
+        cache_path: SQLite file used by the "sqlite" store
+        cache_memory: Number of query embeddings kept in memory
+        
+    Returns:
+        EmbeddingCache, or None when caching is disabled
+    """
+    if cache == "none":
+        return None
+    store = None
+    if cache == "sqlite":
+        store = SqliteEmbeddingStore(cache_path)
+    elif cache == "postgres":
+        store = PostgresEmbeddingStore({"host": db_host, "port": db_port, "database": db_name,
+                                        "user": db_user, "password": db_password})
+    return EmbeddingCache(model_name, store, memory_size=cache_memory)
+
+
+def run_search(querier: VectorDBQuerier, args, query: str):
+    """Run the search selected by the command line options for one query."""
+    if args.url:
+        # Search within specific URL pattern using query
+        print(f"Searching for '{query}' within URLs matching '{args.url}'...")
+        results = querier.url_content_search(args.url, query, args.limit)
+        display_results(results)
+        
+    elif args.hybrid:
+        # Hybrid search
+        print(f"Performing hybrid search for '{query}'...")
+        results, timings = querier.hybrid_search(
+            query, args.limit, fusion=args.fusion,
+            weights={"text": args.text_weight, "vector": args.vector_weight},
+            candidates={"text": args.text_k, "vector": args.vector_k})
+        display_results(results)
+        print("Latency: " + ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items()))
+        
+    else:
+        # Regular semantic search
+        print(f"Searching for '{query}'...")
+        results = querier.semantic_search(query, args.limit, args.threshold)
+        display_results(results)
+
+
+def interactive_loop(querier: VectorDBQuerier, args):
+    """Answer queries read from stdin, one per line, with the model kept loaded.
+    
+    An empty line or end of input stops the loop.
+    """
+    # Load the model before the first query instead of during it
+    querier.vector_processor.model.encode("warm up")
+    prompt = "query> " if sys.stdin.isatty() else ""
+    while True:
+        try:
+            query = input(prompt).strip()
+        except EOFError:
+            break
+        if not query:
+            break
+        start = time.perf_counter()
+        run_search(querier, args, query)
+        print(f"Answered in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Query the vector database")
     parser.add_argument("--query", "-q", type=str, help="Semantic search query")
@@ -264,15 +935,45 @@ def main():
     parser.add_argument("--limit", "-l", type=int, default=5, help="Maximum number of results")
     parser.add_argument("--page", "-p", type=int, help="Get full content of specific page ID")
     parser.add_argument("--threshold", "-t", type=float, default=0.5, help="Similarity threshold (0-1)")
+    parser.add_argument("--ef-search", type=int, help="HNSW candidate list size (recall vs. speed, at most 1000)")
+    parser.add_argument("--probes", type=int, help="IVFFlat lists scanned per query (recall vs. speed)")
+    parser.add_argument("--quantization", choices=sorted(set(QUANTIZED_ORDERS) | set(QUANTIZATIONS)),
+                        help="Search a quantized index (see vector_index.py) or quantized snapshot codes "
+                             "and re-rank with full vectors")
+    parser.add_argument("--rerank-factor", type=int, default=10,
+                        help="Candidates per result re-ranked after a quantized search")
+    parser.add_argument("--fusion", choices=["rrf", "normalized"], default="rrf",
+                        help="How hybrid search fuses the text and vector candidates")
+    parser.add_argument("--text-weight", type=float, default=1.0, help="Hybrid search weight of full-text results")
+    parser.add_argument("--vector-weight", type=float, default=1.0, help="Hybrid search weight of vector results")
+    parser.add_argument("--text-k", type=int, default=50, help="Full-text candidates for hybrid search")
+    parser.add_argument("--vector-k", type=int, default=50, help="Vector candidates for hybrid search (at most 1000)")
+    parser.add_argument("--snapshot", help="Answer from a vector_snapshot.py export instead of the database "
+                                           "(semantic, URL and page queries)")
+    parser.add_argument("--interactive", "-i", action="store_true",
+                        help="Read queries from stdin, one per line, keeping the model loaded")
+    parser.add_argument("--query-cache", choices=["memory", "sqlite", "postgres", "none"], default="memory",
+                        help="Cache of query embeddings; sqlite and postgres persist it between runs")
+    parser.add_argument("--query-cache-path", default="query_cache.sqlite", help="SQLite file of the query cache")
+    parser.add_argument("--query-cache-memory", type=int, default=1000,
+                        help="Number of query embeddings kept in memory")
     
     args = parser.parse_args()
+    if args.snapshot and args.hybrid:
+        parser.error("hybrid search needs PostgreSQL full-text search and cannot use --snapshot")
+    if args.quantization and args.quantization not in (QUANTIZATIONS if args.snapshot else QUANTIZED_ORDERS):
+        parser.error(f"--quantization {args.quantization} is not available "
+                     f"{'on snapshots' if args.snapshot else 'in the database'}")
     
-    args.query = "erazmus+"
-    #args.url = "https://www.fri.uni-lj.si/sl/raziskave/raziskovalni-projekti"
-    args.hybrid = True
-    
-    vector_processor = VectorProcessor()
-    querier = VectorDBQuerier(vector_processor)
+    model_name = 'sentence-transformers/LaBSE'
+    query_cache = create_query_cache(model_name, args.query_cache, args.query_cache_path, args.query_cache_memory)
+    vector_processor = VectorProcessor(model_name, cache=query_cache)
+    if args.snapshot:
+        querier = SnapshotQuerier(args.snapshot, vector_processor, quantization=args.quantization,
+                                  rerank_factor=args.rerank_factor)
+    else:
+        querier = VectorDBQuerier(vector_processor, ef_search=args.ef_search, probes=args.probes,
+                                  quantization=args.quantization, rerank_factor=args.rerank_factor)
     
     try:
         if args.page is not None:
@@ -287,11 +988,11 @@ def main():
             else:
                 print(f"No page found with ID {args.page}")
                 
-        elif args.query and args.url:
-            # Search within specific URL pattern using query
-            print(f"Searching for '{args.query}' within URLs matching '{args.url}'...")
-            results = querier.url_content_search(args.url, args.query, args.limit)
-            display_results(results)
+        elif args.query:
+            run_search(querier, args, args.query)
+            
+        elif args.interactive:
+            interactive_loop(querier, args)
             
         elif args.url:
             # Search for content in URLs matching pattern
@@ -299,18 +1000,6 @@ def main():
             results = querier.url_content_search(args.url, limit=args.limit)
             display_results(results, show_similarity=False)
             
-        elif args.hybrid and args.query:
-            # Hybrid search
-            print(f"Performing hybrid search for '{args.query}'...")
-            results = querier.keyword_and_semantic_search(args.query, args.limit)
-            display_results(results)
-            
-        elif args.query:
-            # Regular semantic search
-            print(f"Searching for '{args.query}'...")
-            results = querier.semantic_search(args.query, args.limit, args.threshold)
-            display_results(results)
-            
         else:
             # Show examples if no arguments provided
             print("No search parameters provided. Here are some examples:")
@@ -324,9 +1013,13 @@ def main():
             print("  python query.py -u 'gov.si' -q 'environmental regulations'")
             print("\nRetrieve full page content:")
             print("  python query.py -p 123")
+            print("\nInteractive hybrid search with a persistent query cache:")
+            print("  python query.py -i -y --query-cache sqlite")
             
     finally:
         querier.close()
+        if query_cache:
+            query_cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+import argparse
+import os
+import time
+from typing import List, Dict, Any
+import numpy as np
+from html_cleaner import HTMLCleaner
+from vector_processor import VectorProcessor
+from Vector_db_querier import VectorDBQuerier
+from vector_index import VectorIndexManager, INDEX_NAMES
+from vector_snapshot import SnapshotQuerier, EMBEDDINGS_FILE, INT8_FILE, BINARY_FILE
+from main import DatabaseManager, iter_page_batches, split_segments, db_host, db_port, db_name, db_user, db_password
+
+
+def load_segments(limit: int) -> List[List[Dict[str, Any]]]:
+    """Clean up to limit crawled pages and return the segments of each page."""
+    conn = DatabaseManager(db_host, db_port, db_name, db_user, db_password).get_connection()
+    pages = []
+    try:
+        for batch in iter_page_batches(conn, batch_size=min(limit, 100), incremental=False):
+            for page in batch:
+                clean_text, _ = HTMLCleaner.clean_html(page['html_content'])
+                segments = split_segments(clean_text)
+                if segments:
+                    pages.append(segments)
+            if len(pages) >= limit:
+                break
+    finally:
+        conn.close()
+    return pages[:limit]
+
+
+def benchmark_encoding(pages: List[List[Dict[str, Any]]], model_name: str, batch_sizes: List[int]) -> None:
+    """Compare one model call per page with cross-page, length-sorted batches.
+
+    Args:
+        pages: Segments of each page
+        model_name: sentence-transformers model to load
+        batch_sizes: Batch sizes tried for the cross-page encoder
+    """
+    processor = VectorProcessor(model_name)
+    texts = [segment['text'] for segments in pages for segment in segments]
+    print(f"{len(pages)} pages, {len(texts)} segments, model {model_name}")
+
+    # Warm up so model loading and first-call overhead are not measured
+    processor.model.encode(texts[:8])
+
+    start = time.perf_counter()
+    for segments in pages:
+        processor.model.encode([segment['text'] for segment in segments])
+    elapsed = time.perf_counter() - start
+    print(f"Per page encode:            {len(texts) / elapsed:8.1f} segments/s")
+
+    for batch_size in batch_sizes:
+        processor.batch_size = batch_size
+        start = time.perf_counter()
+        processor.encode_texts(texts)
+        elapsed = time.perf_counter() - start
+        print(f"Cross-page, batch size {batch_size:4d}: {len(texts) / elapsed:8.1f} segments/s")
+
+
+def benchmark_queries(queries: List[str], model_name: str, limit: int = 5) -> None:
+    """Compare one hybrid_search call per query with hybrid_search_batch.
+    
+    Args:
+        queries: Query texts, e.g. an evaluation set
+        model_name: sentence-transformers model to load
+        limit: Results per query
+    """
+    # No query cache, so both runs embed every query
+    querier = VectorDBQuerier(VectorProcessor(model_name))
+    try:
+        querier.vector_processor.model.encode(queries[:8])
+        print(f"{len(queries)} queries, model {model_name}")
+        
+        start = time.perf_counter()
+        for query in queries:
+            querier.hybrid_search(query, limit)
+        print(f"hybrid_search per query: {time.perf_counter() - start:8.2f} s")
+        
+        start = time.perf_counter()
+        _, timings = querier.hybrid_search_batch(queries, limit)
+        print(f"hybrid_search_batch:     {time.perf_counter() - start:8.2f} s ("
+              + ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items()) + ")")
+    finally:
+        querier.close()
+
+
+def benchmark_recall(snapshot: str, queries: int = 200, k: int = 10, rerank_factors: List[int] = (1, 4, 10),
+                     database: bool = False) -> None:
+    """Measure recall@k and latency of quantized search against exact search.
+    
+    Query vectors are stored embeddings of randomly chosen segments, so no
+    model is needed. The ground truth is the exact top-k from the snapshot's
+    full-precision matrix; export the snapshot right before measuring the
+    database so both see the same segments.
+    
+    Args:
+        snapshot: Snapshot directory, exported with --quantize for the quantized passes
+        queries: Number of query vectors
+        k: Results per query
+        rerank_factors: Candidates per result tried for the quantized passes
+        database: Also measure semantic_search on the vector indexes present in PostgreSQL
+    """
+    exact = SnapshotQuerier(snapshot, None)
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(exact.embeddings), size=min(queries, len(exact.embeddings)), replace=False))
+    vectors = np.asarray(exact.embeddings[rows], dtype=np.float32)
+    truth = [set(exact.segment_ids[exact.top_k(vector, k)[0]]) for vector in vectors]
+    print(f"{len(vectors)} queries, recall@{k} against exact search over {len(exact.embeddings)} segments")
+    
+    for name in (EMBEDDINGS_FILE, INT8_FILE, BINARY_FILE):
+        path = os.path.join(snapshot, name)
+        if os.path.exists(path):
+            print(f"{name:24s} {os.path.getsize(path) / 2 ** 20:9.1f} MB")
+    
+    def measure(label, search):
+        start = time.perf_counter()
+        found = [set(search(vector)) for vector in vectors]
+        elapsed = (time.perf_counter() - start) * 1000 / len(vectors)
+        recall = np.mean([len(result & expected) / len(expected) for result, expected in zip(found, truth)])
+        print(f"{label:32s} recall {recall:6.3f}  {elapsed:8.2f} ms/query")
+    
+    measure("snapshot exact", lambda vector: exact.segment_ids[exact.top_k(vector, k)[0]])
+    for quantization in exact.meta.get("quantizations", []):
+        for factor in rerank_factors:
+            quantized = SnapshotQuerier(snapshot, None, quantization=quantization, rerank_factor=factor)
+            measure(f"snapshot {quantization} rerank x{factor}",
+                    lambda vector: quantized.segment_ids[quantized.top_k(vector, k)[0]])
+    
+    if not database:
+        return
+    querier = VectorDBQuerier(None)
+    manager = VectorIndexManager(querier._get_connection())
+    try:
+        indexes = {index['name']: index for index in manager.info()}
+        for index in indexes.values():
+            print(f"{index['name']:40s} {index['size']}")
+        modes = [(None, None)]
+        for quantization, method in (("halfvec", "hnsw_halfvec"), ("binary", "hnsw_binary")):
+            if INDEX_NAMES[method] in indexes:
+                modes.extend((quantization, factor) for factor in rerank_factors)
+        for quantization, factor in modes:
+            measure(f"database {quantization or 'full'}" + (f" rerank x{factor}" if factor else ""),
+                    lambda vector: [row['segment_id'] for row in querier.semantic_search(
+                        "", k, -1, embedding=vector.tolist(), quantization=quantization, rerank_factor=factor)])
+    finally:
+        manager.connection.close()
+        querier.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure embedding throughput on crawled pages')
+    parser.add_argument('--pages', type=int, default=200, help='Number of crawled pages to use')
+    parser.add_argument('--model', default='sentence-transformers/LaBSE', help='Embedding model')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[16, 32, 64, 128],
+                        help='Batch sizes to try for the cross-page encoder')
+    parser.add_argument('--query-file', help='Compare per-query and batch hybrid search on these queries, one per line')
+    parser.add_argument('--recall', metavar='SNAPSHOT', help='Measure recall of quantized search using this snapshot')
+    parser.add_argument('--recall-queries', type=int, default=200, help='Query vectors for --recall')
+    parser.add_argument('--k', type=int, default=10, help='Results per query for --recall')
+    parser.add_argument('--rerank-factors', type=int, nargs='+', default=[1, 4, 10],
+                        help='Re-rank candidates per result tried by --recall')
+    parser.add_argument('--database', action='store_true', help='With --recall, also measure the database indexes')
+    args = parser.parse_args()
+
+    if args.recall:
+        benchmark_recall(args.recall, args.recall_queries, args.k, args.rerank_factors, args.database)
+    elif args.query_file:
+        with open(args.query_file, encoding='utf-8') as f:
+            benchmark_queries([line.strip() for line in f if line.strip()], args.model)
+    else:
+        pages = load_segments(args.pages)
+        if not pages:
+            print("No pages with text found in crawldb.page")
+        else:
+            benchmark_encoding(pages, args.model, args.batch_sizes)
@@ -0,0 +1,200 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a segment so trivially different copies share a cache entry.
+
+    Args:
+        text: Segment text
+
+    Returns:
+        NFC-normalized text with runs of whitespace collapsed to one space
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str, model_name: str) -> bytes:
+    """Cache key of a segment: SHA-256 of the model name and the normalized text."""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class PostgresEmbeddingStore:
+    """Embedding store in the crawldb.embedding_cache table."""
+
+    def __init__(self, connection_params: Dict[str, str]):
+        """Open a dedicated autocommit connection and create the table if needed.
+
+        Args:
+            connection_params: Keyword arguments for psycopg2.connect
+        """
+        self.connection = psycopg2.connect(**connection_params)
+        self.connection.autocommit = True
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE SCHEMA IF NOT EXISTS crawldb;
+                CREATE TABLE IF NOT EXISTS crawldb.embedding_cache (
+                    key BYTEA PRIMARY KEY,
+                    embedding REAL[] NOT NULL
+                );
+            """)
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return the stored embeddings of the keys that are present."""
+        if not keys:
+            return {}
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT key, embedding FROM crawldb.embedding_cache
+                WHERE key = ANY(%s);
+            """, ([psycopg2.Binary(key) for key in keys],))
+            rows = cursor.fetchall()
+        result = {}
+        for row in rows:
+            key, embedding = (row['key'], row['embedding']) if isinstance(row, dict) else row
+            result[bytes(key)] = np.asarray(embedding, dtype=np.float32)
+        return result
+
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        """Store embeddings; keys already present are left unchanged."""
+        if not items:
+            return
+        with self.connection.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO crawldb.embedding_cache (key, embedding) VALUES %s
+                ON CONFLICT (key) DO NOTHING;
+            """, [(psycopg2.Binary(key), embedding.tolist()) for key, embedding in items.items()])
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SqliteEmbeddingStore:
+    """Embedding store in a local SQLite file, vectors kept as raw float32 bytes."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key BLOB PRIMARY KEY,
+                embedding BLOB NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return the stored embeddings of the keys that are present."""
+        result = {}
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT key, embedding FROM embedding_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall()
+            for key, embedding in rows:
+                result[bytes(key)] = np.frombuffer(embedding, dtype=np.float32)
+        return result
+
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        """Store embeddings; keys already present are left unchanged."""
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO embedding_cache (key, embedding) VALUES (?, ?)",
+            [(key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in items.items()])
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class EmbeddingCache:
+    """Two-tier cache of segment embeddings.
+
+    Lookups go to an in-memory LRU first and then to a persistent store
+    (Postgres or SQLite). Keys include the model name, so caches of
+    different models never mix.
+    """
+
+    def __init__(self, model_name: str, store=None, memory_size: int = 20000):
+        """
+        Args:
+            model_name: Name of the model the embeddings come from
+            store: PostgresEmbeddingStore, SqliteEmbeddingStore or None for memory only
+            memory_size: Number of embeddings kept in the memory tier
+        """
+        self.model_name = model_name
+        self.store = store
+        self.memory_size = memory_size
+        self.memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: bytes, embedding: np.ndarray) -> None:
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings of texts.
+
+        Args:
+            texts: Segment texts
+
+        Returns:
+            One embedding or None per text
+        """
+        keys = [text_key(text, self.model_name) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+
+        missing = list({key for key in keys if key not in found})
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing)
+            with self.lock:
+                for key, embedding in stored.items():
+                    self._remember(key, embedding)
+            found.update(stored)
+
+        results = [found.get(key) for key in keys]
+        hits = sum(result is not None for result in results)
+        with self.lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[np.ndarray]) -> None:
+        """Store embeddings of texts in both tiers."""
+        items = {text_key(text, self.model_name): np.asarray(embedding, dtype=np.float32)
+                 for text, embedding in zip(texts, embeddings)}
+        with self.lock:
+            for key, embedding in items.items():
+                self._remember(key, embedding)
+        if self.store is not None:
+            self.store.put_many(items)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
@@ -1,47 +1,149 @@
-from bs4 import BeautifulSoup
+import re
+from bs4 import BeautifulSoup, NavigableString, CData
 from typing import Tuple, Optional, List
 
 class HTMLCleaner:
     PARAGRAPH_BREAK = "\n<<<PARAGRAPH>>>\n"
-    SUB_PARAGRAPH_BREAK = "\n<<<SUB>>>\n"
 
-    @staticmethod
-    def split_subparagraphs(block) -> List[str]:
-        """Split larger <div> blocks into smaller units.
+    # Tokens are estimated as whitespace-separated words. LaBSE truncates
+    # input after 256 word pieces, which 128 words stay below for typical
+    # Slovenian and English text.
+    MAX_TOKENS = 128
+
+    # Elements that end the text before them and start a new unit
+    BLOCK_TAGS = {
+        "p", "div", "section", "article", "main", "aside", "li", "ul", "ol", "dl", "dt", "dd",
+        "table", "thead", "tbody", "tr", "td", "th", "blockquote", "pre", "figure", "figcaption",
+        "form", "fieldset", "address", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6",
+    }
+    HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    SKIPPED_TAGS = {"head", "script", "style", "header", "footer", "nav", "noscript", "template"}
+    SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+    @classmethod
+    def extract_units(cls, root) -> List[Tuple[str, bool]]:
+        """Walk the DOM once and collect the text of its leaf blocks.
+        
+        Every text node belongs to exactly one unit: the text between two
+        block boundaries. Nested blocks therefore never repeat their
+        children's text.
         
         Args:
-            block: BeautifulSoup element to process
+            root: BeautifulSoup element to walk
             
         Returns:
-            List of text segments from the block
+            List of (text, whether the unit is a heading) in document order
         """
-        subunits = []
-        children = block.find_all(
-            ["p", "span", "br", "li", "h1", "h2", "h3", "h4"], 
-            recursive=False
-        )
-
-        for child in children:
-            text = child.get_text(separator=" ", strip=True)
+        units = []
+        buffer = []
+
+        def flush(heading: bool = False):
+            text = " ".join(" ".join(buffer).split())
             if text:
-                subunits.append(text)
+                units.append((text, heading))
+            buffer.clear()
+
+        def walk(element):
+            for child in element.children:
+                if isinstance(child, NavigableString):
+                    if type(child) in (NavigableString, CData):
+                        buffer.append(str(child))
+                elif child.name in cls.SKIPPED_TAGS:
+                    continue
+                elif child.name in cls.BLOCK_TAGS:
+                    flush()
+                    walk(child)
+                    flush(child.name in cls.HEADING_TAGS)
+                else:
+                    walk(child)
+
+        walk(root)
+        flush()
+        return units
 
-        if not subunits:
-            whole = block.get_text(separator=" ", strip=True)
-            if whole:
-                subunits.append(whole)
+    @classmethod
+    def split_text(cls, text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+        """Split text longer than max_tokens, preferring sentence boundaries.
+        
+        Args:
+            text: Text to split
+            max_tokens: Largest chunk size in tokens
+            overlap_tokens: Tokens from the end of a chunk repeated at the start of the next
+            
+        Returns:
+            List of chunks
+        """
+        words = text.split()
+        if len(words) <= max_tokens:
+            return [text]
+
+        # Sentences longer than the budget fall back to fixed word windows,
+        # sized so a window still fits after the overlap
+        overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+        window = max_tokens - overlap_tokens
+        pieces = []
+        for sentence in cls.SENTENCE_END.split(text):
+            sentence_words = sentence.split()
+            for start in range(0, len(sentence_words), window):
+                pieces.append(sentence_words[start:start + window])
+
+        chunks = []
+        current = []
+        for piece in pieces:
+            if current and len(current) + len(piece) > max_tokens:
+                chunks.append(current)
+                current = current[-overlap_tokens:] if overlap_tokens else []
+                if len(current) + len(piece) > max_tokens:
+                    current = current[len(current) + len(piece) - max_tokens:]
+            current = current + piece
+        if current:
+            chunks.append(current)
+        return [" ".join(chunk) for chunk in chunks]
 
-        return subunits
+    @classmethod
+    def chunk_units(cls, units: List[Tuple[str, bool]], max_tokens: int = MAX_TOKENS,
+                    overlap_tokens: int = 0) -> List[str]:
+        """Merge short units and split long ones to the token budget.
+        
+        Units above the budget are first split with split_text. Consecutive
+        units are then merged while the chunk stays within max_tokens; a
+        heading always starts a new chunk, so chunks follow the page's
+        sections.
+        
+        Args:
+            units: Units from extract_units
+            max_tokens: Largest chunk size in tokens
+            overlap_tokens: Overlap between the parts of a split unit
+            
+        Returns:
+            List of chunk texts
+        """
+        chunks = []
+        current = []
+        size = 0
+        for text, heading in units:
+            for index, part in enumerate(cls.split_text(text, max_tokens, overlap_tokens)):
+                tokens = len(part.split())
+                if current and ((heading and index == 0) or size + tokens > max_tokens):
+                    chunks.append("\n".join(current))
+                    current, size = [], 0
+                current.append(part)
+                size += tokens
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
 
     @classmethod
-    def clean_html(cls, html: str) -> Tuple[Optional[str], bool]:
+    def clean_html(cls, html: str, max_tokens: int = MAX_TOKENS, overlap_tokens: int = 0) -> Tuple[Optional[str], bool]:
         """Clean HTML content and extract meaningful text.
         
         Args:
             html: Raw HTML content to clean
+            max_tokens: Largest segment size in tokens (whitespace-separated words)
+            overlap_tokens: Tokens repeated between the parts of a split block
             
         Returns:
-            Tuple of (cleaned text, whether block-system was used)
+            Tuple of (cleaned text with segments separated by PARAGRAPH_BREAK, whether block-system was used)
         """
         if not html:
             return None, False
@@ -58,21 +160,9 @@ class HTMLCleaner:
         used_block = bool(content)
         content = content if content else soup
 
-        for tag in content(["script", "style", "header", "footer", "nav"]):
-            tag.decompose()
-
-        blocks = content.find_all(
-            ["p", "div", "section", "article", "li", "h1", "h2", "h3", "h4"]
-        )
-        
-        paragraphs = []
-        for block in blocks:
-            if block.get_text(strip=True):
-                sub_parts = cls.split_subparagraphs(block)
-                combined = cls.SUB_PARAGRAPH_BREAK.join(sub_parts)
-                paragraphs.append(combined)
-
-        paragraphs = list(dict.fromkeys(paragraphs))
+        # Repeated boilerplate, e.g. "Read more" links, is kept once
+        units = list(dict.fromkeys(cls.extract_units(content)))
+        paragraphs = cls.chunk_units(units, max_tokens, overlap_tokens)
 
         if breadcrumbs_text:
             paragraphs.insert(0, breadcrumbs_text)
@@ -1,12 +1,17 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List
 from html_cleaner import HTMLCleaner
 from vector_processor import VectorProcessor
+from embedding_cache import EmbeddingCache, PostgresEmbeddingStore, SqliteEmbeddingStore
+from segment_writer import SegmentWriter
 import os
 import dotenv
 from tqdm import tqdm
 import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 dotenv.load_dotenv(override=True)
@@ -50,16 +55,186 @@ def estimate_completion_time(start_time: float, processed: int, total: int) -> s
     
     return str(timedelta(seconds=int(remaining_seconds)))
 
-def main():
-    """Main function to process HTML pages and create vector embeddings."""
+# Pages to process. In incremental mode pages whose HTML hash matches the one
+# stored with their cleaned version are filtered out in the database, so their
+# HTML is never transferred.
+PAGES_QUERY = """
+    FROM crawldb.page p
+    LEFT JOIN crawldb.cleaned_page c ON c.id = p.id
+    WHERE p.html_content IS NOT NULL
+    AND (%(full)s OR c.content_hash IS DISTINCT FROM p.html_hash)
+"""
+
+def count_pages(conn, incremental: bool = True) -> int:
+    """Count the pages the pipeline will process."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) AS total " + PAGES_QUERY, {'full': not incremental})
+        return cursor.fetchone()['total']
+
+def iter_page_batches(conn, batch_size: int = 100, incremental: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    """Stream pages from the database in batches.
+    
+    Uses a named (server-side) cursor, so only one batch of HTML is held in
+    memory at a time, however large the crawl is.
+    
+    Args:
+        conn: Connection used only for reading; the cursor lives in its transaction
+        batch_size: Number of pages fetched per round-trip
+        incremental: Skip pages whose HTML did not change since they were processed
+        
+    Returns:
+        Iterator over lists of page rows with 'id', 'url', 'html_content' and 'content_hash'
+    """
+    with conn.cursor(name="page_stream") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute("""
+            SELECT p.id, p.url, p.html_content, p.html_hash AS content_hash
+        """ + PAGES_QUERY + """
+            ORDER BY p.id;
+        """, {'full': not incremental})
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+
+def split_segments(clean_text: Optional[str]) -> List[Dict[str, Any]]:
+    """Split cleaned text into segment dictionaries for the vector processor."""
+    if not clean_text:
+        return []
+    return [
+        {'id': None, 'text': segment.strip()}
+        for segment in clean_text.split(HTMLCleaner.PARAGRAPH_BREAK)
+        if segment.strip()
+    ]
+
+def clean_page(page: Dict[str, Any], max_tokens: int = HTMLCleaner.MAX_TOKENS,
+               overlap_tokens: int = 0) -> Dict[str, Any]:
+    """Clean and segment one page; runs in a worker process.
+    
+    Args:
+        page: Page row with 'id', 'url', 'html_content' and 'content_hash'
+        max_tokens: Largest segment size in tokens, see HTMLCleaner.clean_html
+        overlap_tokens: Tokens repeated between the parts of a split block
+        
+    Returns:
+        Page without its HTML, with 'clean_text', 'used_block', 'segments' and 'error' added
+    """
+    cleaned = {'id': page['id'], 'url': page['url'], 'content_hash': page['content_hash'],
+               'clean_text': None, 'used_block': False, 'segments': [], 'error': None}
+    try:
+        cleaned['clean_text'], cleaned['used_block'] = HTMLCleaner.clean_html(page['html_content'],
+                                                                                max_tokens, overlap_tokens)
+        cleaned['segments'] = split_segments(cleaned['clean_text'])
+    except Exception as e:
+        cleaned['error'] = str(e)
+    return cleaned
+
+def iter_cleaned_pages(page_batches: Iterator[List[Dict[str, Any]]], workers: int = 1,
+                       queue_depth: int = 256, max_tokens: int = HTMLCleaner.MAX_TOKENS,
+                       overlap_tokens: int = 0) -> Iterator[Dict[str, Any]]:
+    """Clean pages in a process pool, in their original order.
+    
+    At most queue_depth pages are being cleaned or waiting to be consumed, so
+    the workers keep cleaning ahead while the consumer runs the model, and
+    memory stays bounded when the consumer is the slower stage.
+    
+    Args:
+        page_batches: Batches of page rows, as produced by iter_page_batches
+        workers: Number of cleaning processes; 1 cleans in the calling process
+        queue_depth: Maximum number of pages in flight between the stages
+        max_tokens: Largest segment size in tokens
+        overlap_tokens: Tokens repeated between the parts of a split block
+        
+    Returns:
+        Iterator over cleaned pages, see clean_page
+    """
+    if workers <= 1:
+        for batch in page_batches:
+            for page in batch:
+                yield clean_page(page, max_tokens, overlap_tokens)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in page_batches:
+            for page in batch:
+                pending.append(pool.submit(clean_page, page, max_tokens, overlap_tokens))
+                if len(pending) >= queue_depth:
+                    yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_batches(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterator into lists of at most size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def create_embedding_cache(database: DatabaseManager, model_name: str, cache: str = "postgres",
+                           cache_path: str = "embedding_cache.sqlite",
+                           cache_memory: int = 20000) -> Optional[EmbeddingCache]:
+    """Create the segment embedding cache.
+    
+    Args:
+        database: Database the Postgres store lives in
+        model_name: Model whose embeddings are cached
+        cache: "postgres", "sqlite" or "none"
+        cache_path: SQLite file used by the "sqlite" store
+        cache_memory: Number of embeddings kept in memory
+        
+    Returns:
+        EmbeddingCache, or None when caching is disabled
+    """
+    if cache == "none":
+        return None
+    if cache == "sqlite":
+        store = SqliteEmbeddingStore(cache_path)
+    else:
+        store = PostgresEmbeddingStore(database.connection_params)
+    return EmbeddingCache(model_name, store, memory_size=cache_memory)
+
+def main(batch_size: int = 100, incremental: bool = True, encode_batch_size: int = 64,
+         cache: str = "postgres", cache_path: str = "embedding_cache.sqlite", cache_memory: int = 20000,
+         workers: int = 1, queue_depth: int = 256, binary_copy: bool = True,
+         max_tokens: int = HTMLCleaner.MAX_TOKENS, overlap_tokens: int = 0):
+    """Main function to process HTML pages and create vector embeddings.
+    
+    Args:
+        batch_size: Number of pages streamed from the database and embedded together
+        incremental: Only process pages that are new or whose HTML changed
+        encode_batch_size: Number of segments passed through the model at once
+        cache: Embedding cache store: "postgres", "sqlite" or "none"
+        cache_path: SQLite file used by the "sqlite" cache store
+        cache_memory: Number of embeddings kept in the in-memory cache tier
+        workers: Number of processes cleaning and segmenting pages
+        queue_depth: Maximum number of pages between the cleaning and embedding stages
+        binary_copy: Load segments with binary COPY instead of text COPY
+        max_tokens: Largest segment size in tokens (whitespace-separated words)
+        overlap_tokens: Tokens repeated between the parts of a split block
+    """
+    # Checked here so bad sizes fail before any worker process starts
+    if max_tokens <= 0:
+        raise ValueError(f"max_tokens must be positive, got {max_tokens}")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError(f"overlap_tokens must be between 0 and max_tokens - 1, got {overlap_tokens}")
     try:
         print("Initializing components...")
-        html_cleaner = HTMLCleaner()
-        vector_processor = VectorProcessor()
+        database = DatabaseManager(db_host, db_port, db_name, db_user, db_password)
+        model_name = 'sentence-transformers/LaBSE'
+        embedding_cache = create_embedding_cache(database, model_name, cache, cache_path, cache_memory)
+        vector_processor = VectorProcessor(model_name, batch_size=encode_batch_size, cache=embedding_cache)
         
-        conn = DatabaseManager(db_host, db_port, db_name, db_user, db_password).get_connection()
+        conn = database.get_connection()
         conn.autocommit = True
         cursor = conn.cursor()
+        # Server-side cursors need a transaction, so pages are read on a separate connection
+        read_conn = database.get_connection()
         
         print("Setting up database tables...")
         #cursor.execute("""
@@ -83,16 +258,26 @@ def main():
                 page_segment TEXT NOT NULL,
                 embedding VECTOR(768)
             );
+
+            ALTER TABLE crawldb.cleaned_page ADD COLUMN IF NOT EXISTS content_hash TEXT;
+            -- Hashed by PostgreSQL when the crawler stores a page, so runs compare stored hashes
+            ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS html_hash TEXT
+                GENERATED ALWAYS AS (md5(html_content)) STORED;
+            CREATE INDEX IF NOT EXISTS idx_page_segment_page_id ON crawldb.page_segment (page_id);
+
+            -- Filled by PostgreSQL on every insert/COPY, so keyword search never parses text at query time
+            ALTER TABLE crawldb.page_segment ADD COLUMN IF NOT EXISTS page_segment_tsv TSVECTOR
+                GENERATED ALWAYS AS (to_tsvector('english', page_segment)) STORED;
+            CREATE INDEX IF NOT EXISTS idx_page_segment_tsv ON crawldb.page_segment USING GIN (page_segment_tsv);
         """)
+        # Each page batch is written in its own transaction from here on
+        conn.autocommit = False
+        segment_writer = SegmentWriter(conn, binary=binary_copy)
         
-        print("Fetching pages from database...")
-        cursor.execute("""
-            SELECT id, url, html_content 
-            FROM crawldb.page 
-            WHERE html_content IS NOT NULL;
-        """)
-        pages = cursor.fetchall()
-        total_pages = len(pages)
+        print("Counting pages in database...")
+        total_pages = count_pages(read_conn, incremental)
+        if incremental:
+            print("Incremental mode: unchanged pages are skipped")
         
         print(f"\nStarting processing of {total_pages} pages...")
         start_time = time.time()
@@ -101,40 +286,33 @@ def main():
         failed_pages = 0
 
         with tqdm(total=total_pages, desc="Processing pages", unit="page") as pbar:
-            for page in pages:
-                try:
-                    clean_text, used_block = html_cleaner.clean_html(page['html_content'])
-                    
-                    if clean_text:
-                        cursor.execute("""
-                            INSERT INTO crawldb.cleaned_page (id, url, plain_text, block_system)
-                            VALUES (%s, %s, %s, %s)
-                            ON CONFLICT (id) DO UPDATE
-                            SET plain_text = EXCLUDED.plain_text,
-                                block_system = EXCLUDED.block_system;
-                        """, (page['id'], page['url'], clean_text, used_block))
-                        
-                        segments = [
-                            {'id': None, 'text': segment.strip()}
-                            for segment in clean_text.split(HTMLCleaner.PARAGRAPH_BREAK)
-                            if segment.strip()
-                        ]
-                        
-                        processed_segments = vector_processor.process_segments(segments)
-                        
-                        for segment in processed_segments:
-                            cursor.execute("""
-                                INSERT INTO crawldb.page_segment (page_id, page_segment, embedding)
-                                VALUES (%s, %s, %s);
-                            """, (page['id'], segment['text'], segment['embedding']))
-                            
-                        successful_pages += 1
-                    
-                except Exception as e:
-                    print(f"\nError processing page {page['id']}: {str(e)}")
-                    failed_pages += 1
-                
-                processed_pages += 1
+            # Stage 1: pages are cleaned and segmented in worker processes.
+            # Stage 2: segments of batch_size pages are embedded together and stored.
+            page_batches = iter_page_batches(read_conn, batch_size, incremental)
+            cleaned_pages = iter_cleaned_pages(page_batches, workers, queue_depth, max_tokens, overlap_tokens)
+            for batch in iter_batches(cleaned_pages, batch_size):
+                cleaned = []
+                for page in batch:
+                    if page['error']:
+                        print(f"\nError cleaning page {page['id']}: {page['error']}")
+                        failed_pages += 1
+                        processed_pages += 1
+                        pbar.update(1)
+                    else:
+                        cleaned.append(page)
+
+                embedded = vector_processor.process_pages([page['segments'] for page in cleaned])
+                for page, processed_segments in zip(cleaned, embedded):
+                    page['segments'] = processed_segments
+
+                failures = segment_writer.write_pages(cleaned)
+                for page, error in failures:
+                    print(f"\nError processing page {page['id']}: {error}")
+                failed_ids = {page['id'] for page, _ in failures}
+
+                failed_pages += len(failures)
+                successful_pages += sum(1 for page in cleaned if page['clean_text'] and page['id'] not in failed_ids)
+                processed_pages += len(cleaned)
                 
                 remaining_time = estimate_completion_time(start_time, processed_pages, total_pages)
                 pbar.set_postfix({
@@ -142,20 +320,54 @@ def main():
                     'failed': failed_pages,
                     'remaining_time': remaining_time
                 })
-                pbar.update(1)
+                pbar.update(len(cleaned))
                 
         total_time = time.time() - start_time
         print(f"\nProcessing completed in {timedelta(seconds=int(total_time))}!")
         print(f"Total pages processed: {total_pages}")
         print(f"Successful: {successful_pages}")
         print(f"Failed: {failed_pages}")
+        if embedding_cache:
+            print(f"Embedding cache hit rate: {embedding_cache.hit_rate():.1%}")
+            embedding_cache.close()
         
-        conn.commit()
         cursor.close()
         conn.close()
+        read_conn.close()
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Clean crawled pages and store segment embeddings')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='Number of pages streamed from the database and embedded together')
+    parser.add_argument('--full', action='store_true',
+                        help='Reprocess all pages, not only new and changed ones')
+    parser.add_argument('--encode-batch-size', type=int, default=64,
+                        help='Number of segments passed through the model at once')
+    parser.add_argument('--cache', choices=['postgres', 'sqlite', 'none'], default='postgres',
+                        help='Where segment embeddings are cached')
+    parser.add_argument('--cache-path', default='embedding_cache.sqlite',
+                        help='SQLite file used with --cache sqlite')
+    parser.add_argument('--cache-memory', type=int, default=20000,
+                        help='Number of embeddings kept in the in-memory cache tier')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help='Number of processes cleaning pages (1 cleans in the main process)')
+    parser.add_argument('--queue-depth', type=int, default=256,
+                        help='Maximum number of pages between the cleaning and embedding stages')
+    parser.add_argument('--text-copy', action='store_true',
+                        help='Load segments with text COPY instead of binary COPY')
+    parser.add_argument('--max-tokens', type=int, default=HTMLCleaner.MAX_TOKENS,
+                        help='Largest segment size in tokens (whitespace-separated words)')
+    parser.add_argument('--overlap-tokens', type=int, default=0,
+                        help='Tokens repeated between the parts of a split block')
+    args = parser.parse_args()
+    if args.max_tokens <= 0:
+        parser.error("--max-tokens must be positive")
+    if not 0 <= args.overlap_tokens < args.max_tokens:
+        parser.error("--overlap-tokens must be between 0 and --max-tokens - 1")
+    main(args.batch_size, incremental=not args.full, encode_batch_size=args.encode_batch_size,
+         cache=args.cache, cache_path=args.cache_path, cache_memory=args.cache_memory,
+         workers=args.workers, queue_depth=args.queue_depth, binary_copy=not args.text_copy,
+         max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from aiohttp import web
+from vector_processor import VectorProcessor
+from Vector_db_querier import VectorDBQuerier, create_query_cache, db_name
+
+
+class QueryBatcher:
+    """Micro-batches the query embeddings of concurrent requests.
+
+    Queries that arrive while the model is busy, or within max_wait_ms of
+    each other, are embedded together with one encode_texts call. The model
+    runs on a single dedicated thread, so the event loop never blocks on it.
+    """
+
+    def __init__(self, vector_processor: VectorProcessor, max_batch: int = 32, max_wait_ms: float = 2):
+        """
+        Args:
+            vector_processor: Warm processor shared by all requests
+            max_batch: Largest number of queries embedded in one call
+            max_wait_ms: How long the first query of a batch waits for others
+        """
+        self.vector_processor = vector_processor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.model_thread = ThreadPoolExecutor(max_workers=1)
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.queries = 0
+
+    async def start(self) -> None:
+        """Load and warm up the model, then start batching (on the running event loop)."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.model_thread, self.vector_processor.model.encode, "warm up")
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.model_thread.shutdown()
+
+    async def embed(self, text: str) -> List[float]:
+        """Embedding of one query, computed in a batch with concurrent queries."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.max_batch - 1 and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                embeddings = await loop.run_in_executor(
+                    self.model_thread, self.vector_processor.encode_texts, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                # The request may have been cancelled by a disconnected client
+                if not future.done():
+                    future.set_result(embedding.tolist())
+
+
+class QuerierPool:
+    """Fixed set of VectorDBQuerier instances, one database connection each.
+
+    All queriers share the warm VectorProcessor. Blocking database calls run
+    on a thread per connection, so at most size queries hit the database at
+    once.
+    """
+
+    def __init__(self, vector_processor: VectorProcessor, size: int = 4, ef_search: Optional[int] = None,
+                 probes: Optional[int] = None):
+        """
+        Args:
+            vector_processor: Processor shared by all queriers
+            size: Number of database connections
+            ef_search: HNSW candidate list size for vector searches
+            probes: IVFFlat lists scanned by vector searches
+        """
+        self.queriers = [VectorDBQuerier(vector_processor, ef_search=ef_search, probes=probes)
+                         for _ in range(size)]
+        self.db_threads = ThreadPoolExecutor(max_workers=size)
+        self.available: Optional[asyncio.Queue] = None
+
+    def start(self) -> None:
+        self.available = asyncio.Queue()
+        for querier in self.queriers:
+            self.available.put_nowait(querier)
+
+    async def run(self, method: str, *args, **kwargs):
+        """Call a VectorDBQuerier method on a free querier without blocking the event loop."""
+        querier = await self.available.get()
+        try:
+            call = functools.partial(getattr(querier, method), *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self.db_threads, call)
+        finally:
+            self.available.put_nowait(querier)
+
+    def close(self) -> None:
+        self.db_threads.shutdown()
+        for querier in self.queriers:
+            querier.close()
+
+
+class SearchService:
+    """HTTP API over VectorDBQuerier.
+
+    Endpoints (GET, JSON responses):
+        /search?q=...&limit=5&threshold=0.5    semantic_search
+        /hybrid?q=...&limit=5                  keyword_and_semantic_search
+        /url?pattern=...&q=...&limit=5         url_content_search (q optional)
+        /page/{page_id}                        get_page_content
+        /health                                load and batching statistics
+
+    At most max_concurrency requests are processed at a time; beyond
+    max_pending waiting requests new ones get 503 instead of queueing.
+    """
+
+    def __init__(self, batcher: QueryBatcher, pool: QuerierPool, max_concurrency: int = 64,
+                 max_pending: int = 1024, max_limit: int = 100):
+        """
+        Args:
+            batcher: Embeds queries
+            pool: Runs the database queries
+            max_concurrency: Requests processed at the same time
+            max_pending: Requests accepted (processed or waiting) before answering 503
+            max_limit: Largest limit a client may ask for
+        """
+        self.batcher = batcher
+        self.pool = pool
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_limit = max_limit
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.served = 0
+        self.rejected = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.bound_load])
+        app.router.add_get("/search", self.semantic_search)
+        app.router.add_get("/hybrid", self.hybrid_search)
+        app.router.add_get("/url", self.url_search)
+        app.router.add_get("/page/{page_id}", self.page_content)
+        app.router.add_get("/health", self.health)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_startup(self, app: web.Application) -> None:
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.pool.start()
+        await self.batcher.start()
+        print("Search service ready")
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        await self.batcher.stop()
+        self.pool.close()
+
+    @web.middleware
+    async def bound_load(self, request: web.Request, handler):
+        if request.path == "/health":
+            return await handler(request)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise web.HTTPServiceUnavailable(text="Too many pending requests")
+        self.pending += 1
+        try:
+            async with self.slots:
+                response = await handler(request)
+            self.served += 1
+            return response
+        finally:
+            self.pending -= 1
+
+    def _number(self, request: web.Request, name: str, default, cast=int):
+        try:
+            return cast(request.query.get(name, default))
+        except ValueError:
+            raise web.HTTPBadRequest(text=f"Invalid value for {name}")
+
+    def _limit(self, request: web.Request) -> int:
+        return max(1, min(self._number(request, "limit", 5), self.max_limit))
+
+    def _required(self, request: web.Request, name: str) -> str:
+        value = request.query.get(name, "").strip()
+        if not value:
+            raise web.HTTPBadRequest(text=f"Missing parameter {name}")
+        return value
+
+    @staticmethod
+    def _respond(payload: Dict[str, Any], start: float) -> web.Response:
+        payload["took_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return web.json_response(payload, dumps=functools.partial(json.dumps, default=str))
+
+    async def semantic_search(self, request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        query = self._required(request, "q")
+        limit = self._limit(request)
+        threshold = self._number(request, "threshold", 0.5, float)
+        embedding = await self.batcher.embed(query)
+        results = await self.pool.run("semantic_search", query, limit, threshold, embedding=embedding)
+        return self._respond({"query": query, "results": [dict(row) for row in results]}, start)
+
+    async def hybrid_search(self, request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        query = self._required(request, "q")
+        limit = self._limit(request)
+        embedding = await self.batcher.embed(query)
+        results = await self.pool.run("keyword_and_semantic_search", query, limit, embedding=embedding)
+        return self._respond({"query": query, "results": [dict(row) for row in results]}, start)
+
+    async def url_search(self, request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        pattern = self._required(request, "pattern")
+        query = request.query.get("q", "").strip() or None
+        limit = self._limit(request)
+        embedding = await self.batcher.embed(query) if query else None
+        results = await self.pool.run("url_content_search", pattern, query, limit, embedding=embedding)
+        return self._respond({"pattern": pattern, "query": query, "results": [dict(row) for row in results]},
+                             start)
+
+    async def page_content(self, request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        try:
+            page_id = int(request.match_info["page_id"])
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid page id")
+        url, content = await self.pool.run("get_page_content", page_id)
+        if url is None:
+            raise web.HTTPNotFound(text=f"No page found with ID {page_id}")
+        return self._respond({"page_id": page_id, "url": url, "content": content}, start)
+
+    async def health(self, request: web.Request) -> web.Response:
+        batches = self.batcher.batches
+        return web.json_response({
+            "database": db_name,
+            "pending": self.pending,
+            "served": self.served,
+            "rejected": self.rejected,
+            "embedding_batches": batches,
+            "average_batch_size": round(self.batcher.queries / batches, 2) if batches else 0,
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve vector database searches over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--connections", type=int, default=4, help="Database connections")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="Requests processed at the same time")
+    parser.add_argument("--max-pending", type=int, default=1024, help="Accepted requests before answering 503")
+    parser.add_argument("--max-batch", type=int, default=32, help="Largest query embedding batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2, help="Time a query waits for others to batch with")
+    parser.add_argument("--ef-search", type=int, help="HNSW candidate list size (recall vs. speed, at most 1000)")
+    parser.add_argument("--probes", type=int, help="IVFFlat lists scanned per query (recall vs. speed)")
+    parser.add_argument("--query-cache", choices=["memory", "sqlite", "postgres", "none"], default="memory",
+                        help="Cache of query embeddings")
+    parser.add_argument("--query-cache-path", default="query_cache.sqlite", help="SQLite file of the query cache")
+    args = parser.parse_args()
+
+    model_name = 'sentence-transformers/LaBSE'
+    query_cache = create_query_cache(model_name, args.query_cache, args.query_cache_path, cache_memory=10000)
+    vector_processor = VectorProcessor(model_name, cache=query_cache)
+    service = SearchService(QueryBatcher(vector_processor, args.max_batch, args.max_wait_ms),
+                            QuerierPool(vector_processor, args.connections, args.ef_search, args.probes),
+                            max_concurrency=args.max_concurrency, max_pending=args.max_pending)
+    try:
+        web.run_app(service.create_app(), host=args.host, port=args.port)
+    finally:
+        if query_cache:
+            query_cache.close()
+
+
+if __name__ == "__main__":
+    main()
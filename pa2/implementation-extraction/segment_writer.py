@@ -0,0 +1,118 @@
+import io
+import struct
+from typing import List, Dict, Any, Tuple
+import numpy as np
+from psycopg2.extras import execute_values
+
+# Header of PostgreSQL's binary COPY format: signature, flags, header extension length
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+COPY_SEGMENTS = "COPY crawldb.page_segment (page_id, page_segment, embedding) FROM STDIN"
+
+
+def encode_vector(embedding) -> bytes:
+    """Encode an embedding in pgvector's binary format: dimensions, unused, float4 values (big-endian)."""
+    values = np.asarray(embedding, dtype=">f4")
+    return struct.pack("!hh", len(values), 0) + values.tobytes()
+
+
+def encode_binary_row(page_id: int, text: str, embedding) -> bytes:
+    """Encode one page_segment row as a binary COPY tuple."""
+    text_bytes = text.encode("utf-8")
+    vector_bytes = encode_vector(embedding)
+    return b"".join([
+        struct.pack("!h", 3),
+        struct.pack("!ii", 4, page_id),
+        struct.pack("!i", len(text_bytes)), text_bytes,
+        struct.pack("!i", len(vector_bytes)), vector_bytes,
+    ])
+
+
+def encode_text_row(page_id: int, text: str, embedding) -> str:
+    """Encode one page_segment row as a text COPY line."""
+    escaped = (text.replace("\\", "\\\\").replace("\t", "\\t")
+               .replace("\n", "\\n").replace("\r", "\\r"))
+    vector = "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+    return f"{page_id}\t{escaped}\t{vector}\n"
+
+
+class SegmentWriter:
+    """Bulk writer for cleaned pages and their segment embeddings.
+
+    A batch of pages is written in one transaction: cleaned_page rows are
+    upserted with execute_values, the old segments of these pages are deleted
+    and the new ones are streamed with COPY FROM STDIN, in binary format by
+    default. Pages without content keep a row with NULL plain_text, so their
+    content_hash is recorded and they are skipped until their HTML changes.
+    """
+
+    def __init__(self, conn, binary: bool = True):
+        """
+        Args:
+            conn: Write connection (not in autocommit mode)
+            binary: Use binary COPY; text COPY is used otherwise
+        """
+        self.conn = conn
+        self.binary = binary
+
+    def _copy_buffer(self, pages: List[Dict[str, Any]]) -> io.BytesIO:
+        if self.binary:
+            parts = [COPY_HEADER]
+            for page in pages:
+                for segment in page['segments']:
+                    parts.append(encode_binary_row(page['id'], segment['text'], segment['embedding']))
+            parts.append(COPY_TRAILER)
+            return io.BytesIO(b"".join(parts))
+
+        lines = [encode_text_row(page['id'], segment['text'], segment['embedding'])
+                 for page in pages for segment in page['segments']]
+        return io.BytesIO("".join(lines).encode("utf-8"))
+
+    def _write(self, pages: List[Dict[str, Any]]) -> None:
+        stored = [page for page in pages if page['clean_text']]
+        with self.conn:
+            with self.conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO crawldb.cleaned_page (id, url, plain_text, block_system, content_hash)
+                    VALUES %s
+                    ON CONFLICT (id) DO UPDATE
+                    SET url = EXCLUDED.url,
+                        plain_text = EXCLUDED.plain_text,
+                        block_system = EXCLUDED.block_system,
+                        content_hash = EXCLUDED.content_hash;
+                """, [(page['id'], page['url'], page['clean_text'] or None, page['used_block'], page['content_hash'])
+                      for page in pages])
+                # Pages that lost their content lose their segments too
+                cursor.execute("DELETE FROM crawldb.page_segment WHERE page_id = ANY(%s);",
+                               ([page['id'] for page in pages],))
+
+                if any(page['segments'] for page in stored):
+                    options = " WITH (FORMAT binary)" if self.binary else ""
+                    cursor.copy_expert(COPY_SEGMENTS + options, self._copy_buffer(stored))
+
+    def write_pages(self, pages: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+        """Store a batch of pages and replace their segments in a single transaction.
+
+        If the batch fails, the pages are retried one by one so a single bad
+        page does not lose the whole batch.
+
+        Args:
+            pages: Cleaned pages with 'id', 'url', 'content_hash', 'clean_text',
+                   'used_block' and 'segments' (each with 'text' and 'embedding')
+
+        Returns:
+            List of (page, error message) for pages that could not be stored
+        """
+        if not pages:
+            return []
+        try:
+            self._write(pages)
+            return []
+        except Exception as e:
+            if len(pages) == 1:
+                return [(pages[0], str(e))]
+        failures = []
+        for page in pages:
+            failures.extend(self.write_pages([page]))
+        return failures
@@ -0,0 +1,176 @@
+import argparse
+import math
+import os
+from typing import List, Dict, Any, Optional
+import dotenv
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+dotenv.load_dotenv(override=True)
+db_name = os.getenv("DB_NAME", "VectorDB01")
+db_user = os.getenv("DB_USER", "postgres")
+db_password = os.getenv("DB_PASSWORD", "Admin")
+db_host = os.getenv("DB_HOST", "localhost")
+db_port = os.getenv("DB_PORT", "5432")
+
+TABLE = "crawldb.page_segment"
+INDEX_NAMES = {
+    "hnsw": "idx_page_segment_embedding_hnsw",
+    "ivfflat": "idx_page_segment_embedding_ivfflat",
+    "hnsw_halfvec": "idx_page_segment_embedding_hnsw_halfvec",
+    "hnsw_binary": "idx_page_segment_embedding_hnsw_binary",
+}
+
+# Access method and indexed expression of each index; {dim} is the embedding
+# dimension. The quantized indexes (pgvector 0.7+) store half-precision or
+# sign-bit copies of the embeddings only inside the index, and queries must
+# use the same expression (see VectorDBQuerier.semantic_search).
+INDEX_KEYS = {
+    "hnsw": ("hnsw", "embedding vector_cosine_ops"),
+    "ivfflat": ("ivfflat", "embedding vector_cosine_ops"),
+    "hnsw_halfvec": ("hnsw", "(embedding::halfvec({dim})) halfvec_cosine_ops"),
+    "hnsw_binary": ("hnsw", "(binary_quantize(embedding)::bit({dim})) bit_hamming_ops"),
+}
+
+
+class VectorIndexManager:
+    """Creates, tunes and rebuilds the ANN index on page_segment.embedding.
+
+    HNSW and IVFFlat indexes use vector_cosine_ops, which matches the <=>
+    operator used by VectorDBQuerier. hnsw_halfvec (2x smaller) and
+    hnsw_binary (32x smaller) index quantized embeddings for a coarse search
+    that is re-ranked with the full vectors.
+    """
+
+    def __init__(self, connection):
+        """
+        Args:
+            connection: psycopg2 connection; it is switched to autocommit because
+                        CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        """
+        self.connection = connection
+        self.connection.autocommit = True
+
+    def _execute(self, sql: str, params: Optional[tuple] = None, fetch: bool = False):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if fetch else None
+
+    def segment_count(self) -> int:
+        """Number of segments with an embedding."""
+        row = self._execute(f"SELECT COUNT(*) AS total FROM {TABLE} WHERE embedding IS NOT NULL;", fetch=True)[0]
+        return row['total'] if isinstance(row, dict) else row[0]
+
+    def dimension(self) -> int:
+        """Dimension of the stored embeddings."""
+        row = self._execute(f"SELECT vector_dims(embedding) AS dim FROM {TABLE} WHERE embedding IS NOT NULL LIMIT 1;",
+                            fetch=True)
+        if not row:
+            raise ValueError("No embeddings stored yet; the quantized indexes need their dimension")
+        return row[0]['dim'] if isinstance(row[0], dict) else row[0][0]
+
+    def default_lists(self) -> int:
+        """IVFFlat list count recommended by pgvector: rows / 1000 up to 1M rows, sqrt(rows) above."""
+        rows = self.segment_count()
+        if rows > 1_000_000:
+            return int(math.sqrt(rows))
+        return max(1, rows // 1000)
+
+    def create(self, method: str = "hnsw", m: int = 16, ef_construction: int = 64, lists: Optional[int] = None,
+               maintenance_work_mem: Optional[str] = None, concurrently: bool = True) -> str:
+        """Create the index if it does not exist.
+
+        Args:
+            method: "hnsw", "ivfflat", "hnsw_halfvec" or "hnsw_binary"
+            m: HNSW maximum connections per layer
+            ef_construction: HNSW candidate list size while building
+            lists: IVFFlat number of lists; derived from the table size when omitted
+            maintenance_work_mem: Memory for the build, e.g. "2GB"; HNSW builds are much faster when the graph fits
+            concurrently: Build without blocking writes to page_segment
+
+        Returns:
+            Name of the index
+        """
+        if method not in INDEX_NAMES:
+            raise ValueError(f"Unknown index method {method}, expected one of {list(INDEX_NAMES)}")
+        name = INDEX_NAMES[method]
+        access_method, key = INDEX_KEYS[method]
+        if "{dim}" in key:
+            key = key.format(dim=self.dimension())
+        if access_method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            options = f"lists = {int(lists or self.default_lists())}"
+
+        if maintenance_work_mem:
+            self._execute("SELECT set_config('maintenance_work_mem', %s, false);", (maintenance_work_mem,))
+        self._execute(f"""
+            CREATE INDEX {'CONCURRENTLY' if concurrently else ''} IF NOT EXISTS {name}
+            ON {TABLE} USING {access_method} ({key})
+            WITH ({options});
+        """)
+        return name
+
+    def drop(self, method: Optional[str] = None, concurrently: bool = True) -> None:
+        """Drop the index of one method, or all of them when method is None."""
+        for index_method, name in INDEX_NAMES.items():
+            if method in (None, index_method):
+                self._execute(f"DROP INDEX {'CONCURRENTLY' if concurrently else ''} IF EXISTS crawldb.{name};")
+
+    def rebuild(self, method: str = "hnsw", concurrently: bool = True) -> None:
+        """Rebuild an index, e.g. after bulk loads or, for IVFFlat, once the data distribution changed."""
+        self._execute(f"REINDEX INDEX {'CONCURRENTLY' if concurrently else ''} crawldb.{INDEX_NAMES[method]};")
+
+    def retune(self, method: str = "hnsw", **options) -> str:
+        """Replace an index with one built with new options (m, ef_construction, lists, ...)."""
+        self.drop(method)
+        return self.create(method, **options)
+
+    def info(self) -> List[Dict[str, Any]]:
+        """List the vector indexes on page_segment with their definition and size."""
+        rows = self._execute("""
+            SELECT indexname AS name, indexdef AS definition,
+                   pg_size_pretty(pg_relation_size(format('%%I.%%I', schemaname, indexname)::regclass)) AS size
+            FROM pg_indexes
+            WHERE schemaname = 'crawldb' AND tablename = 'page_segment'
+            AND indexname = ANY(%s);
+        """, (list(INDEX_NAMES.values()),), fetch=True)
+        return [dict(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the ANN index on page_segment.embedding")
+    parser.add_argument("action", choices=["create", "drop", "rebuild", "retune", "info"])
+    parser.add_argument("--method", choices=list(INDEX_NAMES), default="hnsw", help="Index type")
+    parser.add_argument("--m", type=int, default=16, help="HNSW connections per layer")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW build candidate list size")
+    parser.add_argument("--lists", type=int, help="IVFFlat lists (default: derived from row count)")
+    parser.add_argument("--maintenance-work-mem", help="Memory for the index build, e.g. 2GB")
+    parser.add_argument("--blocking", action="store_true", help="Do not build or drop CONCURRENTLY")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(host=db_host, port=db_port, database=db_name, user=db_user,
+                                  password=db_password, cursor_factory=RealDictCursor)
+    manager = VectorIndexManager(connection)
+    build_options = dict(m=args.m, ef_construction=args.ef_construction, lists=args.lists,
+                         maintenance_work_mem=args.maintenance_work_mem, concurrently=not args.blocking)
+    try:
+        if args.action == "create":
+            print(f"Created {manager.create(args.method, **build_options)}")
+        elif args.action == "retune":
+            print(f"Rebuilt {manager.retune(args.method, **build_options)}")
+        elif args.action == "drop":
+            manager.drop(args.method, concurrently=not args.blocking)
+            print(f"Dropped {INDEX_NAMES[args.method]}")
+        elif args.action == "rebuild":
+            manager.rebuild(args.method, concurrently=not args.blocking)
+            print(f"Rebuilt {INDEX_NAMES[args.method]}")
+
+        for index in manager.info():
+            print(f"{index['name']} ({index['size']}): {index['definition']}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
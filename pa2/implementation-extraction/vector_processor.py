@@ -1,18 +1,41 @@
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Optional
+import numpy as np
+from embedding_cache import EmbeddingCache, normalize_text
 
 class VectorProcessor:
-    def __init__(self, model_name: str = 'sentence-transformers/LaBSE'):
+    def __init__(self, model_name: str = 'sentence-transformers/LaBSE', batch_size: int = 64,
+                 cache: Optional[EmbeddingCache] = None):
         """Initialize the vector processor with SentenceTransformer model.
         
         Args:
             model_name: Name of the sentence-transformers model to use
                        Defaults to LaBSE which is good for multiple languages
+            batch_size: Number of segments passed through the model at once
+            cache: Optional EmbeddingCache; cached segments skip the model
         """
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache
+        self._model = None
+    
+    @property
+    def model(self):
+        """The SentenceTransformer model, loaded on first use.
+        
+        Importing sentence-transformers and loading LaBSE takes seconds, so
+        texts answered from the cache never wait for it.
+        """
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+    
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
         
     def create_embedding(self, text: str) -> List[float]:
-        """Create an embedding vector for the given text.
+        """Create an embedding vector for the given text, using the cache when set.
         
         Args:
             text: The text to create an embedding for
@@ -24,12 +47,93 @@ class VectorProcessor:
             Exception: If embedding creation fails
         """
         try:
+            if self.cache:
+                cached = self.cache.get_many([text])[0]
+                if cached is not None:
+                    return cached.tolist()
+            embedding = self.model.encode(text)
+            if self.cache:
+                self.cache.put_many([text], [embedding])
             # Convert the embedding to a regular list for database storage
-            embedding = self.model.encode(text).tolist()
-            return embedding
+            return embedding.tolist()
         except Exception as e:
             raise Exception(f"Failed to create embedding: {str(e)}")
             
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode many texts, reusing cached embeddings.
+        
+        Texts found in the cache are not encoded, and texts that are equal
+        after whitespace normalization are encoded only once. The rest go through the model in length-sorted
+        batches and are added to the cache.
+        
+        Args:
+            texts: Texts to encode, typically segments from many pages
+            
+        Returns:
+            Array of shape (len(texts), dimension), rows in the order of texts
+        """
+        cached = self.cache.get_many(texts) if self.cache else [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        for i, (text, embedding) in enumerate(zip(texts, cached)):
+            if embedding is None:
+                pending.setdefault(normalize_text(text), []).append(i)
+
+        # The model is loaded only for cache misses; otherwise a cached vector gives the dimension
+        encoded = None
+        if pending:
+            unique_texts = [texts[indices[0]] for indices in pending.values()]
+            encoded = self._encode_sorted(unique_texts)
+            dimension = encoded.shape[1]
+        else:
+            dimension = len(cached[0]) if texts else self.dimension
+
+        embeddings = np.zeros((len(texts), dimension), dtype=np.float32)
+        for i, embedding in enumerate(cached):
+            if embedding is not None:
+                embeddings[i] = embedding
+        if encoded is not None:
+            for indices, embedding in zip(pending.values(), encoded):
+                embeddings[indices] = embedding
+            if self.cache:
+                self.cache.put_many(unique_texts, encoded)
+        return embeddings
+
+    def _encode_sorted(self, texts: List[str]) -> np.ndarray:
+        """Encode texts sorted by length, so each batch pads to roughly the same number of tokens."""
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        # Longest first, so a batch that does not fit in memory fails immediately
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            embeddings[indices] = self.model.encode([texts[i] for i in indices],
+                                                    batch_size=self.batch_size,
+                                                    convert_to_numpy=True,
+                                                    show_progress_bar=False)
+        return embeddings
+
+    def process_pages(self, pages: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """Add embeddings to the segments of many pages with shared batches.
+        
+        Args:
+            pages: One list of segment dictionaries (with a 'text' key) per page
+            
+        Returns:
+            The same lists, each segment with an added 'embedding' key
+        """
+        texts = [segment['text'] for segments in pages for segment in segments]
+        try:
+            embeddings = self.encode_texts(texts)
+        except Exception as e:
+            print(f"Error processing segments of {len(pages)} pages: {str(e)}")
+            return [self.process_segments(segments) for segments in pages]
+
+        position = 0
+        for segments in pages:
+            for segment in segments:
+                segment['embedding'] = embeddings[position].tolist()
+                position += 1
+        return pages
+
     def process_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Process multiple segments and add embeddings.
         
@@ -45,7 +149,7 @@ class VectorProcessor:
         try:
             # Process all texts at once for better efficiency
             texts = [segment['text'] for segment in segments]
-            embeddings = self.model.encode(texts)
+            embeddings = self.encode_texts(texts)
             
             # Add embeddings back to segments
             for segment, embedding in zip(segments, embeddings):
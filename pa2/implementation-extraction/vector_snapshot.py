@@ -0,0 +1,394 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import dotenv
+import numpy as np
+import psycopg2
+
+dotenv.load_dotenv(override=True)
+db_name = os.getenv("DB_NAME", "VectorDB01")
+db_user = os.getenv("DB_USER", "postgres")
+db_password = os.getenv("DB_PASSWORD", "Admin")
+db_host = os.getenv("DB_HOST", "localhost")
+db_port = os.getenv("DB_PORT", "5432")
+
+# Files of a snapshot directory
+EMBEDDINGS_FILE = "embeddings.npy"          # (segments, dimension), L2-normalized
+SEGMENT_IDS_FILE = "segment_ids.npy"        # page_segment.id per row
+SEGMENT_PAGES_FILE = "segment_pages.npy"    # page_segment.page_id per row
+SEGMENT_TEXTS_FILE = "segment_texts.bin"    # UTF-8 segment texts, back to back
+SEGMENT_OFFSETS_FILE = "segment_offsets.npy"
+PAGE_IDS_FILE = "page_ids.npy"              # cleaned_page.id, sorted
+PAGE_URLS_FILE = "page_urls.json"
+PAGE_TEXTS_FILE = "page_texts.bin"
+PAGE_OFFSETS_FILE = "page_offsets.npy"
+META_FILE = "meta.json"
+INT8_FILE = "embeddings_int8.npy"           # optional scalar-quantized copy, 4x smaller than float32
+INT8_SCALE_FILE = "int8_scale.npy"          # per-dimension scale of the int8 codes
+BINARY_FILE = "embeddings_binary.npy"       # optional sign bits packed 8 per byte, 32x smaller
+QUANTIZATIONS = ("int8", "binary")
+
+
+def _write_blob(path: str, texts) -> np.ndarray:
+    """Write texts as one UTF-8 blob and return the start offset of every text plus the end offset."""
+    offsets = [0]
+    with open(path, "wb") as f:
+        for text in texts:
+            data = (text or "").encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    return np.asarray(offsets, dtype=np.int64)
+
+
+def quantize_embeddings(directory: str, quantizations, block_size: int = 65536) -> None:
+    """Write quantized copies of a snapshot's embedding matrix.
+
+    int8 stores round(x / scale) with a symmetric per-dimension scale, binary
+    stores the sign of every dimension. Both are used for a coarse search
+    whose candidates are re-ranked with the full matrix.
+
+    Args:
+        directory: Snapshot directory containing embeddings.npy
+        quantizations: Any of "int8" and "binary"
+        block_size: Rows converted at a time
+    """
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+    count, dimension = embeddings.shape
+    if "int8" in quantizations:
+        peak = np.zeros(dimension, dtype=np.float32)
+        for start in range(0, count, block_size):
+            block = embeddings[start:start + block_size].astype(np.float32)
+            peak = np.maximum(peak, np.abs(block).max(axis=0, initial=0))
+        scale = np.where(peak > 0, peak / 127, 1).astype(np.float32)
+        codes = np.lib.format.open_memmap(os.path.join(directory, INT8_FILE), mode="w+",
+                                          dtype=np.int8, shape=(count, dimension))
+        for start in range(0, count, block_size):
+            block = embeddings[start:start + block_size].astype(np.float32)
+            codes[start:start + len(block)] = np.clip(np.rint(block / scale), -127, 127)
+        codes.flush()
+        np.save(os.path.join(directory, INT8_SCALE_FILE), scale)
+    if "binary" in quantizations:
+        bits = np.lib.format.open_memmap(os.path.join(directory, BINARY_FILE), mode="w+",
+                                         dtype=np.uint8, shape=(count, (dimension + 7) // 8))
+        for start in range(0, count, block_size):
+            block = embeddings[start:start + block_size]
+            bits[start:start + len(block)] = np.packbits(block > 0, axis=1)
+        bits.flush()
+
+
+def export_snapshot(connection, directory: str, dtype: str = "float32", batch_size: int = 10000,
+                    quantizations=()) -> Dict[str, Any]:
+    """Dump the segment embeddings and the texts needed to answer searches into a directory.
+
+    Everything is read in one REPEATABLE READ transaction, so the snapshot is
+    consistent even while the indexing pipeline writes. The snapshot is built
+    next to the target and swapped in at the end; processes that still have
+    the old files mapped keep reading them.
+
+    Args:
+        connection: psycopg2 connection (plain tuples, not RealDictCursor)
+        directory: Target directory, replaced if it exists
+        dtype: "float32" or "float16" (half the size, about 3 decimal digits of precision)
+        batch_size: Rows fetched from the server at a time
+        quantizations: Quantized copies to add for coarse search: "int8", "binary" or both
+
+    Returns:
+        The snapshot metadata
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported dtype {dtype}, expected float32 or float16")
+    unknown = set(quantizations) - set(QUANTIZATIONS)
+    if unknown:
+        raise ValueError(f"Unknown quantization {sorted(unknown)}, expected any of {list(QUANTIZATIONS)}")
+    building = directory.rstrip("/\\") + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    connection.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    with connection:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*), MAX(vector_dims(embedding))
+                FROM crawldb.page_segment WHERE embedding IS NOT NULL;
+            """)
+            count, dimension = cursor.fetchone()
+        dimension = dimension or 0
+
+        embeddings = np.lib.format.open_memmap(os.path.join(building, EMBEDDINGS_FILE), mode="w+",
+                                               dtype=dtype, shape=(count, dimension))
+        segment_ids = np.zeros(count, dtype=np.int64)
+        segment_pages = np.zeros(count, dtype=np.int64)
+        texts = []
+
+        with connection.cursor(name="snapshot_segments") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute("""
+                SELECT id, page_id, page_segment, embedding::real[]
+                FROM crawldb.page_segment
+                WHERE embedding IS NOT NULL
+                ORDER BY id;
+            """)
+            position = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                vectors = np.asarray([row[3] for row in rows], dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                norms[norms == 0] = 1
+                end = position + len(rows)
+                embeddings[position:end] = vectors / norms
+                segment_ids[position:end] = [row[0] for row in rows]
+                segment_pages[position:end] = [row[1] for row in rows]
+                texts.extend(row[2] for row in rows)
+                position = end
+        embeddings.flush()
+        del embeddings
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, url, plain_text FROM crawldb.cleaned_page "
+                           "WHERE plain_text IS NOT NULL ORDER BY id;")
+            pages = cursor.fetchall()
+    connection.set_session(isolation_level="DEFAULT", readonly=False)
+
+    np.save(os.path.join(building, SEGMENT_IDS_FILE), segment_ids)
+    np.save(os.path.join(building, SEGMENT_PAGES_FILE), segment_pages)
+    np.save(os.path.join(building, SEGMENT_OFFSETS_FILE),
+            _write_blob(os.path.join(building, SEGMENT_TEXTS_FILE), texts))
+    np.save(os.path.join(building, PAGE_IDS_FILE), np.asarray([page[0] for page in pages], dtype=np.int64))
+    with open(os.path.join(building, PAGE_URLS_FILE), "w", encoding="utf-8") as f:
+        json.dump([page[1] for page in pages], f)
+    np.save(os.path.join(building, PAGE_OFFSETS_FILE),
+            _write_blob(os.path.join(building, PAGE_TEXTS_FILE), (page[2] for page in pages)))
+
+    quantize_embeddings(building, quantizations)
+
+    meta = {"segments": count, "pages": len(pages), "dimension": dimension, "dtype": dtype,
+            "quantizations": list(quantizations), "database": db_name,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    with open(os.path.join(building, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    previous = directory.rstrip("/\\") + ".previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(building, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return meta
+
+
+class SnapshotQuerier:
+    """Answers vector searches from a snapshot directory without a database.
+
+    The matrix and texts are memory-mapped, so any number of serving
+    processes share one copy through the OS page cache. Top-K search is a
+    blocked matrix-vector product over the normalized embeddings followed
+    by argpartition. With quantization, the scan runs over the int8 or
+    binary copy and only the best k * rerank_factor rows are read from the
+    full matrix for re-ranking. Method signatures and result rows match
+    VectorDBQuerier; keyword and hybrid search need PostgreSQL full-text
+    search and are not available.
+    """
+
+    def __init__(self, directory: str, vector_processor, block_size: int = 65536,
+                 quantization: Optional[str] = None, rerank_factor: int = 10):
+        """
+        Args:
+            directory: Snapshot written by export_snapshot
+            vector_processor: VectorProcessor used to embed queries
+            block_size: Rows multiplied at a time; bounds the temporary memory per query
+            quantization: None (scan the full matrix), "int8" or "binary"
+            rerank_factor: Candidates per result re-ranked after a quantized scan
+        """
+        self.directory = directory
+        self.vector_processor = vector_processor
+        self.block_size = block_size
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        self.segment_ids = np.load(os.path.join(directory, SEGMENT_IDS_FILE), mmap_mode="r")
+        self.segment_pages = np.load(os.path.join(directory, SEGMENT_PAGES_FILE), mmap_mode="r")
+        self.segment_offsets = np.load(os.path.join(directory, SEGMENT_OFFSETS_FILE), mmap_mode="r")
+        self.segment_texts = self._map_blob(SEGMENT_TEXTS_FILE)
+        self.page_ids = np.load(os.path.join(directory, PAGE_IDS_FILE), mmap_mode="r")
+        self.page_offsets = np.load(os.path.join(directory, PAGE_OFFSETS_FILE), mmap_mode="r")
+        self.page_texts = self._map_blob(PAGE_TEXTS_FILE)
+        with open(os.path.join(directory, PAGE_URLS_FILE), encoding="utf-8") as f:
+            self.page_urls = json.load(f)
+        if quantization not in (None, *QUANTIZATIONS):
+            raise ValueError(f"Unknown quantization {quantization}, expected one of {list(QUANTIZATIONS)}")
+        if quantization and quantization not in self.meta.get("quantizations", []):
+            raise ValueError(f"Snapshot {directory} has no {quantization} embeddings; export it with --quantize")
+        if quantization == "int8":
+            self.int8_codes = np.load(os.path.join(directory, INT8_FILE), mmap_mode="r")
+            self.int8_scale = np.load(os.path.join(directory, INT8_SCALE_FILE))
+        elif quantization == "binary":
+            self.binary_codes = np.load(os.path.join(directory, BINARY_FILE), mmap_mode="r")
+        print(f"Loaded snapshot of {self.meta['segments']} segments ({self.meta['dtype']}) from {directory}")
+
+    def _map_blob(self, name: str):
+        path = os.path.join(self.directory, name)
+        # np.memmap cannot map empty files
+        return np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, np.uint8)
+
+    @staticmethod
+    def _text(blob, offsets, index: int) -> str:
+        return bytes(blob[offsets[index]:offsets[index + 1]]).decode("utf-8")
+
+    def _page_index(self, page_id: int) -> Optional[int]:
+        index = int(np.searchsorted(self.page_ids, page_id))
+        if index < len(self.page_ids) and self.page_ids[index] == page_id:
+            return index
+        return None
+
+    def _url(self, page_id: int) -> Optional[str]:
+        index = self._page_index(page_id)
+        return self.page_urls[index] if index is not None else None
+
+    def top_k(self, query_embedding, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the k most similar segments.
+
+        Args:
+            query_embedding: Query vector (any norm)
+            k: Number of rows to return
+            mask: Optional boolean array; rows where it is False are skipped
+
+        Returns:
+            Row indices and cosine similarities, most similar first
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if self.quantization == "int8":
+            weights = query * self.int8_scale
+            candidates, _ = self._scan(lambda start, end: self.int8_codes[start:end].astype(np.float32) @ weights,
+                                       k * self.rerank_factor, mask)
+        elif self.quantization == "binary":
+            query_bits = np.packbits(query > 0)
+            candidates, _ = self._scan(
+                lambda start, end: -np.bitwise_count(self.binary_codes[start:end] ^ query_bits)
+                .sum(axis=1, dtype=np.int32).astype(np.float32),
+                k * self.rerank_factor, mask)
+        else:
+            return self._scan(lambda start, end: self.embeddings[start:end].astype(np.float32, copy=False) @ query,
+                              k, mask)
+
+        # Re-rank with full precision, reading the candidate rows in file order
+        candidates = np.sort(candidates)
+        scores = self.embeddings[candidates].astype(np.float32) @ query
+        order = np.argsort(-scores, kind="stable")[:k]
+        return candidates[order], scores[order]
+
+    def _scan(self, score_block, k: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k rows by score_block(start, end), computed block by block; highest score first."""
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        if k <= 0:
+            return best_rows, best_scores
+
+        for start in range(0, len(self.embeddings), self.block_size):
+            end = min(start + self.block_size, len(self.embeddings))
+            scores = score_block(start, end)
+            rows = np.arange(start, end)
+            if mask is not None:
+                keep = mask[start:end]
+                scores, rows = scores[keep], rows[keep]
+            scores = np.concatenate([best_scores, scores])
+            rows = np.concatenate([best_rows, rows])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                scores, rows = scores[top], rows[top]
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, kind="stable")
+        return best_rows[order], best_scores[order]
+
+    def _segment(self, row: int) -> Dict[str, Any]:
+        page_id = int(self.segment_pages[row])
+        return {
+            "segment_id": int(self.segment_ids[row]),
+            "page_id": page_id,
+            "page_segment": self._text(self.segment_texts, self.segment_offsets, row),
+            "url": self._url(page_id),
+        }
+
+    def semantic_search(self, query: str, limit: int = 5, similarity_threshold: float = 0.5,
+                        embedding: Optional[List[float]] = None, **_) -> List[Dict[str, Any]]:
+        """Search for semantically similar content, like VectorDBQuerier.semantic_search (exact, no ANN)."""
+        try:
+            query_embedding = embedding if embedding is not None else self.vector_processor.create_embedding(query)
+            results = []
+            for row, score in zip(*self.top_k(query_embedding, limit)):
+                if score > similarity_threshold:
+                    result = self._segment(row)
+                    result["similarity"] = float(score)
+                    results.append(result)
+            return results
+        except Exception as e:
+            print(f"Error in snapshot search: {str(e)}")
+            return []
+
+    def url_content_search(self, url_pattern: str, query: str = None, limit: int = 5,
+                           embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Search segments of pages whose URL contains url_pattern, like VectorDBQuerier.url_content_search."""
+        try:
+            pages = np.asarray([page_id for page_id, url in zip(self.page_ids, self.page_urls)
+                                if url_pattern in (url or "")], dtype=np.int64)
+            mask = np.isin(self.segment_pages, pages)
+            if not query:
+                return [self._segment(row) for row in np.flatnonzero(mask)[:limit]]
+
+            query_embedding = embedding if embedding is not None else self.vector_processor.create_embedding(query)
+            results = []
+            for row, score in zip(*self.top_k(query_embedding, limit, mask)):
+                result = self._segment(row)
+                result["similarity"] = float(score)
+                results.append(result)
+            return results
+        except Exception as e:
+            print(f"Error in snapshot URL search: {str(e)}")
+            return []
+
+    def get_page_content(self, page_id: int) -> Tuple[str, str]:
+        """Retrieve the URL and full text of a page."""
+        index = self._page_index(page_id)
+        if index is None:
+            return None, None
+        return self.page_urls[index], self._text(self.page_texts, self.page_offsets, index)
+
+    def close(self):
+        """Nothing to release; the mappings close with the object."""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export page segment embeddings to a memory-mapped snapshot")
+    parser.add_argument("--output", "-o", default="vector_snapshot", help="Snapshot directory")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32",
+                        help="Storage type of the embedding matrix")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows fetched from the server at a time")
+    parser.add_argument("--quantize", nargs="+", choices=list(QUANTIZATIONS), default=[],
+                        help="Also write int8 and/or binary copies for coarse search with re-ranking")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(host=db_host, port=db_port, database=db_name, user=db_user,
+                                  password=db_password)
+    try:
+        start = time.perf_counter()
+        meta = export_snapshot(connection, args.output, args.dtype, args.batch_size, args.quantize)
+        print(f"Exported {meta['segments']} segments of {meta['pages']} pages "
+              f"({meta['dimension']} dimensions, {meta['dtype']}) to {args.output} "
+              f"in {time.perf_counter() - start:.1f} s")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()